@@ -0,0 +1,31 @@
+"""Benchmarks for the [bracket] interpreter.
+
+Each module runs on its own from the repository root, e.g.
+
+    python -m benchmarks.reader
+
+benchmarks.suite runs a workload for each part of the interpreter, saves the
+results as JSON and compares them with an earlier run's, flagging regressions.
+"""
+import time
+import tracemalloc
+
+
+def best_of(fn, *args, repeat=3):
+    "Call fn(*args) `repeat` times; return (best wall-clock seconds, last result)."
+    best, res = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        res = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, res
+
+
+def peak_memory(fn, *args):
+    "Call fn(*args) once; return (the most memory it had allocated at once, in bytes, result)."
+    tracemalloc.start()
+    try:
+        res = fn(*args)
+        return tracemalloc.get_traced_memory()[1], res
+    finally:
+        tracemalloc.stop()
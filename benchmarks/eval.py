@@ -0,0 +1,46 @@
+"""Evaluator micro-benchmarks: the README's fib and fibco, and deep non-tail recursion.
+
+    python -O -m benchmarks.eval [compile|interp|stack ...]
+"""
+import sys
+
+import lib.lang
+from benchmarks import best_of
+from lib.lang import Env, eval, global_env, parse, special_functions
+
+DEFS = '''
+[defn fib [n] [if [< n 2] n [add [fib [- n 2]] [fib [- n 1]]]]]
+[defn fibco [[n] [fibco 0 1 n]]
+            [[a b n] [if [= 0 n] b [fibco b [add a b] [dec n]]]]]
+[defn nsum [n] [if [= n 0] 0 [add n [nsum [dec n]]]]]
+'''
+
+CASES = [('fib 25', '[fib 25]', 1),
+         ('fibco 1000', '[fibco 1000]', 20),
+         ('nsum 1000', '[nsum 1000]', 20),
+         ('nsum 100000', '[nsum 100000]', 1)]
+
+
+def run(x, env, times):
+    for _ in range(times):
+        res = eval(x, env)
+    return res
+
+
+def main(evaluators):
+    sys.setrecursionlimit(10000)
+    special_functions()
+    for evaluator in evaluators:
+        lib.lang.evaluator = evaluator
+        env = Env(outer=global_env)
+        eval(parse(DEFS), env)  # the functions belong to the evaluator that made them
+        for name, src, times in CASES:
+            try:
+                t, _ = best_of(run, parse(src), env, times)
+                print(f'{evaluator:<9}{name:<13}{t / times * 1000:>10.1f} ms')
+            except RecursionError:
+                print(f'{evaluator:<9}{name:<13}{"RecursionError":>13}')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:] or [lib.lang.evaluator])
@@ -0,0 +1,51 @@
+"""Call frames of compiled fns: bytes allocated per call, and the cost of local and global lookups.
+
+    python -O -m benchmarks.frames
+"""
+import sys
+
+from benchmarks import best_of
+from lib.lang import Env, eval, global_env, parse, special_functions
+
+DEFS = '''
+[defn pair [a b] a]
+[defn frame [a b] [fn [] a]]
+[defn locals [a b c] [add a b c a b c a b c a b c]]
+[defn nested [a] [fn [b] [fn [c] [fn [d] [add a b c d a b c d a b c d]]]]]
+[def deep [[[nested 1] 2] 3]]
+[defn globals [a] [list inc inc inc inc inc inc inc inc inc inc inc inc]]
+'''
+
+CASES = [('call', 'pair', (1, 2)),
+         ('12 locals', 'locals', (1, 2, 3)),
+         ('12 locals, depth 0-3', 'deep', (4,)),
+         ('12 globals', 'globals', (1,))]
+
+
+def size(frame):
+    "Bytes allocated for frame: the object, and its dict or its values list."
+    extra = getattr(frame, 'values', None)
+    if extra is None:
+        extra = getattr(frame, '__dict__', {})
+    return sys.getsizeof(frame) + sys.getsizeof(extra)
+
+
+def run(f, args, times):
+    for _ in range(times):
+        res = f(*args)
+    return res
+
+
+def main(times=20000):
+    special_functions()
+    env = Env(outer=global_env)
+    eval(parse(DEFS), env)
+    frame = env['frame'](1, 2).procs[0].env  # the frame of a call to [frame 1 2], kept by its closure
+    print(f'{"frame of [a b]":<24}{type(frame).__name__:>8}{size(frame):>8} bytes')
+    for name, fn, args in CASES:
+        t, _ = best_of(run, env[fn], args, times)
+        print(f'{name:<24}{t / times * 1e6:>10.2f} us')
+
+
+if __name__ == '__main__':
+    main()
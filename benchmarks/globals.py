@@ -0,0 +1,36 @@
+"""Global lookups from inside nested fns: the cost per reference as closure depth grows.
+
+    python -O -m benchmarks.globals
+"""
+from benchmarks import best_of
+from lib.lang import Env, eval, global_env, parse, special_functions
+
+REFS = 16
+DEPTHS = [0, 1, 2, 4, 8]
+
+
+def nested(depth):
+    "A fn of no args, made inside depth other fns, that refers to the global inc REFS times."
+    src = f'[fn [] [list {" ".join(["inc"] * REFS)}]]'
+    for _ in range(depth):
+        src = f'[[fn [x] {src}] 1]'
+    return src
+
+
+def run(f, times):
+    for _ in range(times):
+        res = f()
+    return res
+
+
+def main(times=20000):
+    special_functions()
+    env = Env(outer=global_env)  # like a required module's namespace, one Env above global_env
+    for depth in DEPTHS:
+        f = eval(parse(nested(depth)), env)
+        t, _ = best_of(run, f, times)
+        print(f'depth {depth:<4}{t / times / REFS * 1e9:>8.0f} ns/reference')
+
+
+if __name__ == '__main__':
+    main()
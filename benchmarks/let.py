@@ -0,0 +1,34 @@
+"""let, and and or: special forms, compared with the closures they used to expand into.
+
+    python -O -m benchmarks.let
+"""
+from benchmarks import best_of
+from lib.lang import Env, eval, global_env, parse, special_functions
+
+DEFS = '''
+[defn lets [n] [let [a [add n 1] b [add a 1] [c d] [list a b]] [add a b c d]]]
+[defn lambdas [n] [[fn [a] [[fn [b] [[fn [[c d]] [add a b c d]] [list a b]]] [add a 1]]] [add n 1]]]
+[defn ands [n] [and n [or nil n] [inc n]]]
+[defn ifs [n] [[fn [y] [if y [[fn [y] [if y [inc n] y]] [[fn [y] [if y y n]] nil]] y]] n]]
+'''
+
+CASES = [('let', 'lets'), ('nested fns', 'lambdas'), ('and, or', 'ands'), ('nested fns, ifs', 'ifs')]
+
+
+def run(f, times):
+    for _ in range(times):
+        res = f(5)
+    return res
+
+
+def main(times=20000):
+    special_functions()
+    env = Env(outer=global_env)
+    eval(parse(DEFS), env)
+    for name, fn in CASES:
+        t, _ = best_of(run, env[fn], times)
+        print(f'{name:<24}{t / times * 1e6:>10.2f} us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""loop/recur: core.br's take-while and take-first, which recur, and into as
+it was written with recur, against the same functions written as self calls.
+
+    python -O -m benchmarks.loops
+"""
+from benchmarks import best_of
+from lib.lang import Env, eval, global_env, parse, special_functions
+
+DEFS = '''
+[defn into-recur [a b] [if [empty? b] a [recur [conj a [first b]] [rest b]]]]
+[defn into-calls [a b] [if [empty? b] a [into-calls [conj a [first b]] [rest b]]]]
+[defn take-while-calls [acc pred xs] [cond [empty? xs] acc
+                                            [pred [first xs]] [take-while-calls [conj acc [first xs]] pred [rest xs]]
+                                            acc]]
+[defn take-first-calls [f xs] [if [empty? xs] nil [let [[x . xs] xs] [if [f x] x [take-first-calls f xs]]]]]
+[defn sum-loop [n] [loop [i 0 acc 0] [if [= i n] acc [recur [inc i] [add acc i]]]]]
+[defn sum-calls [[n] [sum-calls n 0 0]] [[n i acc] [if [= i n] acc [sum-calls n [inc i] [add acc i]]]]]
+'''
+
+N = 1000
+CASES = [('into', '[into-recur [] xs]', '[into-calls [] xs]'),
+         ('take-while', '[take-while [constantly true] xs]', '[take-while-calls [] [constantly true] xs]'),
+         ('take-first', '[take-first [fn [x] [= x -1]] xs]', '[take-first-calls [fn [x] [= x -1]] xs]'),
+         ('sum to n', f'[sum-loop {N}]', f'[sum-calls {N}]')]
+
+
+def run(x, env, times):
+    for _ in range(times):
+        res = eval(x, env)
+    return res
+
+
+def main(times=20):
+    special_functions()
+    env = Env(outer=global_env)
+    eval(parse(DEFS), env)
+    env['xs'] = list(range(N))
+    print(f'{"":<16}{"recur":>12}{"self calls":>12}')
+    for name, looped, called in CASES:
+        (t1, r1), (t2, r2) = [best_of(run, parse(src), env, times) for src in (looped, called)]
+        assert r1 == r2
+        print(f'{name:<16}{t1 / times * 1e3:>10.2f}ms{t2 / times * 1e3:>10.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""Persistent HashMaps against dicts copied on each update: n assocs one at a
+time, building with into, and looking every key up.
+
+    python -O -m benchmarks.maps
+"""
+from benchmarks import best_of
+from lib.lang import Env, eval, global_env, parse, special_functions
+from lib.vector import vec
+
+DEFS = '''
+[defn build [m ks] [loop [m m ks ks] [if [empty? ks] m [recur [assoc m [first ks] 1] [rest ks]]]]]
+[defn lookups [m ks] [loop [acc 0 ks ks] [if [empty? ks] acc [recur [add acc [get m [first ks]]] [rest ks]]]]]
+'''
+
+CASES = [('assoc', '[build [py/dict] ks]', '[build [hashmap] ks]'),
+         ('into', '[py/dict [mapv [fn [k] [list k 1]] ks]]', '[into [hashmap] [mapv [fn [k] [list k 1]] ks]]'),
+         ('get', '[lookups d ks]', '[lookups m ks]')]
+
+
+def run(x, env, times):
+    for _ in range(times):
+        res = eval(x, env)
+    return res
+
+
+def main(times=3):
+    special_functions()
+    env = Env(outer=global_env)
+    eval(parse(DEFS), env)
+    print(f'{"":<16}{"n":>8}{"dict":>12}{"HashMap":>12}')
+    for n in (1000, 10000):
+        env['ks'] = vec(range(n))  # so that rest doesn't copy the keys
+        env['d'] = eval(parse('[build [py/dict] ks]'), env)
+        env['m'] = eval(parse('[build [hashmap] ks]'), env)
+        for name, copied, persistent in CASES:
+            (t1, r1), (t2, r2) = [best_of(run, parse(src), env, times) for src in (copied, persistent)]
+            assert r1 == r2
+            print(f'{name:<16}{n:>8}{t1 / times * 1e3:>10.2f}ms{t2 / times * 1e3:>10.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
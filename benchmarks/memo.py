@@ -0,0 +1,57 @@
+"""Memoization benchmarks: the README's fib and fibco, plain and memoized with
+each policy, with a cold cache and a warm one, and keys made of vectors.
+
+    python -O -m benchmarks.memo [compile|interp|stack ...]
+"""
+import sys
+
+import lib.lang
+from benchmarks import best_of
+from lib.lang import Env, eval, global_env, parse, special_functions
+
+DEFS = '''
+[defn fib [n] [if [< n 2] n [add [fib [- n 2]] [fib [- n 1]]]]]
+[defn fibco [[n] [fibco 0 1 n]]
+            [[a b n] [if [= 0 n] b [fibco b [add a b] [dec n]]]]]
+[def lru [memoize [fn [n] [if [< n 2] n [add [lru [- n 2]] [lru [- n 1]]]]]]]
+[def lfu [memoize [fn [n] [if [< n 2] n [add [lfu [- n 2]] [lfu [- n 1]]]]] -policy -lfu -max-size 1000]]
+[def ttl [memoize [fn [n] [if [< n 2] n [add [ttl [- n 2]] [ttl [- n 1]]]]] -policy -ttl -ttl 60]]
+[def locked [memoize [fn [n] [if [< n 2] n [add [locked [- n 2]] [locked [- n 1]]]]] -threadsafe true]]
+[def mfibco [memoize fibco]]
+[def total [memoize [fn [xs] [reduce add xs]]]]
+[def v [into [vector] [range 100]]]
+[def l [py/list [range 100]]]
+'''
+
+CASES = [('fib 25', '[fib 25]', 1),
+         ('lru fib 25', '[begin [memo-clear! lru] [lru 25]]', 20),
+         ('lru fib 500', '[begin [memo-clear! lru] [lru 500]]', 20),
+         ('lfu fib 500', '[begin [memo-clear! lfu] [lfu 500]]', 20),
+         ('ttl fib 500', '[begin [memo-clear! ttl] [ttl 500]]', 20),
+         ('locked fib 500', '[begin [memo-clear! locked] [locked 500]]', 20),
+         ('fibco 1000', '[fibco 1000]', 100),
+         ('warm fibco 1000', '[mfibco 1000]', 100),
+         ('warm vector key', '[total v]', 100),
+         ('warm list key', '[total l]', 100)]
+
+
+def run(x, env, times):
+    for _ in range(times):
+        res = eval(x, env)
+    return res
+
+
+def main(evaluators):
+    sys.setrecursionlimit(10000)
+    special_functions()
+    for evaluator in evaluators:
+        lib.lang.evaluator = evaluator
+        env = Env(outer=global_env)
+        eval(parse(DEFS), env)
+        for name, src, times in CASES:
+            t, _ = best_of(run, parse(src), env, times)
+            print(f'{evaluator:<9}{name:<17}{t / times * 1000:>10.3f} ms')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:] or [lib.lang.evaluator])
@@ -0,0 +1,55 @@
+"""demo/checksum2.br over a large input, with mapv and with pmap across 1, 2, 4
+and cpu_count worker processes. Each row's only evenly dividing pair comes
+last, so that finding it takes the most work.
+
+    python -O -m benchmarks.parallel
+"""
+import os
+import random
+
+from benchmarks import best_of
+from lib import parallel
+from lib.lang import Env, eval, global_env, parse, special_functions
+
+
+def rows(n, width, seed=0):
+    "n rows of width numbers, of which only the last two divide one another."
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        primes = rng.sample([p for p in range(1009, 20000) if all(p % d for d in range(2, int(p ** .5) + 1))], width - 1)
+        out.append(' '.join(map(str, primes + [primes[-1] * rng.randint(2, 9)])))
+    return out
+
+
+def run(env, mapper):
+    return eval(parse(f'[checksum-by {mapper} rows]'), env)
+
+
+def close_pool():
+    "Close the pool, letting its workers exit, so that the next pmap makes one of parallel.workers processes."
+    if parallel.pool is not None:
+        parallel.pool.close()
+        parallel.pool.join()
+        parallel.pool = None
+
+
+def main(n=64, width=48, times=1):
+    special_functions()
+    eval(parse('[require [demo/checksum2 *]]'), global_env)
+    env = Env(outer=global_env)
+    env['rows'] = rows(n, width)
+    t1, expected = best_of(run, env, 'mapv', repeat=times)
+    print(f'{n} rows of {width}, {os.cpu_count()} CPUs')
+    print(f'{"mapv":<12}{t1:>10.2f}s')
+    for workers in sorted({1, 2, 4, os.cpu_count()}):
+        close_pool()
+        parallel.workers = workers
+        t, res = best_of(run, env, 'pmap', repeat=times)
+        assert res == expected
+        print(f'{f"pmap x{workers}":<12}{t:>10.2f}s{t1 / t:>8.2f}x')
+    close_pool()
+
+
+if __name__ == '__main__':
+    main()
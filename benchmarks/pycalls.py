@@ -0,0 +1,31 @@
+"""Bracket fns called from Python: a sort-by key, and the fns given to map and reduce.
+
+    python -O -m benchmarks.pycalls [n]
+"""
+import sys
+
+from benchmarks import best_of
+from lib.lang import Env, eval, global_env, parse, special_functions
+
+DEFS = '''
+[def key [fn [x] [mod x 1000]]]
+[def step [fn [acc x] [add acc x]]]
+'''
+
+CASES = [('sort-by', '[sort-by key xs]'),
+         ('map', '[list* [map [fn [x] [add x 1]] xs]]'),
+         ('reduce', '[reduce step xs]')]
+
+
+def main(n=1000000):
+    special_functions()
+    env = Env(outer=global_env)
+    eval(parse(DEFS), env)
+    env['xs'] = list(range(n, 0, -1))
+    for name, src in CASES:
+        t, _ = best_of(eval, parse(src), env)
+        print(f'{name:<9}{n:>9}{t * 1000:>10.1f} ms{t / n * 1e9:>8.0f} ns/call')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
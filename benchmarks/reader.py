@@ -0,0 +1,93 @@
+"""Tokenizer/reader throughput on multi-megabyte sources.
+
+Compares the block scanner in lib.lang.InPort against the original
+line-at-a-time tokenizer, which re-matched (and copied) the remainder of
+the line for every token."""
+import io
+import re
+
+from benchmarks import best_of
+from lib.lang import InPort, read, eof_object
+
+
+class LineInPort(object):
+    "The original InPort: one readline() per line, one copy of the tail per token."
+    tokenizer = re.compile(r"""\s*(,-                 |    # quasiquote
+                                   [\[/`,\]]          |    # capture [ " ` , ] tokens
+                                   '(?:[\\].|[^\\'])*'|    # strings
+                                     {.*?}            |    # future map literal
+                                   ;.*|                    # single line comments
+                                   [^\s\['"`,;\]]*)        # match everything that is NOT a special character
+                                   (.*)                    # match the rest of the string""",
+
+                           flags=re.VERBOSE)
+
+    def __init__(self, file):
+        self.file = file
+        self.line = ''
+
+    def __next__(self):
+        while True:
+            if self.line == '':
+                self.line = self.file.readline()
+            if self.line == '':
+                return eof_object
+            token, self.line = re.match(LineInPort.tokenizer, self.line).groups()
+            if token != '' and not token.startswith(';'):
+                return token
+
+
+def long_line(size):
+    "One generated data vector on a single line, roughly `size` characters long."
+    row = "[1 2.5 -key 'a string' sym/name `[x ,y ,-zs]] "
+    return '[def data [' + row * (size // len(row)) + ']]\n'
+
+
+def many_lines(size):
+    "Generated definitions, one short form per line, roughly `size` characters."
+    line = "[defn f [a b] [add a [mul b 2]]] ; comment\n"
+    return line * (size // len(line))
+
+
+def count_tokens(port_cls, text):
+    port = port_cls(io.StringIO(text))
+    n = 0
+    while next(port) is not eof_object:
+        n += 1
+    return n
+
+
+def read_all(text):
+    port = InPort(io.StringIO(text))
+    n = 0
+    while read(port) is not eof_object:
+        n += 1
+    return n
+
+
+def compare(name, text, mb):
+    old, n_old = best_of(count_tokens, LineInPort, text, repeat=1)
+    new, n_new = best_of(count_tokens, InPort, text)
+    assert n_old == n_new, (n_old, n_new)
+    print(f'{name + f" {mb}MB":<22}{n_new:>10}{old:>13.3f}s{new:>13.3f}s{old / new:>9.1f}x')
+
+
+def main():
+    print(f"{'input':<22}{'tokens':>10}{'line-based':>14}{'block scan':>14}{'speedup':>10}")
+    # the line-based tokenizer is quadratic in line length: keep its inputs small
+    for mb in (0.125, 0.25, 0.5):
+        compare('long line', long_line(int(mb * (1 << 20))), mb)
+    for mb in (1, 4):
+        compare('many lines', many_lines(mb << 20), mb)
+
+    for mb in (4, 16):
+        for name, gen in (('long line', long_line), ('many lines', many_lines)):
+            t, n = best_of(count_tokens, InPort, gen(mb << 20))
+            print(f'scan {name} {mb}MB: {n} tokens in {t:.3f}s ({mb / t:.1f} MB/s)')
+
+    t, forms = best_of(read_all, many_lines(4 << 20))
+    print(f'read: {forms} forms from 4MB in {t:.3f}s ({4 / t:.1f} MB/s)')
+
+
+if __name__ == '__main__':
+    main()
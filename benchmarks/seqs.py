@@ -0,0 +1,47 @@
+"""Chunked lazy seqs against the iterators they replace: map/filter pipelines,
+taking from an infinite one, walking a lazy map with first and rest, and
+take-while. A map iterator can't be walked with rest, nor can naga's LazySeq,
+whose len never returns, so the old first/rest walks the realized list.
+
+    python -O -m benchmarks.seqs
+"""
+from benchmarks import best_of
+from lib.lang import Env, eval, global_env, parse, special_functions
+
+DEFS = '''
+[defn walk [xs] [loop [acc 0 xs xs] [if [empty? xs] acc [recur [add acc [first xs]] [rest xs]]]]]
+[defn old-take-while
+      [[pred xs]     [old-take-while [] pred xs]]
+      [[acc pred xs] [cond       [empty? xs]       acc
+                                 [pred [first xs]] [recur [conj acc [first xs]] pred [rest xs]]
+                                   acc]]]
+'''
+
+CASES = [('map/filter', '[py/sum [py/map inc [py/filter even? xs]]]', '[py/sum [map inc [filter even? xs]]]'),
+         ('py map/filter', '[py/sum [py/map py/abs [py/filter py/bool xs]]]', '[py/sum [map py/abs [filter py/bool xs]]]'),
+         ('take infinite', '[py/sum [naga/take n [py/map inc [itertools/count]]]]', '[py/sum [take n [map inc [range]]]]'),
+         ('first/rest', '[walk [list* [py/map inc xs]]]', '[walk [map inc xs]]'),
+         ('take-while', '[py/sum [old-take-while [fn [x] [< x n]] xs]]', '[py/sum [take-while [fn [x] [< x n]] xs]]')]
+
+
+def run(x, env, times):
+    for _ in range(times):
+        res = eval(x, env)
+    return res
+
+
+def main(times=3):
+    special_functions()
+    env = Env(outer=global_env)
+    eval(parse(DEFS), env)
+    print(f'{"":<16}{"n":>8}{"iterator":>12}{"chunked":>12}')
+    for n in (1000, 10000):
+        env['n'], env['xs'] = n, list(range(2 * n))
+        for name, old, chunked in CASES:
+            (t1, r1), (t2, r2) = [best_of(run, parse(src), env, times) for src in (old, chunked)]
+            assert r1 == r2
+            print(f'{name:<16}{n:>8}{t1 / times * 1e3:>10.2f}ms{t2 / times * 1e3:>10.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
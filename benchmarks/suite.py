@@ -0,0 +1,191 @@
+"""The benchmark suite: one workload for each part of the interpreter, timed
+over repeated runs, with results that can be saved as JSON and compared.
+
+    python -O -m benchmarks.suite [-r RUNS] [-e EVALUATOR] [-o results.json] [workload ...]
+    python -O -m benchmarks.suite --compare base.json [new.json] [-t PERCENT]
+
+Each workload runs once to warm up, then RUNS times; the min, median, mean,
+standard deviation and max of those runs are reported, in ms. With
+--compare, the suite runs now, unless given a second file, and each workload
+whose median is more than PERCENT slower than in base.json, by more than the
+two runs' standard deviations together, is flagged as a regression: the
+exit status is 1 if there are any."""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import lib.lang
+from lib.lang import Env, InPort, eof_object, eval, expand, global_env, parse, read, special_functions
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFS = '''
+[defn fib [n] [if [< n 2] n [add [fib [- n 2]] [fib [- n 1]]]]]
+[defn fibco [[n] [fibco 0 1 n]]
+            [[a b n] [if [= 0 n] b [fibco b [add a b] [dec n]]]]]
+[defn xsum [[n] [xsum 0 [range n]]]
+           [[acc xs] [if [= 0 [count xs]] acc [xsum [add acc [first xs]] [rest xs]]]]]
+[defn destructure [xs]
+  [let [[a b . more] xs
+        [c d . tail -as all] more
+        [[e f] g] [list [list a b] c]]
+    [add a b c d e f g [count all]]]]
+[defn destructure-all [n xs] [loop [i 0 acc 0] [if [= i n] acc [recur [inc i] [add acc [destructure xs]]]]]]
+[def key [fn [x] [mod x 1000]]]
+'''
+
+MACROS = '''
+[defn pipeline [x]
+  [cond [< x 0]   [-> x [sub] [mul 2] [add 1] [as-> y [add y y] [mul y 3]]]
+        [= x 0]   -zero
+        [< x 10]  [-> x inc [as-> y [list y y] [apply add y]] [mul 2] dec]
+        [< x 100] [as-> x y [mul y y] [-> y [add 1] [mod 7]] [cond [even? y] y -else [inc y]]]
+        -else     [-> x [div 2] [as-> y [cond [< y 10] y [< y 100] [-> y [mul 2]] -else 0]]]]]
+'''
+
+
+def source(path):
+    with open(os.path.join(ROOT, path)) as f:
+        return f.read()
+
+
+def read_all(text):
+    port, n = InPort(io.StringIO(text)), 0
+    while read(port) is not eof_object:
+        n += 1
+    return n
+
+
+def bracket(src, env, times=1):
+    "A workload that evaluates src in env, times times."
+    x = parse(src)
+
+    def run():
+        for _ in range(times):
+            res = eval(x, env)
+        return res
+
+    return run
+
+
+def workloads(env):
+    "{name: a function of no arguments that does the work once}, for the Env with DEFS."
+    text = source('core.br')
+    macros = read(MACROS)
+    env['xs'] = list(range(100000, 0, -1))
+    env['rows'] = list(range(6))
+    return {
+        'read': lambda: read_all(text * 20),
+        'parse core.br': lambda: parse(text),
+        'expand ->/cond/as->': lambda: [expand(macros, toplevel=True) for _ in range(100)],
+        'fib 20': bracket('[fib 20]', env),
+        'fibco 1000': bracket('[fibco 1000]', env, 20),
+        'xsum 10000': bracket('[xsum 10000]', env),
+        'destructuring let': bracket('[destructure-all 10000 rows]', env),
+        'into vector': bracket('[into [vector] xs]', env),
+        'conj vector': bracket('[reduce conj xs [vector]]', env),
+        'sort-by': bracket('[sort-by key xs]', env),
+    }
+
+
+def timings(fn, runs):
+    "Call fn once to warm up, then runs times; return the wall-clock seconds of each of those."
+    fn()
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def summary(times):
+    ms = [t * 1000 for t in times]
+    return {'runs': len(ms), 'min': min(ms), 'median': statistics.median(ms), 'mean': statistics.mean(ms),
+            'stdev': statistics.stdev(ms) if len(ms) > 1 else 0.0, 'max': max(ms), 'times': ms}
+
+
+def commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(names, runs, evaluator):
+    sys.setrecursionlimit(10000)
+    special_functions()
+    lib.lang.evaluator = evaluator
+    env = Env(outer=global_env)
+    eval(parse(DEFS), env)
+    loads, results = workloads(env), {}
+    unknown = set(names) - set(loads)
+    if unknown:
+        sys.exit(f'unknown workloads: {", ".join(sorted(unknown))}; there are {", ".join(loads)}')
+    print(f"{'workload':<22}{'min':>10}{'median':>10}{'mean':>10}{'stdev':>10}{'max':>10}  ms")
+    for name, fn in loads.items():
+        if names and name not in names:
+            continue
+        stats = results[name] = summary(timings(fn, runs))
+        print(f'{name:<22}' + ''.join(f'{stats[k]:>10.2f}' for k in ('min', 'median', 'mean', 'stdev', 'max')))
+    return {'meta': {'commit': commit(), 'date': time.strftime('%Y-%m-%dT%H:%M:%S'), 'evaluator': evaluator,
+                     'fold': lib.lang.folding, 'vectors': lib.lang.vectors, 'python': platform.python_version(),
+                     'machine': platform.machine(), 'runs': runs},
+            'results': results}
+
+
+def compare(base, new, threshold):
+    "Print how each workload in both base and new changed; return the names of the regressions."
+    regressions = []
+    print(f"{'workload':<22}{'base':>10}{'new':>10}{'change':>9}")
+    for name, old in base['results'].items():
+        if name not in new['results']:
+            continue
+        cur = new['results'][name]
+        change = cur['median'] / old['median'] - 1
+        slower = change * 100 > threshold and cur['median'] - old['median'] > old['stdev'] + cur['stdev']
+        if slower:
+            regressions.append(name)
+        print(f"{name:<22}{old['median']:>10.2f}{cur['median']:>10.2f}{change:>+9.1%}{'  REGRESSION' if slower else ''}")
+    return regressions
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='python -O -m benchmarks.suite', description=__doc__.split('\n')[0])
+    parser.add_argument('workloads', nargs='*', help='the workloads to run, by name: all of them by default')
+    parser.add_argument('-r', '--runs', type=int, default=10, help='timed runs of each workload (10)')
+    parser.add_argument('-e', '--evaluator', default=lib.lang.evaluator, choices=('compile', 'interp', 'stack'))
+    parser.add_argument('-o', '--output', help='save the results to this JSON file')
+    parser.add_argument('--compare', nargs='+', metavar='JSON', help='base.json, and new.json or else a run now')
+    parser.add_argument('-t', '--threshold', type=float, default=5.0,
+                        help='percent slower than base that is a regression (5)')
+    args = parser.parse_args(argv)
+    if args.compare and len(args.compare) > 2:
+        parser.error('--compare takes base.json and at most one other file')
+    if args.compare and len(args.compare) == 2:
+        new = load(args.compare[1])
+    else:
+        new = run(args.workloads, args.runs, args.evaluator)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(new, f, indent=2)
+    if args.compare:
+        print()
+        return 1 if compare(load(args.compare[0]), new, args.threshold) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,39 @@
+"""Transducers against the ->> pipelines they replace: summing, collecting with
+into, and taking the first few, timed and with the peak memory each needs. The
+->> versions make a list or lazy seq per stage; a transducer makes none.
+
+    python -O -m benchmarks.transducers
+"""
+from benchmarks import best_of, peak_memory
+from lib.lang import Env, eval, global_env, parse, special_functions
+
+CASES = [('sum', '[->> xs [mapv inc] [filter even?] [mapv inc] [reduce add]]',
+          '[transduce [comp [map inc] [filter even?] [map inc]] add xs]'),
+         ('into', '[->> xs [mapv inc] [filter even?] [mapv inc] [into []]]',
+          '[into [] [comp [map inc] [filter even?] [map inc]] xs]'),
+         ('take 10', '[->> xs [mapv inc] [filter even?] [take 10] [into []]]',
+          '[into [] [comp [map inc] [filter even?] [take 10]] xs]')]
+
+
+def run(x, env, times):
+    for _ in range(times):
+        res = eval(x, env)
+    return res
+
+
+def main(times=3):
+    special_functions()
+    env = Env(outer=global_env)
+    print(f'{"":<12}{"n":>8}{"->>":>12}{"transduce":>12}{"->> peak":>12}{"xf peak":>12}')
+    for n in (1000, 10000, 100000):
+        env['xs'] = list(range(n))
+        for name, threaded, transduced in CASES:
+            (t1, r1), (t2, r2) = [best_of(run, parse(src), env, times) for src in (threaded, transduced)]
+            assert r1 == r2
+            m1, m2 = [peak_memory(eval, parse(src), env)[0] for src in (threaded, transduced)]
+            print(f'{name:<12}{n:>8}{t1 / times * 1e3:>10.2f}ms{t2 / times * 1e3:>10.2f}ms'
+                  f'{m1 / 1024:>10.0f}kB{m2 / 1024:>10.0f}kB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""Persistent vectors against lists: building n elements with conj and into,
+and walking them with first and rest.
+
+    python -O -m benchmarks.vectors
+"""
+from benchmarks import best_of
+from lib.lang import Env, eval, global_env, parse, special_functions
+
+DEFS = '''
+[defn build [v xs] [loop [v v xs xs] [if [empty? xs] v [recur [conj v [first xs]] [rest xs]]]]]
+[defn walk [xs] [loop [acc 0 xs xs] [if [empty? xs] acc [recur [add acc [first xs]] [rest xs]]]]]
+'''
+
+CASES = [('conj', '[build [] xs]', '[build [vec] xs]'),
+         ('into', '[into [] xs]', '[into [vec] xs]'),
+         ('first/rest', '[walk xs]', '[walk v]')]
+
+
+def run(x, env, times):
+    for _ in range(times):
+        res = eval(x, env)
+    return res
+
+
+def main(times=3):
+    special_functions()
+    env = Env(outer=global_env)
+    eval(parse(DEFS), env)
+    print(f'{"":<16}{"n":>8}{"list":>12}{"vector":>12}')
+    for n in (1000, 10000):
+        env['xs'] = list(range(n))
+        env['v'] = eval(parse('[vec xs]'), env)
+        for name, listed, vectored in CASES:
+            (t1, r1), (t2, r2) = [best_of(run, parse(src), env, times) for src in (listed, vectored)]
+            assert r1 == r2
+            print(f'{name:<16}{n:>8}{t1 / times * 1e3:>10.2f}ms{t2 / times * 1e3:>10.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""On-disk cache of read+expanded .br modules (.brc files).
+
+A .brc file sits next to its source and holds a fixed header followed by
+one pickle per top-level form:
+
+    MAGIC | key digest | payload digest | pickle((line, form)) | ...
+
+The key covers the interpreter version, the source text and the user
+macros in effect when the module was expanded. The payload digest lets a
+truncated or corrupt file be rejected before any form is evaluated.
+"""
+import glob
+import hashlib
+import os
+import pickle
+import sys
+from functools import lru_cache, partial
+
+MAGIC = b'BRC1'
+HEADER = len(MAGIC) + 32 + 32
+
+enabled = os.environ.get('BRACKET_NO_CACHE') is None
+
+
+class CacheError(Exception):
+    pass
+
+
+@lru_cache(maxsize=None)
+def interpreter_version():
+    "Digest of the interpreter sources and Python version; any change invalidates every cache."
+    h = hashlib.sha256(MAGIC + repr(sys.version_info[:2]).encode())
+    for fname in sorted(glob.glob(os.path.join(os.path.dirname(__file__), '*.py'))):
+        with open(fname, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def cache_path(fname):
+    return fname + 'c'
+
+
+def digest(fname):
+    "sha256 of the file fname, read in blocks."
+    h = hashlib.sha256()
+    with open(fname, 'rb') as f:
+        for block in iter(partial(f.read, 1 << 16), b''):
+            h.update(block)
+    return h.digest()
+
+
+def key(source_digest, macros, *extra):
+    "Cache key for a source file (by digest) expanded under the user macros `macros` ({name: form})."
+    h = hashlib.sha256(interpreter_version().encode())
+    h.update(source_digest)
+    for name in sorted(macros):
+        h.update(f'{name}={macros[name]!r};'.encode())
+    for x in extra:
+        h.update(repr(x).encode())
+    return h.digest()
+
+
+def remove(fname):
+    try:
+        os.remove(cache_path(fname))
+    except OSError:
+        pass
+
+
+def load(fname, key):
+    "Return an iterator over the cached (line, form) pairs of fname, or None if there is no valid cache."
+    if not enabled:
+        return None
+    try:
+        with open(cache_path(fname), 'rb') as f:
+            head = f.read(HEADER)
+            if len(head) != HEADER or head[:len(MAGIC)] != MAGIC or head[len(MAGIC):-32] != key:
+                return None
+            digest = hashlib.sha256()
+            for block in iter(partial(f.read, 1 << 16), b''):
+                digest.update(block)
+            if digest.digest() != head[-32:]:
+                return None
+    except OSError:
+        return None
+    return _forms(cache_path(fname))
+
+
+def _forms(path):
+    with open(path, 'rb') as f:
+        f.seek(HEADER)
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+            except Exception as e:
+                raise CacheError(f'{path}: {e}') from e
+
+
+class Writer:
+    """Streams (line, expanded form) pairs into a new cache file for fname. The file only
+    replaces the old cache on commit(); any failure leaves no cache behind."""
+
+    def __init__(self, fname, key):
+        self.path = cache_path(fname)
+        self.tmp = f'{self.path}.{os.getpid()}.tmp'
+        self.digest = hashlib.sha256()
+        self.f = None
+        if enabled:
+            try:
+                self.f = open(self.tmp, 'wb')
+                self.f.write(MAGIC + key + bytes(32))
+            except OSError:
+                self.f = None
+
+    def write(self, form):
+        if self.f is None:
+            return
+        try:
+            data = pickle.dumps(form, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return self.abort()
+        self.digest.update(data)
+        self.f.write(data)
+
+    def commit(self):
+        if self.f is None:
+            return
+        try:
+            self.f.seek(len(MAGIC) + 32)
+            self.f.write(self.digest.digest())
+            self.f.close()
+            os.replace(self.tmp, self.path)
+        except OSError:
+            self.abort()
+        self.f = None
+
+    def abort(self):
+        if self.f is None:
+            return
+        self.f.close()
+        self.f = None
+        try:
+            os.remove(self.tmp)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
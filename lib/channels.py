@@ -0,0 +1,231 @@
+"""Channels, as in Clojure's core.async, on asyncio.
+
+[chan] is an unbuffered channel, on which a put waits for a take and a take
+for a put; [chan n] has a buffer of n, which puts fill without waiting. In
+an async fn, or a go block, which is one, [>! c x] puts x on c and [<! c]
+takes from it, waiting as need be while the loop runs other tasks; outside
+of one, >!! and <!! block the thread until they are done. [alts! ops] does
+the first of several puts, [c x], and takes, c, that can be done, taking
+them in random order unless given [alts! ops true]: it is [value c] for the
+one done, where a put's value is true. [close! c] closes c: puts on it return
+false, and takes, once its buffer is empty, nil. Outside of a loop, it closes
+c on this module's loop, as >!! and <!! put and take on it.
+
+[go ...] runs its body as a task, on the running loop, or else on this
+module's own loop, running in a thread of its own, made the first time it
+is needed; >!!, <!! and alts!! use that one too. A channel belongs to the
+loop its waiting puts and takes are on: it is not for two loops at once.
+
+A waiting put or take is an asyncio Future, a flag, in the channel's queue
+of them; an alts! puts the same flag in each of its channels' queues, and
+whichever channel finds it not yet done first sets its result, leaving it
+done, and so skipped, in the others."""
+import asyncio
+import collections
+import random
+import sys
+import threading
+import traceback
+
+background = None
+background_lock = threading.Lock()
+tasks = set()  # the go tasks running, which asyncio keeps only weak references to
+
+
+class Channel:
+    __slots__ = ('buffer', 'size', 'takes', 'puts', 'closed')
+
+    def __init__(self, size=0):
+        self.buffer, self.size, self.closed = collections.deque(), size, False
+        self.takes, self.puts = collections.deque(), collections.deque()  # flags; (flag, value) pairs
+
+    def offer(self, x):
+        "Put x if that can be done now: True if it was, False if the channel is closed, None if it has to wait."
+        if x is None:
+            raise ValueError("can't put nil on a channel")
+        if self.closed:
+            return False
+        while self.takes:
+            flag = self.takes.popleft()
+            if not flag.done():
+                flag.set_result([x, self])
+                return True
+        if len(self.buffer) < self.size:
+            self.buffer.append(x)
+            return True
+        return None
+
+    def poll(self):
+        "Take a value if that can be done now: [x], [None] if the channel is closed and empty, None if it has to wait."
+        if self.buffer:
+            x = self.buffer.popleft()
+            while self.puts:  # the first waiting put takes the place freed
+                flag, y = self.puts.popleft()
+                if not flag.done():
+                    flag.set_result([True, self])
+                    self.buffer.append(y)
+                    break
+            return [x]
+        while self.puts:
+            flag, y = self.puts.popleft()
+            if not flag.done():
+                flag.set_result([True, self])
+                return [y]
+        if self.closed:
+            return [None]
+        return None
+
+    def close(self):
+        "Close the channel, on the thread of the loop it belongs to; close() gets there from others."
+        self.closed = True
+        while self.takes:  # nothing is waiting to be put, or these would have had it
+            flag = self.takes.popleft()
+            if not flag.done():
+                flag.set_result([None, self])
+
+    def __repr__(self):
+        return f'Channel({len(self.buffer)}/{self.size}{", closed" if self.closed else ""})'
+
+
+def chan(size=0):
+    return Channel(size)
+
+
+def close(c):
+    "[close! c], from any thread: on that of the loop c belongs to, woken to do it if it isn't this one."
+    target = loop()
+    if target is running():
+        c.close()
+    else:
+        target.call_soon_threadsafe(c.close)
+
+
+def timeout(ms):
+    "A channel that closes after ms milliseconds, for alts! to wait on."
+    c, target = Channel(), loop()
+    if target is running():
+        target.call_later(ms / 1000, c.close)
+    else:
+        target.call_soon_threadsafe(target.call_later, ms / 1000, c.close)
+    return c
+
+
+async def alts(ops, priority=False):
+    "[alts! ops]: see the module's docstring."
+    ops = [(op, None, False) if isinstance(op, Channel) else (op[0], op[1], True) for op in ops]
+    if not priority:
+        random.shuffle(ops)
+    for c, x, put in ops:
+        done = c.offer(x) if put else c.poll()
+        if done is not None:
+            return [done, c] if put else [done[0], c]
+    flag = asyncio.get_running_loop().create_future()
+    for c, x, put in ops:
+        if put:
+            c.puts.append((flag, x))
+        else:
+            c.takes.append(flag)
+    try:
+        return await flag  # cancelled with the task awaiting it, it is done, and so skipped
+    finally:
+        for c, _, _ in ops:
+            prune(c)
+
+
+def prune(c):
+    "Drop the done flags alts! has left in c's queues, once there are enough of them to be worth it."
+    if len(c.takes) > 64:
+        c.takes = collections.deque(flag for flag in c.takes if not flag.done())
+    if len(c.puts) > 64:
+        c.puts = collections.deque(put for put in c.puts if not put[0].done())
+
+
+async def put(c, x):
+    "[>! c x]"
+    done = c.offer(x)
+    if done is not None:
+        return done
+    return (await alts([[c, x]], True))[0]
+
+
+async def take(c):
+    "[<! c]"
+    done = c.poll()
+    if done is not None:
+        return done[0]
+    return (await alts([c], True))[0]
+
+
+def running():
+    "The loop running in this thread, or None."
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def loop():
+    "The running loop, or else the one of this module, running in a daemon thread."
+    global background
+    if running() is not None:
+        return running()
+    with background_lock:
+        if background is None:
+            background = asyncio.new_event_loop()
+            threading.Thread(target=background.run_forever, name='bracket-go', daemon=True).start()
+    return background
+
+
+def go_call(f):
+    """Run the async fn f, with no arguments, as a task: a channel that gets
+    what it returns, unless that is nil, and then closes. An error f raises
+    is printed to stderr, as core.async's default handler does, and the
+    channel closes with nothing on it."""
+    c = Channel(1)
+
+    async def run():
+        try:
+            x = await f()
+            if x is not None:
+                c.offer(x)
+        except Exception as e:
+            print('Exception in go block:', file=sys.stderr)
+            traceback.print_exception(e, file=sys.stderr)
+        finally:
+            c.close()
+
+    spawn(run())
+    return c
+
+
+def spawn(coroutine):
+    target = loop()
+    if target is running():
+        task = target.create_task(coroutine)
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    else:
+        asyncio.run_coroutine_threadsafe(coroutine, target)
+
+
+def blocking(coroutine):
+    "Run coroutine on this module's loop, and wait for it in this thread, which must not be running a loop."
+    if running() is None:
+        return asyncio.run_coroutine_threadsafe(coroutine, loop()).result()
+    coroutine.close()
+    raise RuntimeError('would block the running loop: in an async fn or go block, use >!, <! and alts!')
+
+
+def put_blocking(c, x):
+    "[>!! c x]"
+    return blocking(put(c, x))
+
+
+def take_blocking(c):
+    "[<!! c]"
+    return blocking(take(c))
+
+
+def alts_blocking(ops, priority=False):
+    "[alts!! ops]"
+    return blocking(alts(ops, priority))
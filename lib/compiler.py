@@ -0,0 +1,530 @@
+"""Closure compiler: the default evaluator.
+
+analyze() walks an expanded form once and returns a Python function of an
+Env that evaluates it, built out of closures for each kind of form
+(variable, if, def, begin, fn, application). The bodies of [fn ...] forms are
+analyzed along with the fn form itself, so calling a Procedure runs those
+closures rather than re-dispatching on the lists of its body.
+
+Names are resolved when a fn is compiled: each clause gets a Scope listing
+its parameters and the names its body defs, and a reference to one of them
+compiles to an indexed load from the Frame of that clause, found a fixed
+number of .outer steps up. Only globals (whatever is left over) and
+namespace references are looked up by name, in the Env the outermost fn
+was made in.
+
+Calls in tail position (the last form of a body, either branch of an if)
+are not made: they return a TailCall to the trampoline in call(), so tail
+recursion runs in constant stack, as it does in the interpreter."""
+import lib.lang
+from lib.core import nil
+from lib.destructure import element_plan, parameters, plan, recur_parameters
+from lib.lang import Env, Procedure, Proc, define_macro, interpret
+from lib.symbols import Symbol, quote_, if_, def_, begin_, defmacro_, fn_, let_, and_, or_, loop_, recur_, \
+    requiresym_, importsym_, dot_, async_fn_
+from lib.utils import isa
+from lib.vector import vec
+
+falsy = (None, False, nil)
+
+
+class TailCall:
+    "A call in tail position, handed back to call() instead of being made."
+    __slots__ = ('proc', 'args')
+
+    def __init__(self, proc, args):
+        self.proc, self.args = proc, args
+
+
+class Recur:
+    "The values of a recur, handed back to the loop or fn clause it goes back to."
+    __slots__ = ('args',)
+
+    def __init__(self, args):
+        self.args = args
+
+
+class Frame:
+    """The locals of one call of a compiled fn clause, in the order of its Scope.
+    globals is the Env the outermost enclosing fn was made in."""
+    __slots__ = ('values', 'outer', 'globals')
+
+    def __init__(self, values, outer):
+        self.values, self.outer = values, outer
+        self.globals = outer.globals if type(outer) is Frame else outer
+
+
+def frame_env(frame, scope, names):
+    """An Env binding those of names that scope has to their values in frame,
+    inside one for the Frame and Scope around them, and so on out to the Env."""
+    if scope is None:
+        return frame
+    env = Env(outer=frame_env(frame.outer, scope.outer, names))
+    for name, i in scope.index.items():
+        if name in names:
+            env[name] = frame.values[i]
+    return env
+
+
+class Scope:
+    """The names of one fn clause's Frame at compile time, and the Scope of the
+    clause around it. The let forms in the clause add names to copies of its
+    Scope, with slots of their own in the same Frame; size counts them all."""
+
+    def __init__(self, names, outer=None):
+        self.index, self.outer, self.slots = {}, outer, [0]
+        for name in names:
+            if name not in self.index:
+                self.add(name)
+
+    def add(self, name):
+        self.index[name] = self.slots[0]
+        self.slots[0] += 1
+
+    @property
+    def size(self):
+        return self.slots[0]
+
+    def block(self):
+        "A Scope for a let in this one: the same Frame, and the names bound so far."
+        inner = Scope((), self.outer)
+        inner.index, inner.slots = dict(self.index), self.slots
+        return inner
+
+    def resolve(self, name):
+        "The (depth, index) address of the local name, or None if it is global."
+        depth, scope = 0, self
+        while scope is not None:
+            if name in scope.index:
+                return depth, scope.index[name]
+            depth, scope = depth + 1, scope.outer
+        return None
+
+
+def execute(x, env):
+    "Compile the expanded form x and run it in env."
+    return analyze(x)(env)
+
+
+def call(proc, args):
+    "Run the compiled Proc proc on args, trampolining its tail calls."
+    while True:
+        bind, body = proc.code
+        res = body(bind(proc.env, args))
+        if type(res) is not TailCall:
+            return res
+        proc, args = res.proc, res.args
+
+
+def analyze(x, scope=None, tail=False):
+    """Compile the expanded form x to a function of its environment: the Env
+    itself at top level (scope None), else the Frame of the fn clause whose
+    Scope is scope. With tail=True the function may return a TailCall, which
+    only call() knows how to run."""
+    if isa(x, Symbol):
+        return analyze_variable(x, scope)
+    if not isa(x, list) or len(x) == 0:  # constant literal
+        return lambda env: x
+
+    op = x[0]
+    if op is quote_:
+        (_, exp) = x
+        return lambda env: exp
+    if op is if_:
+        return analyze_if(x, scope, tail)
+    if op is def_:
+        return analyze_def(x, scope)
+    if op is begin_:
+        return analyze_begin(x, scope, tail)
+    if op is defmacro_:
+        (_, var, exp) = x
+
+        def defmacro(env):
+            define_macro(var, exp, env if scope is None else env.globals)
+
+        return defmacro
+    if op is fn_:
+        return analyze_fn(x, scope)
+    if op is async_fn_:
+        return coroutines.analyze_async_fn(x, scope)
+    if op is let_:
+        return analyze_let(x, scope, tail)
+    if op is and_ or op is or_:
+        return analyze_and_or(x, scope, tail)
+    if op is loop_:
+        return analyze_loop(x, scope, tail)
+    if op is recur_:
+        return analyze_recur(x, scope)
+    return analyze_application(x, scope, tail)
+
+
+def analyze_variable(x, scope):
+    if '/' in x:  # namespace reference, e.g. op/mod
+        n, m = x.split('/')
+        if scope is not None and scope.resolve(n) is not None:
+            namespace = analyze_variable(Symbol(n), scope)
+            return lambda env: namespace(env)[m]
+        namespace = analyze_variable(Symbol(n), scope)
+        cache = None, -1, None
+
+        def namespace_variable(env):
+            nonlocal cache
+            g = globals_of(env, scope)
+            found, version, value = cache  # one read, as another thread may replace it
+            if g is found and Env.version == version:
+                return value
+            version, ns = Env.version, namespace(env)
+            if isa(ns, Env):  # anything else, e.g. a hashmap, can change without a def
+                cache = g, version, ns[m]
+            return ns[m]
+
+        return namespace_variable
+
+    address = scope.resolve(x) if scope is not None else None
+    if address is None:
+        return analyze_global(x, scope)
+
+    depth, i = address
+    if depth == 0:
+        return lambda env: env.values[i]
+    if depth == 1:
+        return lambda env: env.outer.values[i]
+    if depth == 2:
+        return lambda env: env.outer.outer.values[i]
+
+    def local(env):
+        for _ in range(depth):
+            env = env.outer
+        return env.values[i]
+
+    return local
+
+
+def analyze_global(x, scope):
+    """Look x up from the Env at the bottom of the frames, the first time and
+    whenever a def, import or require has changed Env.version since; in between,
+    return the value found last time (if the code still runs in the same Env).
+    The three are replaced together, for threads running the code at once."""
+    cache = None, -1, None  # the Env the lookup started from, Env.version then, the value found
+
+    def lookup(env):
+        nonlocal cache
+        version, e = Env.version, env
+        while x not in e:
+            e = e.outer
+            if e is None:
+                raise LookupError(x)
+        value = e[x]
+        cache = env, version, value
+        return value
+
+    if scope is None:
+        def variable(env):
+            found, version, value = cache
+            if env is found and Env.version == version:
+                return value
+            return lookup(env)
+    else:
+        def variable(env):
+            env = env.globals
+            found, version, value = cache
+            if env is found and Env.version == version:
+                return value
+            return lookup(env)
+
+    return variable
+
+
+def globals_of(env, scope):
+    return env if scope is None else env.globals
+
+
+def analyze_if(x, scope, tail):
+    (_, test, conseq, alt) = x
+    test, conseq, alt = analyze(test, scope), analyze(conseq, scope, tail), analyze(alt, scope, tail)
+
+    def if_form(env):
+        return (conseq if test(env) not in falsy else alt)(env)
+
+    return if_form
+
+
+def analyze_def(x, scope):
+    (_, var, exp) = x
+    exp = analyze(exp, scope)
+
+    if scope is None:
+        def def_form(env):
+            env[var] = exp(env)
+            env.changed()
+    else:  # a local: defs() gave it a slot in this clause's Frame
+        i = scope.index[var]
+
+        def def_form(env):
+            env.values[i] = exp(env)
+
+    return def_form
+
+
+def analyze_begin(x, scope, tail):
+    if len(x) == 1:
+        return lambda env: None
+    body, last = [analyze(e, scope) for e in x[1:-1]], analyze(x[-1], scope, tail)
+
+    def begin(env):
+        for exp in body:
+            exp(env)
+        return last(env)
+
+    return last if not body else begin
+
+
+def clauses(x):
+    "The [parms *body] clauses of the fn form x."
+    return [list(x[1:])] if len(x) > 2 else x[1]
+
+
+def analyze_fn(x, scope):
+    forms = clauses(x)
+    codes = []
+    for parms, *body in forms:
+        inner = Scope(parameters(parms) + defs(body), scope)
+        code = analyze_body(body, inner)  # first: its lets add slots to the Frame
+        if recurs([begin_, *body]):
+            names = recur_parameters(parms)
+            if all(isa(p, Symbol) for p in names):
+                rebind = rebinder([inner.index[p] for p in names])
+            else:
+                rebind = plan(names, inner.index.__getitem__)
+            code = looping(code, rebind, makes_fns([begin_, *body]))
+        codes.append((framer(parms, inner), code))
+
+    def fn(env):
+        return Procedure(env, forms, codes, scope)
+
+    return fn
+
+
+def analyze_body(body, scope):
+    if not body:
+        return lambda env: None
+    return analyze([begin_, *body], scope, tail=True)
+
+
+def defs(body):
+    "The names body defs outside of any fn, let or loop in it, which are locals of the clause body belongs to."
+    names = []
+    for x in body:
+        if isa(x, list) and x and x[0] is not quote_ and x[0] is not fn_ and x[0] is not let_ and x[0] is not loop_:
+            if x[0] is def_ and len(x) == 3:
+                names.append(x[1])
+            names.extend(defs(x))
+    return names
+
+
+def framer(parms, scope):
+    """Return bind(outer, args), which makes the Frame for one call of the clause
+    with parameter vector parms and Scope scope, with parms bound to args."""
+    size = scope.size
+    if isa(parms, list) and all(isa(p, Symbol) and p is not dot_ for p in parms) and len(set(parms)) == len(parms):
+        if size == len(parms):
+            return lambda outer, args: Frame([*args], outer)
+        extra = [None] * (size - len(parms))  # slots for the body's defs
+        return lambda outer, args: Frame([*args, *extra], outer)
+
+    bind = plan(parms, scope.index.__getitem__)
+
+    def bind_frame(outer, args):
+        values = [None] * size
+        bind(values, args)
+        return Frame(values, outer)
+
+    return bind_frame
+
+
+def analyze_let(x, scope, tail):
+    """Bind the names of a let in the Frame it runs in, each in a slot of its
+    own so a closure made between two bindings of a name sees the first one.
+    The defs in its body are locals of the let. At top level, where there is
+    no Frame, the let makes one."""
+    (_, bindings, *body) = x
+    top = scope is None
+    block = Scope(()) if top else scope.block()
+    steps = []
+    for i in range(0, len(bindings), 2):
+        p, exp = bindings[i], analyze(bindings[i + 1], block)
+        block = block.block()
+        for name in parameters(p):
+            block.add(name)
+        steps.append((exp, element_plan(p, block.index.__getitem__)))
+    for name in defs(body):
+        block.add(name)
+    body = analyze([begin_, *body], block, tail)
+    slots = block.slots
+
+    def let(env):
+        if top:
+            env = Frame([None] * slots[0], env)
+        values = env.values
+        for exp, bind in steps:
+            bind(values, exp(env))
+        return body(env)
+
+    return let
+
+
+def analyze_and_or(x, scope, tail):
+    exps, last = [analyze(e, scope) for e in x[1:-1]], analyze(x[-1], scope, tail)
+
+    if x[0] is and_:
+        def and_or(env):
+            for exp in exps:
+                value = exp(env)
+                if value in falsy:
+                    return value
+            return last(env)
+    else:
+        def and_or(env):
+            for exp in exps:
+                value = exp(env)
+                if value not in falsy:
+                    return value
+            return last(env)
+
+    return and_or
+
+
+def analyze_loop(x, scope, tail):
+    """A loop runs in a Frame of its own, bound like a let's names. Unless its
+    body makes fns, which could keep the Frame, recur rebinds it in place."""
+    (_, bindings, *body) = x
+    block = Scope((), scope)
+    steps, slots = [], []  # slots: where each name bound goes in the Frame
+    for p, exp in zip(bindings[::2], bindings[1::2]):
+        exp = analyze(exp, block)
+        block = block.block()
+        for name in parameters(p):
+            block.add(name)
+        steps.append((exp, element_plan(p, block.index.__getitem__)))
+        slots.append(block.index[p] if isa(p, Symbol) else None)
+    for name in defs(body):
+        block.add(name)
+    if all(isa(p, Symbol) for p in bindings[::2]):
+        rebind = rebinder(slots)
+    else:
+        binds = [bind for _, bind in steps]
+
+        def rebind(values, args):
+            for bind, value in zip(binds, args):
+                bind(values, value)
+
+    body = looping(analyze([begin_, *body], block, tail), rebind, makes_fns([begin_, *body]))
+    size = block.slots
+
+    def loop(env):
+        frame = Frame([None] * size[0], env)
+        values = frame.values
+        for exp, bind in steps:
+            bind(values, exp(frame))
+        return body(frame)
+
+    return loop
+
+
+def analyze_recur(x, scope):
+    exps = [analyze(e, scope) for e in x[1:]]
+    if len(exps) == 1:
+        a, = exps
+        return lambda env: Recur([a(env)])
+    if len(exps) == 2:
+        a, b = exps
+        return lambda env: Recur([a(env), b(env)])
+    return lambda env: Recur([exp(env) for exp in exps])
+
+
+def rebinder(slots):
+    "rebind(values, args) for recur values that go to the Frame slots slots, one each."
+    start = slots[0] if slots else 0
+    if slots == list(range(start, start + len(slots))):
+        end = start + len(slots)
+
+        def rebind(values, args):
+            values[start:end] = args
+    else:
+        def rebind(values, args):
+            for i, value in zip(slots, args):
+                values[i] = value
+
+    return rebind
+
+
+def looping(body, rebind, fresh):
+    """Run body in a Frame, and again each time it returns a Recur, after
+    rebind(values, args) has bound the recur's values into the Frame: the same
+    one, or a copy if fresh, so that fns made on the last pass keep theirs."""
+    def loop(frame):
+        while True:
+            res = body(frame)
+            if type(res) is not Recur:
+                return res
+            if fresh:
+                frame = Frame([*frame.values], frame.outer)
+            rebind(frame.values, res.args)
+
+    return loop
+
+
+def recurs(x):
+    "Does the expanded form x recur, outside of the fns and loops in it?"
+    if not isa(x, list) or len(x) == 0:
+        return False
+    op = x[0]
+    if op is recur_:
+        return True
+    if op is quote_ or op is fn_ or op is loop_ or op is defmacro_:
+        return False
+    return any(recurs(e) for e in x)
+
+
+def makes_fns(x):
+    "Could evaluating the expanded form x make a fn, i.e. a closure?"
+    if not isa(x, list) or len(x) == 0:
+        return False
+    if x[0] is quote_:
+        return False
+    if x[0] is fn_ or x[0] is defmacro_:
+        return True
+    return any(makes_fns(e) for e in x)
+
+
+def quote_names(x):
+    "The application x with its arguments quoted if it is a require or import, whose arguments are names."
+    op = x[0]
+    if op is requiresym_ or op is importsym_:
+        if isa(x[-1], list):  # [require stdlib *]
+            return [*x[:-1], [quote_, x[-1]]]
+        return [op, *[[quote_, e] for e in x[1:]]]
+    return x
+
+
+def analyze_application(x, scope, tail):
+    f, *args = [analyze(e, scope) for e in quote_names(x)]
+    invoke = TailCall if tail else call
+    vectors = lib.lang.vectors
+
+    def application(env):
+        proc = f(env)
+        exps = [arg(env) for arg in args]
+        if isinstance(proc, Procedure):  # isinstance rather than isa: this runs on every call
+            proc = proc.proc(*exps)
+            if proc.code is None:  # made by the interpreter
+                return interpret(proc.exp, proc.new_env(exps), proc)
+            return invoke(proc, exps)
+        if callable(proc):
+            return proc(*exps)
+        return vec([proc, *exps]) if vectors else [proc, *exps]  # a vector literal
+
+    return application
+
+
+from lib import coroutines  # noqa: E402  (it builds on this module)
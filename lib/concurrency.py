@@ -0,0 +1,210 @@
+"""future, promise, atom and agent: Clojure's concurrency primitives, on threads.
+
+Futures, and the actions sent to agents, run on one ThreadPoolExecutor that
+they all share, made the first time it is needed with BRACKET_THREADS
+threads (concurrent.futures' default without it); [set-threads! n] makes
+another. Threads suit work that waits, on sockets or files; only one of them
+runs Python at a time, so work that computes is better spread over
+processes, with pmap and fold (lib.parallel).
+
+deref reads any of them: the result of a future, the value delivered to a
+promise, the value of an atom or the state of an agent, waiting for the first
+two, for at most timeout-ms if given one."""
+import collections
+import concurrent.futures
+import os
+import threading
+import time
+
+threads = int(os.environ.get('BRACKET_THREADS') or 0) or None
+
+executor = None
+executor_lock = threading.Lock()
+
+
+def get_executor():
+    "The shared pool, made the first time it is asked for."
+    global executor
+    if executor is None:
+        with executor_lock:
+            if executor is None:
+                executor = concurrent.futures.ThreadPoolExecutor(threads, thread_name_prefix='bracket')
+    return executor
+
+
+def set_threads(n):
+    "Replace the shared pool with one of n threads, from now on; what the old one has started finishes there."
+    global threads, executor
+    with executor_lock:
+        old, threads, executor = executor, n, None
+    if old is not None:
+        old.shutdown(wait=False)
+
+
+def future_call(f):
+    "Call f with no arguments in the shared pool: a Future of what it returns, or raises, for deref."
+    return get_executor().submit(f)
+
+
+class Promise:
+    "A value delivered once, by any thread, which deref waits for."
+    __slots__ = ('value', 'event', 'lock')
+
+    def __init__(self):
+        self.value, self.event, self.lock = None, threading.Event(), threading.Lock()
+
+    def deliver(self, x):
+        "Deliver x and return this promise, or None if something was delivered already."
+        with self.lock:
+            if self.event.is_set():
+                return None
+            self.value = x
+            self.event.set()
+        return self
+
+    def __repr__(self):
+        return f'Promise({self.value!r})' if self.event.is_set() else 'Promise(<pending>)'
+
+
+def promise():
+    return Promise()
+
+
+def deliver(p, x):
+    return p.deliver(x)
+
+
+class Atom:
+    """A value changed by swapping in a function of it, atomically: swap
+    computes the new value outside of the lock, and tries again if another
+    thread set the atom meanwhile, so f may be called more than once."""
+    __slots__ = ('value', 'lock')
+
+    def __init__(self, value):
+        self.value, self.lock = value, threading.Lock()
+
+    def compare_and_set(self, old, new):
+        "Set the value to new if it is still old, the same object; return whether it was."
+        with self.lock:
+            if self.value is not old:
+                return False
+            self.value = new
+            return True
+
+    def swap(self, f, *args):
+        while True:
+            old = self.value
+            new = f(old, *args)
+            if self.compare_and_set(old, new):
+                return new
+
+    def reset(self, x):
+        with self.lock:
+            self.value = x
+        return x
+
+    def __repr__(self):
+        return f'Atom({self.value!r})'
+
+
+def atom(x):
+    return Atom(x)
+
+
+def swap(a, f, *args):
+    "[swap! a f args...] sets a to [f value args...], for its value then, and returns that."
+    return a.swap(f, *args)
+
+
+def reset(a, x):
+    return a.reset(x)
+
+
+def compare_and_set(a, old, new):
+    return a.compare_and_set(old, new)
+
+
+class AgentError(Exception):
+    "An action sent to an agent raised an error, which is the cause; the agent takes no more actions."
+
+
+class Agent:
+    """State changed by the actions sent to it, one at a time, in the order
+    they were sent, each a task in the shared pool: an action is called with
+    the state, and what it returns is the new state. The queue holds the
+    action running and those waiting for it; one raising an error stops the
+    agent there, keeping the error."""
+    __slots__ = ('value', 'error', 'actions', 'lock')
+
+    def __init__(self, state):
+        self.value, self.error = state, None
+        self.actions, self.lock = collections.deque(), threading.Lock()
+
+    def send(self, f, *args):
+        if self.error is not None:
+            raise AgentError('agent has failed') from self.error
+        with self.lock:
+            self.actions.append((f, args))
+            first = len(self.actions) == 1  # else one is running, and runs this after it
+        if first:
+            get_executor().submit(self.run)
+        return self
+
+    def run(self):
+        "Run the action at the head of the queue, then submit the next, if there is one."
+        f, args = self.actions[0]
+        try:
+            self.value = f(self.value, *args)
+        except Exception as e:
+            self.error = e
+        with self.lock:
+            self.actions.popleft()
+            more = self.actions and self.error is None
+        if more:
+            get_executor().submit(self.run)
+
+    def __repr__(self):
+        return f'Agent({self.value!r})'
+
+
+def agent(state):
+    return Agent(state)
+
+
+def send(a, f, *args):
+    "[send a f args...] has a run [f state args...], after the actions sent to it before; return a at once."
+    return a.send(f, *args)
+
+
+def agent_error(a):
+    return a.error
+
+
+def await_for(timeout_ms, *agents):
+    "Wait at most timeout-ms for the actions sent so far to agents to have run; return whether they have."
+    done = [threading.Event() for _ in agents]
+    for a, event in zip(agents, done):
+        a.send(lambda state, event=event: event.set() or state)
+    deadline = time.monotonic() + timeout_ms / 1000
+    return all(event.wait(max(0, deadline - time.monotonic())) for event in done)
+
+
+def deref(ref, *args):
+    """[deref ref] is the value of ref, waiting for a future or promise to have
+    one; [deref ref timeout-ms timeout-val] waits at most timeout-ms, then gives
+    timeout-val. A future that raised an error raises it here."""
+    timeout, default = (args[0] / 1000, args[1]) if args else (None, None)
+    if isinstance(ref, concurrent.futures.Future):
+        if not concurrent.futures.wait([ref], timeout).done:  # rather than catch a TimeoutError the future may raise
+            return default
+        return ref.result()
+    if isinstance(ref, Promise):
+        return ref.value if ref.event.wait(timeout) else default
+    return ref.value
+
+
+def realizedp(ref):
+    "Whether a future has finished or a promise been delivered to."
+    if isinstance(ref, concurrent.futures.Future):
+        return ref.done()
+    return ref.event.is_set()
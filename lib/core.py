@@ -1,15 +1,20 @@
+import collections.abc
 import fractions
+import itertools
 import operator as op
-from functools import lru_cache
 
 import naga
-import pickle
 
 from lib.symbols import Symbol
 from lib.utils import isa
+from lib import hamt, seq as lazy
+from lib.seq import ChunkedSeq
+from lib.vector import VectorBase, vec
 
 
 def empty(x):
+    if isinstance(x, ChunkedSeq):
+        return x.empty()  # without realizing it, which may never end
     return len(x) == 0
 
 
@@ -79,7 +84,240 @@ count = len
 
 
 def cons(a, b):
-    return [a] + b
+    return [a] + b  # a Vector b makes a Vector
+
+
+PERSISTENT = (VectorBase, hamt.HashMap, hamt.Set)  # hamt.Set, as naga's * has a Set too
+
+
+def conj(x, *args):
+    "x with args added: the same kind of collection for a persistent one, otherwise a new list, as naga's conj makes."
+    if isinstance(x, PERSISTENT):
+        return x.conj(*args)
+    return naga.conj(x, *args)
+
+
+SEQUENTIAL = (VectorBase, ChunkedSeq)
+
+
+def first(x):
+    "naga's first, straight to the method of a Vector or ChunkedSeq rather than through its dispatch."
+    return x.first() if isinstance(x, SEQUENTIAL) else naga.first(x)
+
+
+def rest(x):
+    return x.rest() if isinstance(x, SEQUENTIAL) else naga.rest(x)
+
+
+def into(*args):
+    """[into to xs] conjs each element of xs onto to, building a persistent
+    collection through a transient; [into xs] is a list of xs, [into] an empty one."""
+    if len(args) < 2:
+        return list(*args)
+    if len(args) == 3:
+        to, xform, xs = args
+        if isinstance(to, PERSISTENT):
+            return transduce(xform, conj_, to.transient(), entries(xs)).persistent()
+        return transduce(xform, append_, list(to), xs)
+    to, xs = args
+    if isinstance(to, PERSISTENT):
+        return to.transient().conj(*entries(xs)).persistent()
+    return list(itertools.chain(to, xs))
+
+
+def entries(xs):
+    "The entries of a map, rather than its keys, for conjing onto a persistent collection."
+    return xs.items() if isinstance(xs, collections.abc.Mapping) else xs
+
+
+# Transducers, as in Clojure. A reducing function rf is called as rf() for its initial value, rf(acc) to finish,
+# and rf(acc, x) for each x; a transducer takes one and returns another that transforms what it is given, as
+# [map f], [filter pred], [take n], [partition n] and [dedupe] do. comp chains them, the first seeing the
+# elements first. A step that returns a Reduced stops the reduction there.
+
+NO_ARG = object()
+
+
+class Reduced:
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __repr__(self):
+        return f'Reduced({self.value!r})'
+
+
+def reduced(x):
+    return Reduced(x)
+
+
+def reducedp(x):
+    return isinstance(x, Reduced)
+
+
+def unreduced(x):
+    return x.value if isinstance(x, Reduced) else x
+
+
+def ensure_reduced(x):
+    return x if isinstance(x, Reduced) else Reduced(x)
+
+
+def completing(f, cf=None):
+    "A reducing function that steps with f, a function of two arguments, and finishes with cf, by default as is."
+    def rf(acc=NO_ARG, x=NO_ARG):
+        if x is not NO_ARG:
+            return f(acc, x)
+        if acc is NO_ARG:
+            return f()
+        return acc if cf is None else cf(acc)
+    return rf
+
+
+def conj_(acc, x=NO_ARG):
+    return acc if x is NO_ARG else acc.conj(x)
+
+
+def append_(acc, x=NO_ARG):
+    if x is not NO_ARG:
+        acc.append(x)
+    return acc
+
+
+def reduce_(rf, acc, xs):
+    "Reduce xs with the step of rf from acc, stopping at a Reduced."
+    for x in xs:
+        acc = rf(acc, x)
+        if isinstance(acc, Reduced):
+            return acc.value
+    return acc
+
+
+def transduce(xform, f, *args):
+    "[transduce xform f xs] reduces xs with [xform f] from [f], in one pass; [transduce xform f init xs], from init."
+    init, xs = (f(), args[0]) if len(args) == 1 else args
+    rf = xform(f)
+    return rf(reduce_(rf, init, xs))
+
+
+def sequence(*args):
+    """[sequence xs] is a lazy seq of xs; [sequence xform xs], a lazy seq of what
+    xform makes of them, run a chunk of xs at a time."""
+    if len(args) == 1:
+        return lazy.seq(args[0])
+    xform, xs = args
+
+    def chunks():
+        rf = xform(append_)
+        for items in lazy.chunked(xs):
+            out = []
+            for x in items:
+                if isinstance(rf(out, x), Reduced):
+                    yield rf(out)
+                    return
+            yield out
+        yield rf([])
+
+    return lazy.ChunkedSeq.of(chunks())
+
+
+def mapping(f):
+    def xform(rf):
+        def step(acc=NO_ARG, x=NO_ARG):
+            if x is NO_ARG:
+                return rf() if acc is NO_ARG else rf(acc)
+            return rf(acc, f(x))
+        return step
+    return xform
+
+
+def filtering(pred):
+    def xform(rf):
+        def step(acc=NO_ARG, x=NO_ARG):
+            if x is NO_ARG:
+                return rf() if acc is NO_ARG else rf(acc)
+            return rf(acc, x) if pred(x) else acc
+        return step
+    return xform
+
+
+def taking(n):
+    def xform(rf):
+        left = n
+
+        def step(acc=NO_ARG, x=NO_ARG):
+            nonlocal left
+            if x is NO_ARG:
+                return rf() if acc is NO_ARG else rf(acc)
+            left -= 1
+            if left >= 0:
+                acc = rf(acc, x)
+            return acc if left > 0 else ensure_reduced(acc)
+        return step
+    return xform
+
+
+def partitioning(n):
+    "Tuples of n elements, the last filled out with None, as naga's partition makes."
+    def xform(rf):
+        part = []
+
+        def step(acc=NO_ARG, x=NO_ARG):
+            if x is NO_ARG:
+                if acc is NO_ARG:
+                    return rf()
+                if part:
+                    whole = tuple(part) + (None,) * (n - len(part))
+                    part.clear()
+                    acc = unreduced(rf(acc, whole))
+                return rf(acc)
+            part.append(x)
+            if len(part) < n:
+                return acc
+            whole = tuple(part)
+            part.clear()
+            return rf(acc, whole)
+        return step
+    return xform
+
+
+def deduping():
+    def xform(rf):
+        prev = NO_ARG
+
+        def step(acc=NO_ARG, x=NO_ARG):
+            nonlocal prev
+            if x is NO_ARG:
+                return rf() if acc is NO_ARG else rf(acc)
+            if x == prev:
+                return acc
+            prev = x
+            return rf(acc, x)
+        return step
+    return xform
+
+
+def map_(f, *colls):
+    "[map f xs...] is a lazy seq; [map f], a transducer."
+    return lazy.map_(f, *colls) if colls else mapping(f)
+
+
+def filter_(pred, *xs):
+    return lazy.filter_(pred, *xs) if xs else filtering(pred)
+
+
+def take(n, *xs):
+    return lazy.take(n, *xs) if xs else taking(n)
+
+
+def partition(n, *xs):
+    return naga.partition(n, *xs) if xs else partitioning(n)
+
+
+def dedupe(*xs):
+    "[dedupe xs] is a lazy seq of xs without consecutive repeats; [dedupe], a transducer."
+    return sequence(deduping(), *xs) if xs else deduping()
 
 
 def car(x): return x[0]
@@ -96,7 +334,7 @@ def list_(*args):
 
 
 def listp(x):
-    return isa(x, list)
+    return isa(x, (list, VectorBase))
 
 
 def to_list(x):
@@ -135,7 +373,7 @@ def false_(x):
 
 def apply(f, *x):
     lst = x[-1]
-    if isa(lst, (list, tuple, str)):
+    if isa(lst, (list, tuple, str, VectorBase)):
         a = list(x[:-1])
         args = a + list(lst)
     else:
@@ -150,60 +388,6 @@ def kwapply(f, *args):
 
 def in_(a, b):
     return a in b
-
-
-def memo(fn=None, max_cachesize=32):
-    @decorator
-    def newmemo(fn):
-        def _call(*args, **kwargs):
-            return fn(*args, **kwargs)
-
-        return _call
-
-    @decorator
-    def _memo(fn):
-
-        @lru_cache(maxsize=max_cachesize)
-        def newfn(args, kwargs):
-            to_args = []
-            for arg in args:
-                try:
-                    to_args.append(pickle.loads(arg))
-                except TypeError:
-                    to_args.append(arg)
-
-            _args = tuple(to_args)
-            _kwargs = pickle.loads(kwargs)
-            return fn(*_args, **_kwargs)
-
-        def _call(*args, **kwargs):
-            to_args = []
-            for arg in args:
-                try:
-                    to_args.append(pickle.dumps(arg))
-                except (pickle.PicklingError, TypeError):
-                    to_args.append(arg)
-
-            _args = tuple(to_args)
-
-            _kwargs = pickle.dumps(kwargs)
-            return newfn(_args, _kwargs)
-
-        return _call
-
-    if isinstance(fn, int):
-        return memo(newmemo, max_cachesize=max_cachesize)
-    else:
-        return _memo(fn)
-
-
-
-
-
-
-
-
-
 # 'eval': lambda x: eval(expand(x)),
 # 'load': lambda fn: load(fn),
 
@@ -0,0 +1,307 @@
+"""async-fn and await: bracket fns compiled into coroutines.
+
+[async-fn [x] ...] is a fn whose clauses, called, return a coroutine rather
+than run; [await x] in one waits for the awaitable x, e.g. what another async
+fn or a Python async library returns, letting the asyncio loop run something
+else meanwhile. As in Python, await can only be in the body of an async fn
+itself, not in the fns inside it.
+
+Async fns are always compiled, by whichever evaluator runs the form that
+makes them. The parts of a body that do not await are compiled by
+lib.compiler as they are in any fn, into the same Frames; only the forms on
+the way to an await become coroutine functions here, built the same way.
+
+An [await [f ...]] in tail position, on an async fn f, is not awaited but
+handed back as an AsyncTailCall to run(), the coroutine that runs the
+clause, which goes on to run f's clause itself: so async fns that call each
+other in tail position run in constant stack, as other fns do, and recur
+goes back to the top of a loop or clause without a call, awaits and all."""
+from lib import compiler
+from lib.compiler import Frame, Recur, Scope, clauses, defs, framer, makes_fns, quote_names, rebinder, recurs
+from lib.destructure import element_plan, parameters, plan, recur_parameters
+from lib.lang import Procedure
+from lib.symbols import Symbol, quote_, if_, def_, begin_, defmacro_, fn_, let_, and_, or_, loop_, recur_, \
+    async_fn_, await_
+from lib.utils import isa
+from lib.vector import vec
+
+import lib.lang
+
+falsy = compiler.falsy
+
+
+def awaits(x):
+    "Does the expanded form x await, outside of the fns and async fns in it?"
+    if not isa(x, list) or len(x) == 0:
+        return False
+    op = x[0]
+    if op is await_:
+        return True
+    if op is quote_ or op is fn_ or op is async_fn_ or op is defmacro_:
+        return False
+    return any(awaits(e) for e in x)
+
+
+class AsyncTailCall:
+    "An [await [f ...]] in tail position on an async fn, handed back to run() instead of being awaited."
+    __slots__ = ('proc', 'args')
+
+    def __init__(self, proc, args):
+        self.proc, self.args = proc, args
+
+
+class AsyncProcedure(Procedure):
+    "An async fn. Calling it starts nothing: it returns a coroutine, which runs the clause for the arguments."
+    form = async_fn_
+
+
+class Clause:
+    "The body of an async fn clause, for a Proc's code: called on a Frame, the coroutine that runs it."
+    __slots__ = ('body',)
+
+    def __init__(self, body):
+        self.body = body
+
+    def __call__(self, frame):
+        return run(self.body(frame))
+
+
+async def run(coroutine):
+    "Await coroutine, the body of an async fn clause, and the clauses it hands on to in tail position."
+    res = await coroutine
+    while type(res) is AsyncTailCall:
+        proc = res.proc
+        bind, clause = proc.code
+        res = await clause.body(bind(proc.env, res.args))
+    return res
+
+
+def analyze_async_fn(x, scope):
+    forms = clauses(x)
+    codes = []
+    for parms, *body in forms:
+        inner = Scope(parameters(parms) + defs(body), scope)
+        code = coroutine(*analyze([begin_, *body], inner, tail=True))
+        if recurs([begin_, *body]):
+            names = recur_parameters(parms)
+            if all(isa(p, Symbol) for p in names):
+                rebind = rebinder([inner.index[p] for p in names])
+            else:
+                rebind = plan(names, inner.index.__getitem__)
+            code = looping(code, rebind, makes_fns([begin_, *body]))
+        codes.append((framer(parms, inner), Clause(code)))
+
+    def async_fn(env):
+        return AsyncProcedure(env, forms, codes, scope)
+
+    return async_fn
+
+
+def coroutine(code, is_async):
+    "code as a coroutine function, which it already is if is_async."
+    if is_async:
+        return code
+
+    async def body(env):
+        return code(env)
+
+    return body
+
+
+def analyze(x, scope, tail=False):
+    """Compile the expanded form x, in the body of an async fn clause, to
+    (code, is_async): code is a coroutine function of the Frame if is_async,
+    which it is if x awaits; otherwise it is lib.compiler's plain function."""
+    if not awaits(x):
+        return compiler.analyze(x, scope), False
+    op = x[0]
+    if op is await_:
+        return analyze_await(x, scope, tail), True
+    if op is if_:
+        return analyze_if(x, scope, tail), True
+    if op is def_:
+        return analyze_def(x, scope), True
+    if op is begin_:
+        return analyze_begin(x, scope, tail), True
+    if op is let_:
+        return analyze_let(x, scope, tail), True
+    if op is and_ or op is or_:
+        return analyze_and_or(x, scope, tail), True
+    if op is loop_:
+        return analyze_loop(x, scope, tail), True
+    if op is recur_:
+        return analyze_recur(x, scope), True
+    return analyze_application(x, scope), True
+
+
+def analyze_await(x, scope, tail):
+    (_, exp) = x
+    if tail and isa(exp, list) and exp and not (isa(exp[0], Symbol) and exp[0] in special):  # [await [f ...]]
+        f, *args = [analyze(e, scope) for e in quote_names(exp)]
+
+        async def tail_await(env):
+            proc = (await f[0](env)) if f[1] else f[0](env)
+            exps = [(await arg(env)) if is_async else arg(env) for arg, is_async in args]
+            if isinstance(proc, AsyncProcedure):
+                return AsyncTailCall(proc.proc(*exps), exps)
+            return await call(proc, exps)
+
+        return tail_await
+    exp, is_async = analyze(exp, scope)
+
+    async def await_form(env):
+        return await ((await exp(env)) if is_async else exp(env))
+
+    return await_form
+
+
+special = {quote_, if_, def_, begin_, defmacro_, fn_, async_fn_, let_, and_, or_, loop_, recur_, await_}
+
+
+def call(proc, exps):
+    "Apply proc to exps, as an application does."
+    if callable(proc):
+        return proc(*exps)
+    return vec([proc, *exps]) if lib.lang.vectors else [proc, *exps]  # a vector literal
+
+
+def analyze_application(x, scope):
+    exps = [analyze(e, scope) for e in quote_names(x)]
+
+    async def application(env):
+        values = [(await exp(env)) if is_async else exp(env) for exp, is_async in exps]
+        return call(values[0], values[1:])
+
+    return application
+
+
+def analyze_if(x, scope, tail):
+    (_, test, conseq, alt) = x
+    (test, a), conseq, alt = analyze(test, scope), analyze(conseq, scope, tail), analyze(alt, scope, tail)
+
+    async def if_form(env):
+        code, is_async = conseq if ((await test(env)) if a else test(env)) not in falsy else alt
+        return (await code(env)) if is_async else code(env)
+
+    return if_form
+
+
+def analyze_def(x, scope):
+    (_, var, exp) = x
+    exp = coroutine(*analyze(exp, scope))
+    i = scope.index[var]  # a local: defs() gave it a slot in this clause's Frame
+
+    async def def_form(env):
+        env.values[i] = await exp(env)
+
+    return def_form
+
+
+def analyze_begin(x, scope, tail):
+    exps = [analyze(e, scope) for e in x[1:-1]] + [analyze(x[-1], scope, tail)]
+
+    async def begin(env):
+        for exp, is_async in exps[:-1]:
+            (await exp(env)) if is_async else exp(env)
+        exp, is_async = exps[-1]
+        return (await exp(env)) if is_async else exp(env)
+
+    return begin
+
+
+def analyze_let(x, scope, tail):
+    "As lib.compiler's, in the Frame of the clause: an async fn's body always has one."
+    (_, bindings, *body) = x
+    block = scope.block()
+    steps = []
+    for i in range(0, len(bindings), 2):
+        p, exp = bindings[i], analyze(bindings[i + 1], block)
+        block = block.block()
+        for name in parameters(p):
+            block.add(name)
+        steps.append((exp, element_plan(p, block.index.__getitem__)))
+    for name in defs(body):
+        block.add(name)
+    body = coroutine(*analyze([begin_, *body], block, tail))
+
+    async def let(env):
+        values = env.values
+        for (exp, is_async), bind in steps:
+            bind(values, (await exp(env)) if is_async else exp(env))
+        return await body(env)
+
+    return let
+
+
+def analyze_and_or(x, scope, tail):
+    exps = [analyze(e, scope) for e in x[1:-1]] + [analyze(x[-1], scope, tail)]
+    is_and = x[0] is and_
+
+    async def and_or(env):
+        for exp, is_async in exps[:-1]:
+            value = (await exp(env)) if is_async else exp(env)
+            if (value in falsy) is is_and:
+                return value
+        exp, is_async = exps[-1]
+        return (await exp(env)) if is_async else exp(env)
+
+    return and_or
+
+
+def analyze_loop(x, scope, tail):
+    "As lib.compiler's, with a body that awaits."
+    (_, bindings, *body) = x
+    block = Scope((), scope)
+    steps, slots = [], []
+    for p, exp in zip(bindings[::2], bindings[1::2]):
+        exp = coroutine(*analyze(exp, block))
+        block = block.block()
+        for name in parameters(p):
+            block.add(name)
+        steps.append((exp, element_plan(p, block.index.__getitem__)))
+        slots.append(block.index[p] if isa(p, Symbol) else None)
+    for name in defs(body):
+        block.add(name)
+    if all(isa(p, Symbol) for p in bindings[::2]):
+        rebind = rebinder(slots)
+    else:
+        binds = [bind for _, bind in steps]
+
+        def rebind(values, args):
+            for bind, value in zip(binds, args):
+                bind(values, value)
+
+    body = looping(coroutine(*analyze([begin_, *body], block, tail)), rebind, makes_fns([begin_, *body]))
+    size = block.slots
+
+    async def loop(env):
+        frame = Frame([None] * size[0], env)
+        values = frame.values
+        for exp, bind in steps:
+            bind(values, await exp(frame))
+        return await body(frame)
+
+    return loop
+
+
+def analyze_recur(x, scope):
+    exps = [analyze(e, scope) for e in x[1:]]
+
+    async def recur(env):
+        return Recur([(await exp(env)) if is_async else exp(env) for exp, is_async in exps])
+
+    return recur
+
+
+def looping(body, rebind, fresh):
+    "lib.compiler's looping, for a body that is a coroutine function."
+    async def loop(frame):
+        while True:
+            res = await body(frame)
+            if type(res) is not Recur:
+                return res
+            if fresh:
+                frame = Frame([*frame.values], frame.outer)
+            rebind(frame.values, res.args)
+
+    return loop
@@ -1,8 +1,117 @@
-from naga import partition, first, second, rest, filterv
+from naga import partition, first, second, rest, filterv, get
 
+from lib.core import dropv
 from lib.special_forms import KeyWord
-from lib.symbols import Symbol, quote_
+from lib.symbols import Symbol, quote_, dot_
 from lib.utils import isa, AutoGenSym
+from lib.vector import VectorBase
+
+as_ = KeyWord('as')
+dropv_, get_ = Symbol('dropv'), Symbol('get')
+
+
+def plan(parms, key=None):
+    """Compile the parameter vector parms once into bind(target, args), which
+    binds its names to the values in args: plain names, [. rest], and nested
+    vectors with [. rest] and [-as whole]. A name is stored at target[key(name)],
+    or target[name] without key, so target can be an Env or a list of slots."""
+    key = key or (lambda name: name)
+    if isa(parms, Symbol):
+        k = key(parms)
+
+        def bind(target, args):
+            target[k] = list(args)
+
+        return bind
+
+    parms, k_rest = list(parms), None
+    if len(parms) >= 2 and parms[-2] is dot_:
+        k_rest = key(parms[-1])
+        parms = parms[:-2]
+    n = len(parms)
+
+    if all(isa(p, Symbol) for p in parms):
+        keys = [key(p) for p in parms]
+
+        def bind(target, args):
+            for k, v in zip(keys, args):
+                target[k] = v
+            if k_rest is not None:
+                target[k_rest] = list(args[n:])
+    else:
+        steps = [element_plan(p, key) for p in parms]
+
+        def bind(target, args):
+            for step, v in zip(steps, args):
+                step(target, v)
+            if k_rest is not None:
+                target[k_rest] = list(args[n:])
+
+    return bind
+
+
+def element_plan(p, key=None):
+    """bind(target, v) for one element p of a parameter vector, or one binding
+    of a let: a name, or a nested vector to destructure v with."""
+    key = key or (lambda name: name)
+    if not isa(p, list):
+        k = key(p)
+
+        def bind(target, v):
+            target[k] = v
+
+        return bind
+
+    k_as = k_rest = None
+    if len(p) >= 3 and p[-2] is as_ and isa(p[-1], Symbol):
+        k_as, p = key(p[-1]), p[:-2]
+    if len(p) >= 2 and p[-2] is dot_ and isa(p[-1], Symbol):
+        k_rest, p = key(p[-1]), p[:-2]
+    n = len(p)
+    steps = [element_plan(e, key) for e in p]
+
+    def bind(target, v):
+        if k_as is not None:
+            target[k_as] = v
+        if type(v) is list or type(v) is tuple:  # the common case, without naga's generic get and drop
+            if k_rest is not None:
+                target[k_rest] = list(v[n:])
+            for i, step in enumerate(steps):
+                step(target, v[i] if i < len(v) else None)
+            return
+        if isinstance(v, VectorBase):  # the rest is a view sharing v's elements
+            if k_rest is not None:
+                target[k_rest] = v[n:]
+            for i, step in enumerate(steps):
+                step(target, v.get(i))
+            return
+        if k_rest is not None:
+            target[k_rest] = dropv(n, v)
+        for i, step in enumerate(steps):
+            step(target, get(v, i))
+
+    return bind
+
+
+def parameters(parms):
+    "The names the parameter vector parms binds, in order."
+    if isa(parms, Symbol):
+        return [parms]
+    names = []
+    for p in parms:
+        if isa(p, list):
+            names.extend(parameters(p))
+        elif isa(p, Symbol) and p is not dot_:
+            names.append(p)
+    return names
+
+
+def recur_parameters(parms):
+    """The parameter vector a recur back to a fn clause with parameter vector
+    parms binds: one value for each parameter, the rest parameter included."""
+    if isa(parms, Symbol):
+        return [parms]
+    return [p for p in parms if p is not dot_]
 
 
 def destruct(bindings, args, ag=None):
@@ -17,18 +126,18 @@ def destruct(bindings, args, ag=None):
             res.extend(symbol_binding(nb, v))
 
             # "-as" directive
-            if len(b) >= 3 and b[-2] == KeyWord('as') and isa(b[-1], Symbol):
+            if len(b) >= 3 and b[-2] is as_ and isa(b[-1], Symbol):
                 ba = b[-1]
                 b = b[:-2]
                 res.extend(symbol_binding(ba, nb))
 
             # variable arrity directive
-            if len(b) >= 2 and b[-2] == '.' and isa(b[-1], Symbol):
+            if len(b) >= 2 and b[-2] is dot_ and isa(b[-1], Symbol):
                 vargsn = b[-1]
                 b = b[:-2]
-                res.extend(symbol_binding(vargsn, [Symbol('dropv'), len(b), nb]))
+                res.extend(symbol_binding(vargsn, [dropv_, len(b), nb]))
 
-            res.extend([[x, [Symbol('get'), nb, i]] for i, x in enumerate(b)])
+            res.extend([[x, [get_, nb, i]] for i, x in enumerate(b)])
             res = res[:1] + destruct(*zip(*res[1:]), *[ag])
 
         return res
@@ -49,7 +158,7 @@ def destruct(bindings, args, ag=None):
 
     v = first(args)
 
-    if b == '.':
+    if b is dot_:
         # TODO: trouble spot
         return destruct(first(rest(bindings)), list(args), ag)
 
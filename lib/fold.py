@@ -0,0 +1,226 @@
+"""Constant folding: an optional pass over expanded forms, run after macroexpansion.
+
+fold(x, env) returns x with
+* calls of pure functions on constant arguments replaced by their result,
+  e.g. [add 1 2] => 3, [py/str 12] => '12', [mod 7 3] => 1
+* [if test a b] with a constant test replaced by a or b, and the constant
+  leading arguments of [and ...] and [or ...] dropped or returned
+* names bound to a constant by a let, or by the only def of the name in a
+  fn body, replaced by the constant where the binding is in scope.
+
+A function is pure if it is one of the builtins in PURE, or a Procedure all
+of whose clauses only call pure functions, without def or fn. Names are
+resolved in env when the form is folded, so a global bound to a pure
+function then and redefined later keeps its old meaning in forms that were
+folded in between. That is why the pass is off unless BRACKET_FOLD is set.
+
+Only results that evaluate to themselves and cannot be mutated in place are
+folded in: numbers, strings, booleans, None, keywords, tuples and frozensets.
+A call that raises is left for run time."""
+import builtins
+import fractions
+import operator
+
+import naga
+
+from lib import core
+from lib.compiler import clauses, defs
+from lib.core import nil
+from lib.destructure import parameters
+from lib.lang import Procedure
+from lib.special_forms import KeyWord
+from lib.symbols import Symbol, quote_, if_, def_, begin_, defmacro_, fn_, let_, and_, or_, loop_, recur_, \
+    async_fn_, await_
+from lib.utils import isa
+
+falsy = (None, False, nil)
+
+PURE = {id(f) for f in [
+    core.add, core.mul, core.sub, core.div, core.gt, core.lt, core.lte, core.gte, core.eq, core.eqq,
+    core.neq, core.not_, core.false_, core.nullp, core.symbolp, core.boolean, core.pformat, core.in_,
+    naga.inc, naga.dec,
+    builtins.str, builtins.int, builtins.float, builtins.bool, builtins.len, builtins.abs, builtins.min,
+    builtins.max, builtins.round, builtins.repr, builtins.ord, builtins.chr, builtins.pow, builtins.divmod,
+    operator.add, operator.sub, operator.mul, operator.truediv, operator.floordiv, operator.mod,
+    operator.pow, operator.neg, operator.pos, operator.abs, operator.eq, operator.ne, operator.lt,
+    operator.le, operator.gt, operator.ge, operator.not_, operator.truth, operator.and_, operator.or_,
+    operator.xor, operator.lshift, operator.rshift, operator.invert, operator.concat]}
+
+CONSTANT_TYPES = {int, float, complex, fractions.Fraction, str, bool, type(None), KeyWord, tuple, frozenset}
+
+NOT_FOUND = object()
+
+
+def fold(x, env):
+    "The expanded form x with its constant parts computed, as seen from env."
+    return Folder(env).fold(x, {}, frozenset())
+
+
+def is_constant(x):
+    "Does the expanded form x evaluate to itself?"
+    return not isa(x, (Symbol, list))
+
+
+def embeddable(value):
+    return type(value) in CONSTANT_TYPES
+
+
+class Folder:
+    def __init__(self, env):
+        self.env, self.pure_procedures = env, {}
+
+    def fold(self, x, consts, local):
+        """Fold x, where consts maps the names known to be bound to constants
+        and local holds every other name bound by an enclosing fn."""
+        if isa(x, Symbol):
+            return consts.get(x, x)
+        if not isa(x, list) or len(x) == 0:
+            return x
+
+        op = x[0]
+        if op is quote_ or op is defmacro_:
+            return x
+        if op is if_:
+            (_, test, conseq, alt) = x
+            test = self.fold(test, consts, local)
+            if is_constant(test):
+                return self.fold(conseq if test not in falsy else alt, consts, local)
+            return [if_, test, self.fold(conseq, consts, local), self.fold(alt, consts, local)]
+        if op is def_:
+            (_, var, exp) = x
+            return [def_, var, self.fold(exp, consts, local)]
+        if op is begin_:
+            return [begin_, *[self.fold(e, consts, local) for e in x[1:]]]
+        if op is fn_ or op is async_fn_:
+            return [op, [self.clause(form, consts, local) for form in clauses(x)]]
+        if op is let_:
+            return self.let(x, consts, local)
+        if op is loop_:
+            return self.loop(x, consts, local)
+        if op is recur_:
+            return [recur_, *[self.fold(e, consts, local) for e in x[1:]]]
+        if op is and_ or op is or_:
+            args = [self.fold(e, consts, local) for e in x[1:]]
+            while len(args) > 1 and is_constant(args[0]):
+                if (args[0] in falsy) is (op is and_):
+                    return args[0]
+                args.pop(0)
+            return args[0] if len(args) == 1 else [op, *args]
+
+        args = [self.fold(e, consts, local) for e in x[1:]]
+        f = self.fold(op, consts, local)
+        if all(is_constant(a) or is_quote(a) for a in args) and self.pure(f, local):
+            try:
+                value = self.function(f)(*[a[1] if is_quote(a) else a for a in args])
+            except Exception:
+                return [f, *args]
+            if embeddable(value):
+                return value
+        return [f, *args]
+
+    def clause(self, form, consts, local):
+        "Fold the [parms *body] clause of a fn."
+        parms, *body = form
+        names = parameters(parms) + defs(body)
+        local = local | set(names)
+        consts = {k: v for k, v in consts.items() if k not in names}
+        once = {n for n in names if names.count(n) == 1}
+        folded = []
+        for e in body:
+            e = self.fold(e, consts, local)
+            if isa(e, list) and len(e) == 3 and e[0] is def_ and e[1] in once and is_constant(e[2]):
+                consts = {**consts, e[1]: e[2]}  # read from here on; before the def the name is unbound
+            folded.append(e)
+        return [parms, *folded]
+
+    def let(self, x, consts, local):
+        "Fold [let bindings *body], reading the names bound to constants, and not def'd in body, as those."
+        (_, bindings, *body) = x
+        defined = set(defs(body))
+        folded = []
+        for p, exp in zip(bindings[::2], bindings[1::2]):
+            exp = self.fold(exp, consts, local)
+            names = parameters(p)
+            consts = {k: v for k, v in consts.items() if k not in names}
+            if isa(p, Symbol) and is_constant(exp) and p not in defined:
+                consts[p] = exp
+            else:
+                local = local | set(names)
+            folded += [p, exp]
+        consts = {k: v for k, v in consts.items() if k not in defined}
+        return [let_, folded, *[self.fold(e, consts, local | defined) for e in body]]
+
+    def loop(self, x, consts, local):
+        "Fold [loop bindings *body], whose names recur can rebind to anything."
+        (_, bindings, *body) = x
+        folded = []
+        for p, exp in zip(bindings[::2], bindings[1::2]):
+            folded += [p, self.fold(exp, consts, local)]
+            names = parameters(p)
+            consts = {k: v for k, v in consts.items() if k not in names}
+            local = local | set(names)
+        defined = set(defs(body))
+        consts = {k: v for k, v in consts.items() if k not in defined}
+        return [loop_, folded, *[self.fold(e, consts, local | defined) for e in body]]
+
+    def function(self, f):
+        "The value of the head f, a name or a value."
+        if isa(f, Symbol):
+            return lookup(f, self.env)
+        return f
+
+    def pure(self, f, local, env=None):
+        "Is the head f of an application, with names looked up in env, a pure function?"
+        if isa(f, list):
+            return False
+        if isa(f, Symbol):
+            if f in local or f.split('/')[0] in local:
+                return False
+            f = lookup(f, env or self.env)
+        if id(f) in PURE:
+            return True
+        return self.pure_procedure(f)
+
+    def pure_procedure(self, f):
+        "Is f a Procedure whose clauses only call pure functions?"
+        if not isinstance(f, Procedure):
+            return False
+        if id(f) not in self.pure_procedures:
+            self.pure_procedures[id(f)] = False  # recursive calls are not proven pure
+            self.pure_procedures[id(f)] = all(self.pure_body(p.exp, set(parameters(p.parms)), p.env)
+                                              for p in f.procs)
+        return self.pure_procedures[id(f)]
+
+    def pure_body(self, x, local, env):
+        if isa(x, Symbol):  # a global could be redefined
+            return x in local
+        if not isa(x, list) or len(x) == 0:
+            return True
+        op = x[0]
+        if op is quote_:
+            return True
+        if op is def_ or op is defmacro_ or op is fn_ or op is async_fn_ or op is loop_ or op is recur_ or op is await_:
+            return False
+        if op is let_:
+            bindings = x[1]
+            return (all(self.pure_body(e, local, env) for e in bindings[1::2])
+                    and all(self.pure_body(e, local | set(parameters(bindings[::2])), env) for e in x[2:]))
+        if op is if_ or op is begin_ or op is and_ or op is or_:
+            return all(self.pure_body(e, local, env) for e in x[1:])
+        return self.pure(op, local, env) and all(self.pure_body(e, local, env) for e in x[1:])
+
+
+def lookup(name, env):
+    "The value of the global name in env, or NOT_FOUND."
+    try:
+        if '/' in name:
+            n, m = name.split('/')
+            return env.find(n)[n][m]
+        return env.find(name)[name]
+    except (LookupError, TypeError, ValueError, AttributeError):
+        return NOT_FOUND
+
+
+def is_quote(x):
+    return isa(x, list) and len(x) == 2 and x[0] is quote_
+
@@ -0,0 +1,504 @@
+"""Persistent hash maps and sets: hash array mapped tries, as in Clojure.
+
+A HashMap keeps its entries in a trie indexed by 5 bits of the keys' hashes
+at each level. A BitmapNode stores only the entries and children it has, in
+a list, with a bitmap of which of its 32 slots they take; keys whose whole
+hashes are equal share a CollisionNode. assoc and dissoc take O(log32 n)
+and copy only the nodes on one path from the root. A Set is a HashMap of
+its elements to themselves.
+
+TransientHashMap and TransientSet are the mutable, single-owner versions,
+for building a map or set in bulk, like lib.vector's TransientVector.
+
+HashMaps are Mappings and Sets are collections.abc.Sets, equal to the dicts
+and sets with the same elements. Both are callable, as the dict and set
+subclasses they replace were: [m k] and [-k m] look k up in m, and [s x]
+is x if s has it, else nil."""
+import collections.abc
+import itertools
+
+import naga
+from naga.tools import Dict, Set as SetProtocol
+
+BITS = 5
+MASK = (1 << BITS) - 1
+HASH_MASK = (1 << 64) - 1
+
+NODE = object()  # in the key slot of a BitmapNode's array: the value slot holds a child node
+NOT_FOUND = object()
+
+try:
+    popcount = int.bit_count
+except AttributeError:  # before Python 3.10
+    def popcount(x):
+        return bin(x).count('1')
+
+
+def hash_of(key):
+    return hash(key) & HASH_MASK
+
+
+class Change:
+    "How much an assoc or without changed the size of the trie by."
+    __slots__ = ('delta',)
+
+    def __init__(self):
+        self.delta = 0
+
+
+class BitmapNode:
+    """A node of the trie: a key and value for each entry, in the order of
+    their slots in bitmap, or NODE and a child node. Only the transient
+    whose token is edit may change it."""
+    __slots__ = ('edit', 'bitmap', 'array')
+
+    def __init__(self, edit, bitmap, array):
+        self.edit, self.bitmap, self.array = edit, bitmap, array
+
+    def editable(self, edit):
+        if edit is not None and self.edit is edit:
+            return self
+        return BitmapNode(edit, self.bitmap, self.array[:])
+
+    def set(self, edit, i, *values):
+        node = self.editable(edit)
+        node.array[i:i + len(values)] = values
+        return node
+
+    def find(self, shift, h, key, not_found):
+        bit = 1 << ((h >> shift) & MASK)
+        if not self.bitmap & bit:
+            return not_found
+        i = 2 * popcount(self.bitmap & (bit - 1))
+        k = self.array[i]
+        if k is NODE:
+            return self.array[i + 1].find(shift + BITS, h, key, not_found)
+        return self.array[i + 1] if k is key or k == key else not_found
+
+    def assoc(self, edit, shift, h, key, val, change):
+        bit = 1 << ((h >> shift) & MASK)
+        i = 2 * popcount(self.bitmap & (bit - 1))
+        if self.bitmap & bit:
+            k, v = self.array[i], self.array[i + 1]
+            if k is NODE:
+                node = v.assoc(edit, shift + BITS, h, key, val, change)
+                return self if node is v else self.set(edit, i + 1, node)
+            if k is key or k == key:
+                return self if v is val else self.set(edit, i + 1, val)
+            change.delta = 1
+            return self.set(edit, i, NODE, pair_node(edit, shift + BITS, k, v, h, key, val))
+        change.delta = 1
+        node = self.editable(edit)
+        node.array[i:i] = [key, val]
+        node.bitmap |= bit
+        return node
+
+    def without(self, edit, shift, h, key, change):
+        "This node without key, or None if that leaves it empty."
+        bit = 1 << ((h >> shift) & MASK)
+        if not self.bitmap & bit:
+            return self
+        i = 2 * popcount(self.bitmap & (bit - 1))
+        k, v = self.array[i], self.array[i + 1]
+        if k is NODE:
+            node = v.without(edit, shift + BITS, h, key, change)
+            if node is v:
+                return self
+            if node is not None:
+                return self.set(edit, i + 1, node)
+        elif k is key or k == key:
+            change.delta = -1
+        else:
+            return self
+        if self.bitmap == bit:
+            return None
+        node = self.editable(edit)
+        del node.array[i:i + 2]
+        node.bitmap ^= bit
+        return node
+
+    def entries(self):
+        array = self.array
+        for i in range(0, len(array), 2):
+            if array[i] is NODE:
+                yield from array[i + 1].entries()
+            else:
+                yield array[i], array[i + 1]
+
+
+class CollisionNode:
+    "The entries of keys whose hashes are all h, as a key and a value for each."
+    __slots__ = ('edit', 'h', 'array')
+
+    def __init__(self, edit, h, array):
+        self.edit, self.h, self.array = edit, h, array
+
+    def editable(self, edit):
+        if edit is not None and self.edit is edit:
+            return self
+        return CollisionNode(edit, self.h, self.array[:])
+
+    def index(self, key):
+        array = self.array
+        for i in range(0, len(array), 2):
+            if array[i] is key or array[i] == key:
+                return i
+        return -1
+
+    def find(self, shift, h, key, not_found):
+        i = self.index(key) if h == self.h else -1
+        return self.array[i + 1] if i >= 0 else not_found
+
+    def assoc(self, edit, shift, h, key, val, change):
+        if h != self.h:  # push this node down, under one that tells the two hashes apart
+            node = BitmapNode(edit, 1 << ((self.h >> shift) & MASK), [NODE, self])
+            return node.assoc(edit, shift, h, key, val, change)
+        i = self.index(key)
+        if i >= 0:
+            if self.array[i + 1] is val:
+                return self
+            node = self.editable(edit)
+            node.array[i + 1] = val
+            return node
+        change.delta = 1
+        node = self.editable(edit)
+        node.array += [key, val]
+        return node
+
+    def without(self, edit, shift, h, key, change):
+        i = self.index(key) if h == self.h else -1
+        if i < 0:
+            return self
+        change.delta = -1
+        if len(self.array) == 2:
+            return None
+        node = self.editable(edit)
+        del node.array[i:i + 2]
+        return node
+
+    def entries(self):
+        array = self.array
+        for i in range(0, len(array), 2):
+            yield array[i], array[i + 1]
+
+
+def pair_node(edit, shift, k1, v1, h2, k2, v2):
+    "A node at shift for the two entries k1 and k2, whose hashes agree up to shift."
+    h1 = hash_of(k1)
+    if h1 == h2:
+        return CollisionNode(edit, h1, [k1, v1, k2, v2])
+    change = Change()
+    return EMPTY_NODE.assoc(edit, shift, h1, k1, v1, change).assoc(edit, shift, h2, k2, v2, change)
+
+
+EMPTY_NODE = BitmapNode(None, 0, [])
+
+
+def pairs(items):
+    "The (key, value) pairs of a mapping, or of an iterable of pairs."
+    return items.items() if isinstance(items, collections.abc.Mapping) else items
+
+
+class ItemsView(collections.abc.ItemsView):
+    __slots__ = ()
+
+    def __iter__(self):
+        return self._mapping.root.entries()
+
+
+class ValuesView(collections.abc.ValuesView):
+    __slots__ = ()
+
+    def __iter__(self):
+        return (v for _, v in self._mapping.root.entries())
+
+
+class HashMap(collections.abc.Mapping):
+    "A persistent map, made like a dict: HashMap(mapping or pairs, **kwargs)."
+    __slots__ = ('count', 'root', 'hash_value')
+
+    def __init__(self, items=(), **kwargs):
+        if isinstance(items, HashMap) and not kwargs:
+            self.count, self.root = items.count, items.root
+        else:
+            m = EMPTY.transient().conj(*pairs(items), *kwargs.items()).persistent()
+            self.count, self.root = m.count, m.root
+        self.hash_value = None
+
+    @classmethod
+    def of(cls, count, root):
+        m = cls.__new__(cls)
+        m.count, m.root, m.hash_value = count, root, None
+        return m
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return (k for k, _ in self.root.entries())
+
+    def __getitem__(self, key):
+        v = self.root.find(0, hash_of(key), key, NOT_FOUND)
+        if v is NOT_FOUND:
+            raise KeyError(key)
+        return v
+
+    def __contains__(self, key):
+        return self.root.find(0, hash_of(key), key, NOT_FOUND) is not NOT_FOUND
+
+    def get(self, key, not_found=None):
+        return self.root.find(0, hash_of(key), key, not_found)
+
+    def __call__(self, key, not_found=None):
+        return self.root.find(0, hash_of(key), key, not_found)
+
+    def __setitem__(self, key, val):  # assoc! and update! in core.br
+        raise TypeError('HashMaps are persistent: assoc! and update! take a [transient m]')
+
+    def items(self):
+        return ItemsView(self)
+
+    def values(self):
+        return ValuesView(self)
+
+    def assoc(self, key, val, *kvs):
+        if kvs:
+            return self.transient().assoc(key, val, *kvs).persistent()
+        change = Change()
+        root = self.root.assoc(None, 0, hash_of(key), key, val, change)
+        return self if root is self.root else HashMap.of(self.count + change.delta, root)
+
+    def dissoc(self, *keys):
+        root, change, count = self.root, Change(), self.count
+        for key in keys:
+            change.delta = 0
+            root = root.without(None, 0, hash_of(key), key, change) or EMPTY_NODE
+            count += change.delta
+        return self if root is self.root else HashMap.of(count, root)
+
+    def conj(self, *entries):
+        "This map with the [key value] pairs entries, or the entries of maps, added."
+        return self.transient().conj(*entries).persistent() if entries else self
+
+    def update(self, key, f, *args):
+        return self.assoc(key, f(self.get(key), *args))
+
+    def transient(self):
+        return TransientHashMap(self)
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, HashMap):
+            return super().__eq__(other)
+        if self.count != other.count:
+            return False
+        if self.root is other.root:
+            return True
+        if self.hash_value is not None and other.hash_value is not None and self.hash_value != other.hash_value:
+            return False
+        for k, v in self.root.entries():
+            w = other.root.find(0, hash_of(k), k, NOT_FOUND)
+            if w is not v and (w is NOT_FOUND or w != v):
+                return False
+        return True
+
+    def __hash__(self):
+        if self.hash_value is None:
+            self.hash_value = hash(frozenset(self.root.entries()))
+        return self.hash_value
+
+    def __repr__(self):
+        return '{' + ', '.join(f'{k!r}: {v!r}' for k, v in self.root.entries()) + '}'
+
+    def __reduce__(self):
+        return HashMap, (list(self.root.entries()),)
+
+
+class TransientHashMap:
+    """A map that assoc, dissoc and conj change in place, made by transient()
+    from a HashMap that it then shares nodes with, until persistent()."""
+    __slots__ = ('count', 'root', 'edit')
+
+    def __init__(self, m):
+        self.count, self.root, self.edit = m.count, m.root, object()
+
+    def ensure_editable(self):
+        if self.edit is None:
+            raise RuntimeError('transient used after persistent!')
+
+    def __len__(self):
+        self.ensure_editable()
+        return self.count
+
+    def get(self, key, not_found=None):
+        self.ensure_editable()
+        return self.root.find(0, hash_of(key), key, not_found)
+
+    __call__ = get
+
+    def __getitem__(self, key):
+        v = self.get(key, NOT_FOUND)
+        if v is NOT_FOUND:
+            raise KeyError(key)
+        return v
+
+    def __contains__(self, key):
+        return self.get(key, NOT_FOUND) is not NOT_FOUND
+
+    def assoc(self, *kvs):
+        self.ensure_editable()
+        change = Change()
+        for key, val in zip(kvs[::2], kvs[1::2]):
+            change.delta = 0
+            self.root = self.root.assoc(self.edit, 0, hash_of(key), key, val, change)
+            self.count += change.delta
+        return self
+
+    def __setitem__(self, key, val):  # assoc! in core.br
+        self.assoc(key, val)
+
+    def dissoc(self, *keys):
+        self.ensure_editable()
+        change = Change()
+        for key in keys:
+            change.delta = 0
+            self.root = self.root.without(self.edit, 0, hash_of(key), key, change) or EMPTY_NODE
+            self.count += change.delta
+        return self
+
+    def __delitem__(self, key):
+        self.dissoc(key)
+
+    def conj(self, *entries):
+        self.ensure_editable()
+        change, edit = Change(), self.edit
+        for entry in entries:
+            for key, val in pairs(entry) if isinstance(entry, collections.abc.Mapping) else [entry]:
+                change.delta = 0
+                self.root = self.root.assoc(edit, 0, hash_of(key), key, val, change)
+                self.count += change.delta
+        return self
+
+    def persistent(self):
+        self.ensure_editable()
+        self.edit = None  # the nodes made so far can no longer change
+        return HashMap.of(self.count, self.root)
+
+
+class Set(collections.abc.Set):
+    "A persistent set, made like a set: Set(iterable)."
+    __slots__ = ('map', 'hash_value')
+
+    def __init__(self, xs=()):
+        self.map = xs.map if isinstance(xs, Set) else EMPTY.transient().assoc(*itertools.chain.from_iterable(
+            (x, x) for x in xs)).persistent()
+        self.hash_value = None
+
+    @classmethod
+    def of(cls, m):
+        s = cls.__new__(cls)
+        s.map, s.hash_value = m, None
+        return s
+
+    @classmethod
+    def _from_iterable(cls, xs):  # for the operators of collections.abc.Set, e.g. s | t
+        return cls(xs)
+
+    def __len__(self):
+        return self.map.count
+
+    def __iter__(self):
+        return iter(self.map)
+
+    def __contains__(self, x):
+        return x in self.map
+
+    def get(self, x, not_found=None):
+        return self.map.get(x, not_found)
+
+    def __call__(self, x):
+        return self.map.get(x)
+
+    def conj(self, *xs):
+        if len(xs) != 1:
+            return self.transient().conj(*xs).persistent() if xs else self
+        return self.with_map(self.map.assoc(xs[0], xs[0]))
+
+    def disj(self, *xs):
+        return self.with_map(self.map.dissoc(*xs))
+
+    def with_map(self, m):
+        return self if m is self.map else Set.of(m)
+
+    def update(self, x, f, *args):
+        return self.disj(x).conj(f(x, *args))
+
+    def transient(self):
+        return TransientSet(self)
+
+    def __eq__(self, other):
+        if isinstance(other, Set):
+            return self.map == other.map
+        return super().__eq__(other)
+
+    def __hash__(self):
+        if self.hash_value is None:
+            self.hash_value = self._hash()
+        return self.hash_value
+
+    def __repr__(self):
+        return repr(set(self))
+
+    def __reduce__(self):
+        return Set, (list(self),)
+
+
+class TransientSet:
+    "A set that conj and disj change in place, made by transient() from a Set."
+    __slots__ = ('map',)
+
+    def __init__(self, s):
+        self.map = s.map.transient()
+
+    def __len__(self):
+        return len(self.map)
+
+    def __contains__(self, x):
+        return x in self.map
+
+    def get(self, x, not_found=None):
+        return self.map.get(x, not_found)
+
+    def __call__(self, x):
+        return self.map.get(x)
+
+    def conj(self, *xs):
+        self.map.assoc(*itertools.chain.from_iterable((x, x) for x in xs))
+        return self
+
+    def disj(self, *xs):
+        self.map.dissoc(*xs)
+        return self
+
+    def persistent(self):
+        return Set.of(self.map.persistent())
+
+
+EMPTY = HashMap.of(0, EMPTY_NODE)
+
+
+def hashmap(*kvs):
+    "A HashMap of the keys and values kvs: [hashmap -a 1 -b 2]."
+    return EMPTY.transient().assoc(*kvs).persistent() if kvs else EMPTY
+
+
+for protocol, datatype in [(Dict, HashMap), (SetProtocol, Set)]:
+    for f, name in [(naga.first, 'first'), (naga.last, 'last'), (naga.rest, 'rest')]:  # a pattern renames f
+        f.pattern(datatype)(getattr(protocol, name))
+for f, name in [(naga.get, 'get'), (naga.assoc, 'assoc'), (naga.dissoc, 'dissoc'), (naga.update, 'update')]:
+    f.pattern(HashMap)(lambda m, *args, name=name: getattr(m, name)(*args))
+for f, name in [(naga.get, 'get'), (naga.dissoc, 'disj'), (naga.update, 'update')]:
+    f.pattern(Set)(lambda s, *args, name=name: getattr(s, name)(*args))
+for datatype in (TransientHashMap, TransientSet):
+    naga.get.pattern(datatype)(lambda t, *args: t.get(*args))
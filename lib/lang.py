@@ -1,44 +1,81 @@
+import copyreg
 import io
+import itertools
+import os
 import re
+import sys
+import threading
 from functools import partial
 
 from naga import mapv
 
-from lib.destructure import destruct
-from lib.macros import defn, macro_table, _let
+from lib.destructure import destruct, element_plan, parameters, plan, recur_parameters
+from lib.macros import defn, macro_table
 from lib.special_forms import KeyWord
+from lib import cache
 from lib.core import div, nil
 from lib.symbols import Symbol, PyObject, quote_, quasiquote_, unquote_, unquotesplicing_, begin_, if_, def_, defmacro_, \
-    fn_, append_, cons_, autogensym_, let_
-from lib.utils import isa, to_string, ara, flatten, AutoGenSym
+    fn_, append_, cons_, autogensym_, let_, and_, or_, when_, loop_, recur_, requiresym_, importsym_, dot_, \
+    async_fn_, await_
+from lib.utils import isa, to_string, ara, AutoGenSym
+from lib.vector import vec
 
 
 class InPort(object):
-    "An input port. Retains a line of chars."
-    tokenizer = re.compile(r"""\s*(,-                 |    # quasiquote
-                                   [\[/`,\]]          |    # capture [ " ` , ] tokens
-                                   '(?:[\\].|[^\\'])*'|    # strings
-                                     {.*?}            |    # future map literal
-                                   ;.*|                    # single line comments
-                                   [^\s\['"`,;\]]*)        # match everything that is NOT a special character
-                                   (.*)                    # match the rest of the string""",
+    """An input port. Scans tokens out of a buffered block of whole lines,
+    keeping a position index instead of copying the rest of the line."""
+    tokenizer = re.compile(r"""\s*(,-                    |    # quasiquote
+                                   [\[/`,\]]             |    # capture [ " ` , ] tokens
+                                   '(?:[\\].|[^\\'\n])*'|    # strings
+                                     {.*?}               |    # future map literal
+                                   ;.*|                       # single line comments
+                                   [^\s\['"`,;\]]*)           # match everything that is NOT a special character
+                                   """,
 
                            flags=re.VERBOSE)
 
+    blocksize = 1 << 16
+
     def __init__(self, file):
         self.file = file
-        self.line = ''
+        self.buf = ''
+        self.pos = 0
+        self.lines = 0
+        isatty = getattr(file, 'isatty', None)
+        self.interactive = bool(isatty and isatty())
+
+    @property
+    def lineno(self):
+        "The line the scanner is currently positioned on, counting from 1."
+        return self.lines + self.buf.count('\n', 0, self.pos) + 1
+
+    def fill(self):
+        """Replace the buffer with the next block of input. Blocks always end on
+        a line boundary, so no token is ever split between two of them."""
+        self.lines += self.buf.count('\n')
+        if self.interactive:
+            chunk = self.file.readline()
+        else:
+            chunk = self.file.read(self.blocksize)
+            if chunk and not chunk.endswith('\n'):
+                chunk += self.file.readline()
+        self.buf, self.pos = chunk, 0
+        return chunk != ''
 
     def next_token(self):
-        "Return the next token, reading new text into line buffer if needed."
+        "Return the next token, reading a new block into the buffer if needed."
+        match = self.tokenizer.match
         while True:
-            if self.line == '':
-                self.line = self.file.readline()
-            if self.line == '':
-                return eof_object
-            token, self.line = re.match(InPort.tokenizer, self.line).groups()
-            if token != '' and not token.startswith(';'):
-                return token
+            m = match(self.buf, self.pos)
+            token, self.pos = m.group(1), m.end()
+            if token:
+                if token[0] != ';':
+                    return token
+            elif self.pos >= len(self.buf):
+                if not self.fill():
+                    return eof_object
+            else:
+                raise SyntaxError(f'line {self.lineno}: unreadable input at {self.buf[self.pos:self.pos + 20]!r}')
 
     def __iter__(self):
         t = next(self)
@@ -51,7 +88,26 @@ class InPort(object):
 
 
 class Env(dict):
-    """An environment: a dict of {'var':val} pairs, with an outer Env."""
+    """An environment: a dict of {'var':val} pairs, with an outer Env.
+    version changes with every def, import and require, whichever Env they
+    bind in; lib.compiler caches global lookups until it does. Each is drawn
+    from versions, so two threads binding at once never draw the same one.
+    global_version is the version of the last change to a namespace (below),
+    rather than, say, to the Env of a fn's call.
+
+    A namespace, the global Env or one that import or require made, has a
+    source saying how to make it again, and pickles as a reference to that,
+    for namespace() to find or load in the process that unpickles it. Other
+    Envs pickle with their bindings and their outer Env.
+
+    What the global Env has besides, the defs made at the top level, a fn
+    carries with it when it pickles: see unreplayed()."""
+    version = global_version = 0
+    versions = itertools.count(1)
+    source = None
+    loads = ()  # the [import ...] and [require ...] calls that bound names in this Env, in order
+    replayed = None  # the global Env's {name: value} bindings that core.br and loads made, once core.br is loaded
+    shipped = frozenset()  # the global Env's names bound by ship() rather than here
 
     def __init__(self, parms=(), args=(), outer=None, name=None, macro=False):
         # Bind parm list to corresponding args, or single parm to list of args
@@ -69,28 +125,14 @@ class Env(dict):
                 self.update([('&env', self)])
         else:
             self.outer = outer
+            if parms:
+                plan(parms)(self, args)
 
-            bindings = destruct(parms, args)
-            fparms = set(flatten(parms)) - {'.'}
-
-            for k, v in bindings:
-                if isa(k, (list, Symbol)):
-                    try:
-                        if isa(v, list) and len(v) > 0 and not isa(v[0], list) and self.find(v[0]) and k not in fparms:
-                            self.update([(k, eval(v, self))])
-                        else:
-                            self.update([(k, v)])
-
-                    except Exception as e:
-                        if __debug__ is True:
-                            print(e)
-                        self.update([(k, v)])
-                else:
-                    self.update([(k, v)])
-
-                    # try:
-                    #     self.update({k: eval(v, self)})
-                    # except Exception:
+    def changed(self):
+        "Note that a binding in this Env changed, with a new version."
+        Env.version = version = next(Env.versions)
+        if self is global_env or self.source is not None:
+            Env.global_version = version
 
     def find(self, var):
         """Find the innermost Env where var appears."""
@@ -105,21 +147,67 @@ class Env(dict):
         else:
             return self.outer.find(var)
 
+    def __reduce__(self):
+        if self is global_env:  # with what was imported and required into it, for a process that started afresh
+            return namespace, ('global', self.loads)
+        if self.source is not None:
+            return namespace, self.source
+        return Env, (), {'outer': self.outer}, None, iter(self.items())
+
+
+def namespace(kind, name, alias=None):
+    """The namespace an Env pickled as a reference to: ('global', loads) is
+    global_env, with core.br loaded and the imports and requires in loads made
+    if they are not yet; ('import', module, alias) and ('require', file, alias)
+    are the namespaces import and require bind at alias in global_env, made
+    again if they are not there."""
+    if 'require' not in global_env:
+        special_functions()
+    if kind == 'global':
+        for f, *args in name:
+            if (f, *args) not in global_env.loads:
+                try:
+                    f(global_env, *args)
+                except (OSError, ImportError):  # gone since; a fn that used what it bound fails when it looks it up
+                    pass
+        return global_env
+    found = global_env.get(alias)
+    if not isa(found, Env) or found.source != (kind, name, alias):
+        (import_ if kind == 'import' else require_)(global_env, name, alias)
+    return global_env[alias]
+
+
+def loaded(global_env, load, before):
+    """Note an import or require made into global_env, for a process that
+    unpickles a reference to it to make again, and the bindings it made, as
+    ones that process has: before is global_env as it was before it."""
+    if load not in global_env.loads:
+        global_env.loads += (load,)
+    replay(global_env, before)
+
+
+def replay(global_env, before):
+    "Note the bindings made in global_env since it was before as ones a process that starts afresh makes too."
+    if global_env.replayed is not None:
+        global_env.replayed.update((k, v) for k, v in global_env.items() if before.get(k, before) is not v)
+
 
 def import_(global_env, imports, name=None):
+    before = dict(global_env)
     if isa(imports, (Symbol, str)):
         if name is None:
             name = imports
 
         package = Env(name=name)
-        for k, v in vars(__import__(imports, globals(), locals(),
+        for k, v in vars(__import__(str(imports), globals(), locals(),  # str: a module's __name__ must not be a Symbol
                                     fromlist=imports.split('.')[:-1])).items():
             package[k] = v
+        package.source = ('import', imports, name)
         global_env[name] = package
 
     if isa(imports, list):
         import_name, *args = imports
-        import__ = __import__(import_name, globals(), locals(),
+        import__ = __import__(str(import_name), globals(), locals(),
                               fromlist=import_name.split('.')[:-1])
 
         if len(args) == 1 and args[0] == '*':
@@ -128,47 +216,113 @@ def import_(global_env, imports, name=None):
         else:
             for arg in args:
                 global_env[arg] = vars(import__)[arg]
+    loaded(global_env, (import_, imports, name), before)
+    global_env.changed()
 
 
 def require_(global_env, n, name=None):
+    before = dict(global_env)
     if isa(n, (Symbol, str)):
         if name is None:
             name = n
 
         fname = f'{n}.br'
         new_env = Env(name=n, outer=global_env)
-        with open(fname) as f:
-            eval(parse(f.read()), new_env)
+        load(fname, new_env)
+        new_env.source = ('require', n, name)
         global_env[name] = new_env
     if isa(n, list):
         if n[0] == 'from':
-            name = f'{n[1]}.br'
-            items = n[2]
+            stem, items = n[1], n[2]
         else:
-            name = f'{n[0]}.br'
-            items = n[1]
+            stem, items = n[0], n[1]
+        fname = f'{stem}.br'
         if isa(items, list):
             temp_env = Env(outer=global_env)
-            with open(name) as f:
-                contents = f.read()
-                eval(parse(contents), temp_env)
+            load(fname, temp_env)
+            temp_env.source = ('require', stem, stem)  # what [require stem] would make
 
-                for item in items:
-                    global_env[item] = temp_env[item]
+            for item in items:
+                global_env[item] = temp_env[item]
         if items == '*':
             # temp_env = Env(outer=global_env)
-            with open(name) as f:
-                for x in read(f.read())[1:]:
-                    try:
-                        eval(expand(x), global_env)
-                    except Exception as e:
-                        print(f'unable to parse {x}')
+            load(fname, global_env, each=True)
+    loaded(global_env, (require_, n, name), before)
+    global_env.changed()
+
+
+class LoadError(Exception):
+    "A top-level form of a .br file failed to read, expand or evaluate."
+
+    def __init__(self, fname, line, form, cause):
+        self.fname, self.line, self.form, self.cause = fname, line, form, cause
+        super().__init__(f'{fname}:{line}: {type(cause).__name__}: {cause}')
+
+
+def load(fname, env, each=False):
+    """Evaluate the .br file fname in env one top-level form at a time: each
+    form is read, expanded and evaluated before the next one is read. The
+    expanded forms come from the .brc cache when it is valid; otherwise they
+    are written to a new one as they go. A failing form raises LoadError, or
+    with each=True is reported and skipped."""
+    path = os.path.abspath(fname)
+    with load_lock:
+        # a module's own macros are part of its source; everything else it was expanded with is in the key
+        key = cache.key(cache.digest(fname), {k: body for k, (origin, body) in user_macros.items() if origin != path},
+                        folding, vectors)
+        loading.append(path)
+        try:
+            _load(fname, env, each, key)
+        finally:
+            loading.pop()
+
+
+def _load(fname, env, each, key):
+    def run(x, line, stage=eval, *args):
+        try:
+            return stage(x, *args)
+        except Exception as e:
+            error = LoadError(fname, line, x, e)
+            if not each:
+                raise error from e
+            print(f'unable to load: {error}', file=sys.stderr)
+            return error
+
+    done = 0
+    forms = cache.load(fname, key)
+    if forms is not None:
+        try:
+            for line, x in forms:
+                done += 1
+                run(x, line, eval, env)
+            return None
+        except cache.CacheError:  # the form after the done ones never came out of the cache: carry on from it
+            cache.remove(fname)
+
+    with open(fname) as f, cache.Writer(fname, key) as writer:
+        if done:
+            writer.abort()  # the forms already run are not expanded again, so this cache would be partial
+        inport = InPort(f)
+        for i in itertools.count():
+            token = next(inport)
+            if token is eof_object:
                 return None
+            line = inport.lineno
+            x = run(token, line, read_ahead, inport)
+            if i < done:
+                continue
+            if not isa(x, LoadError):
+                x = run(x, line, expand, True)
+            if folding and not isa(x, LoadError):
+                x = run(x, line, fold.fold, env)
+            if isa(x, LoadError):
+                writer.abort()
+                continue
+            writer.write((line, x))
+            run(x, line, eval, env)
 
 
-
-
-eof_object = Symbol('#<eof-object>')  # Note: uninterned; can't be read
+eof_object = str.__new__(Symbol, '#<eof-object>')  # Note: uninterned; can't be read
 
 
 def atom(t):
@@ -210,74 +364,193 @@ def read(inport: (type(InPort), str)):
     if isa(inport, str):
         return read(InPort(io.StringIO(f'[begin {inport}]')))
 
-    def _read(t):
-        res = []
-        if t == '[':
-            while True:
-                t = next(inport)
-                if t == ']':
-                    return res
-                else:
-                    res.append(_read(t))
-        elif t == ']':
-            raise Exception("unmatched delimiter: ]")
-        elif t in quotes:
-            return [quotes[t], read(inport)]
-        elif t is eof_object:
-            raise SyntaxError("Unexpected EOF")
-        else:
-            return atom(t)
-
     token = next(inport)
 
-    return eof_object if token is eof_object else _read(token)
+    return eof_object if token is eof_object else read_ahead(token, inport)
+
+
+def read_ahead(t, inport):
+    "Read the rest of the form that starts with token t."
+    res = []
+    if t == '[':
+        while True:
+            t = next(inport)
+            if t == ']':
+                return res
+            else:
+                res.append(read_ahead(t, inport))
+    elif t == ']':
+        raise Exception("unmatched delimiter: ]")
+    elif t in quotes:
+        return [quotes[t], read(inport)]
+    elif t is eof_object:
+        raise SyntaxError("Unexpected EOF")
+    else:
+        return atom(t)
 
 
 def parse(x):
     data = read(x)
-    return expand(data)
+    x = expand(data, toplevel=True)
+    return fold.fold(x, global_env) if folding else x
 
 
-user_macros = {}
+user_macros = {}  # {name: (file that defined it, expanded [fn ...] form)}
+loading = []  # files being loaded, innermost last
+load_lock = threading.RLock()  # held while a file loads, so threads take turns, as Python's imports do
 
 
 class Proc:
-    "A user-defined Scheme procedure."
+    """A user-defined Scheme procedure. code is its (bind, body) pair from
+    lib.compiler or lib.machine, or None if the interpreter made it:
+    bind(outer, args) makes the environment of a call and body runs in it."""
 
-    def __init__(self, parms, exp, env):
+    def __init__(self, parms, exp, env, code=None):
         self.parms, self.exp, self.env = parms, [begin_, *exp], env
+        self.code = code
+        self.bind = plan(parms) if code is None else None
 
     def __call__(self, *args):
-        let1 = _let(self.parms, list(args), self.exp)
-        return eval(let1, Env(self.parms, args, self.env))
+        if self.code is not None:
+            return compiler.call(self, args)
+        return interpret(self.exp, self.new_env(args), self)
+
+    def new_env(self, args):
+        "The Env for a call of this interpreted Proc on args."
+        env = Env(outer=self.env)
+        self.bind(env, args)
+        return env
+
+    def recur_env(self, args):
+        "The Env for a recur back to the top of this interpreted Proc, with one value per parameter."
+        env = Env(outer=self.env)
+        plan(recur_parameters(self.parms))(env, args)
+        return env
+
+
+def symbols(x, found):
+    "found, with the names the form x mentions added to it: each Symbol, and the namespace of a ns/name one."
+    if isa(x, Symbol):
+        found.add(x)
+        found.add(x.split('/')[0])
+    elif isa(x, list):
+        for exp in x:
+            symbols(exp, found)
+    return found
+
+
+def unreplayed(names):
+    """The bindings in global_env of names that a process which started afresh
+    would not have, loading core.br and making the imports and requires
+    again: those of the defs made at the top level since, which a fn that
+    refers to them carries when it pickles. The fns among them carry theirs
+    in turn. Workers that forked after the defs have them already, and
+    lib.parallel turns this off for them, with shipping.globals."""
+    replayed = global_env.replayed
+    if replayed is None or not shipping.globals:
+        return {}
+    return {k: global_env[k] for k in sorted(names)  # sorted: the same fn pickles the same, for lib.parallel's cache
+            if k in global_env and replayed.get(k, replayed) is not global_env[k]}
+
+
+def ship(bindings):
+    "Bind the globals a pickled fn carried in global_env, but not over those made here rather than shipped."
+    fresh = {k: v for k, v in bindings.items() if k not in global_env or k in global_env.shipped}
+    if fresh:
+        global_env.update(fresh)
+        global_env.shipped = global_env.shipped | fresh.keys()
+        global_env.changed()
+
+
+class Shipping(threading.local):
+    globals = True
+
+
+shipping = Shipping()
+
+
+def captured(env, names):
+    "A copy of the Env env with only the bindings of names, and so on out to the first namespace, which is itself."
+    if env is None or env is global_env or env.source is not None:
+        return env
+    copy = Env(outer=captured(env.outer, names))
+    copy.update((k, v) for k, v in env.items() if k in names)
+    return copy
 
 
 class Procedure:
-    def __init__(self, env, forms):
-        self.procs = []
-        self.variadic = None
-        for form in forms:
-            args, *exps = form
-            if '.' in args:
-                self.variadic = Proc(args, exps, env)
-            self.procs.append(Proc(args, exps, env))
+    """A fn: one Proc per arity. proc() picks the one to call from arities,
+    {number of args: Proc}, or else variadic, which takes min_arity or more.
+
+    A Procedure pickles as its expanded clauses and the Env it was made in,
+    with the top-level defs it refers to (see unreplayed()), and unpickles as
+    the fn those make in that Env, compiled by the evaluator of the process
+    that unpickles it. A compiled one made in a Frame has the
+    Scope of that Frame, which names its slots, to make an Env of it."""
+    form = fn_  # the special form that makes one
+    scope = None
+
+    def __init__(self, env, forms, codes=None, scope=None):
+        self.index([Proc(parms, exps, env, None if codes is None else codes[i])
+                    for i, (parms, *exps) in enumerate(forms)])
+        if scope is not None:
+            self.scope = scope
+
+    def index(self, procs):
+        self.procs, self.arities, self.variadic, self.min_arity = procs, {}, None, 0
+        for p in procs:
+            if isa(p.parms, Symbol):  # [fn xs ...]
+                self.variadic, self.min_arity = p, 0
+            elif dot_ in p.parms:
+                self.variadic, self.min_arity = p, p.parms.index(dot_)
+            else:
+                self.arities.setdefault(len(p.parms), p)
 
     def __call__(self, *args):
-        p = self.proc(*args)
-        return p(*args)
+        "The entry point for Python code, e.g. map or sorted: dispatch, bind and trampoline in one frame."
+        p = self.arities.get(len(args)) or self.proc(*args)
+        if p.code is None:
+            return p(*args)
+        bind, body = p.code
+        res = body(bind(p.env, args))
+        if type(res) is TailCall:
+            return compiler.call(res.proc, res.args)
+        return res
 
     def proc(self, *args):
-        for p in self.procs:
-            if len(p.parms) == len(args):
-                return p
-        else:
+        p = self.arities.get(len(args))
+        if p is not None:
+            return p
+        if self.variadic is not None and len(args) >= self.min_arity:
             return self.variadic
+        raise TypeError(f'no arity takes {len(args)} arguments, only {self.arity_names()}')
+
+    def __reduce__(self):
+        forms = [[p.parms, *p.exp[1:]] for p in self.procs]
+        names = symbols(forms, set())
+        env = self.procs[0].env
+        if self.scope is not None:
+            env = compiler.frame_env(env, self.scope, names)
+        state, defs = (forms, captured(env, names)), unreplayed(names)
+        return copyreg.__newobj__, (type(self),), (*state, defs) if defs else state
+
+    def __setstate__(self, state):
+        forms, env, *defs = state
+        if defs:
+            ship(*defs)
+        self.__dict__.update(vars(eval([self.form, forms], env)))
+
+    def arity_names(self):
+        names = [str(n) for n in sorted(self.arities)]
+        if self.variadic is not None:
+            names.append(f'{self.min_arity} or more')
+        return ', '.join(names) or 'none'
 
 
 class ApplicationContext:
     @staticmethod
     def expand_exp(env, x):
-        proc = eval(x.pop(0), env)
+        proc = interpret(x.pop(0), env)
         return proc, x
 
     @classmethod
@@ -290,7 +563,7 @@ class ApplicationContext:
 
 
 def expand_exp(env, x):
-    exps = [eval(exp, env) for exp in x]
+    exps = [interpret(exp, env) for exp in x]
     proc = exps.pop(0)
     return proc, exps
 
@@ -306,43 +579,31 @@ class Mac(Proc):
         else:
             parms = self.parms
 
-        return eval(self.exp, Env(parms, args, self.env, macro=True))
+        return interpret(self.exp, Env(parms, args, self.env, macro=True))
 
 
 class Macro(Procedure):
     def __init__(self, env, forms):
-        self.procs = []
-        self.variadic = None
-        for form in forms:
-            args, *exps = form
-            if '.' in args:
-                self.variadic = Mac(args, exps, env)
-            self.procs.append(Mac(args, exps, env))
+        self.index([Mac(parms, exps, env) for parms, *exps in forms])
+
+
+class Making(threading.local):
+    macros = False
+
+
+making = Making()
 
 
 class MacroContext(ApplicationContext):
-    def __init__(self):
-        self.old = {Procedure.__name__: Procedure,
-                    Proc.__name__: Proc,
-                    # expand_exp.__name__: expand_exp
-                    }
-
-        self.new = {Procedure.__name__: Macro,
-                    Proc.__name__: Mac,
-                    # expand_exp.__name__: self.old[expand_exp.__name__]
-                    }
-
-    # @staticmethod
-    # def expand_exp(env, x):
-    #     print('internal eval', x)
-    #     proc = eval(x.pop(0), env)
-    #     return proc, x
+    """Within it, fn makes Macros rather than Procedures, in this thread only:
+    the flag is thread-local, so other threads evaluating fns meanwhile are not
+    affected, as they were when this swapped the module's globals."""
 
     def __enter__(self):
-        globals().update(self.new)
+        self.old, making.macros = making.macros, True
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        globals().update(self.old)
+        making.macros = self.old
 
 
 class ProcedureContext(ApplicationContext):
@@ -355,12 +616,31 @@ class ProcedureContext(ApplicationContext):
 
 global_env = Env(name=__name__)
 
+# 'compile' runs forms through lib.compiler; 'interp' walks them with interpret();
+# 'stack' runs them on lib.machine, whose recursion depth is not limited by Python's
+evaluator = os.environ.get('BRACKET_EVAL', 'compile')
+
+# BRACKET_FOLD=1 runs lib.fold's constant folding over each form after macroexpansion
+folding = bool(os.environ.get('BRACKET_FOLD'))
+
+# BRACKET_VECTORS=1 makes vector literals, [1 2 3] and [], evaluate to lib.vector's
+# persistent Vectors rather than to lists
+vectors = bool(os.environ.get('BRACKET_VECTORS'))
+
 
 def eval(x, env=global_env, toplevel=False):
     "Evaluate an expression in an environment."
-    # if toplevel is True:
-    #     return eval(expand(x), env)
+    if evaluator == 'interp':
+        return interpret(x, env)
+    if evaluator == 'stack':
+        return machine.execute(machine.translate(x), env)
+    return compiler.execute(x, env)
+
 
+def interpret(x, env=global_env, target=None):
+    """Evaluate an expression in an environment by walking it. target is the
+    interpreted Proc whose body x is, for a recur to go back to; without one
+    a recur hands its values back as a Recur, to the loop that is running x."""
     while True:
         if isa(x, Symbol):  # variable reference
             if '/' in x:
@@ -369,38 +649,76 @@ def eval(x, env=global_env, toplevel=False):
             else:
                 return env.find(x)[x]
 
-        elif not isa(x, list) or isa(x, list) and len(x) == 0:  # constant literal
+        elif not isa(x, list) or len(x) == 0:  # constant literal
             return x
-        elif x[0] == 'if':  # (if test conseq alt)
+
+        op = x[0]  # special forms are interned symbols: dispatch on identity
+        if op is if_:  # (if test conseq alt)
             (_, test, conseq, alt) = x
-            x = (conseq if eval(test, env) not in (None, False, nil) else alt)
-        elif x[0] == 'def':  # (define var exp)
+            x = (conseq if interpret(test, env) not in (None, False, nil) else alt)
+        elif op is def_:  # (define var exp)
             (_, var, exp) = x
-            env[var] = eval(exp, env)
+            env[var] = interpret(exp, env)
+            env.changed()
             return None
-        elif x[0] == begin_:
+        elif op is begin_:
             for exp in x[1:-1]:
-                eval(exp, env)
+                interpret(exp, env)
             x = x[-1]
-
-        elif x[0] == 'quote':
+        elif op is quote_:
             (_, exp) = x
             return exp
-        elif x[0] == 'fn':  # (lambda (var*) exp)
+        elif op is defmacro_:
+            (_, var, exp) = x
+            define_macro(var, exp, env)
+            return None
+        elif op is fn_:  # (lambda (var*) exp)
             if len(x) > 2:
                 (_, *exp) = x
                 exp = [list(exp)]
             else:
                 (_, exp) = x
-            return Procedure(env, exp)
-        elif x[0] is quote_:
-            _, q = x
-            return q
-
+            return (Macro if making.macros else Procedure)(env, exp)
+        elif op is async_fn_:  # compiled, whatever the evaluator: see lib.coroutines
+            return compiler.analyze(x)(env)
+        elif op is let_:  # [let [name value ...] body...]
+            (_, bindings, *body) = x
+            env = Env(outer=env)
+            for i in range(0, len(bindings), 2):
+                env = bind_let(env, bindings[i], interpret(bindings[i + 1], env))
+            if not body:
+                return None
+            for exp in body[:-1]:
+                interpret(exp, env)
+            x = body[-1]
+        elif op is and_ or op is or_:  # first falsy / first truthy, or the last
+            for exp in x[1:-1]:
+                value = interpret(exp, env)
+                if (value in (None, False, nil)) is (op is and_):
+                    return value
+            x = x[-1]
+        elif op is loop_:  # [loop [name value ...] body...]: a let that recur goes back to
+            (_, bindings, *body) = x
+            outer, body = env, [begin_, *body]
+            env = Env(outer=outer)
+            for i in range(0, len(bindings), 2):
+                env = bind_let(env, bindings[i], interpret(bindings[i + 1], env))
+            while True:
+                res = interpret(body, env)
+                if type(res) is not Recur:
+                    return res
+                env = Env(outer=outer)
+                for p, value in zip(bindings[::2], res.args):
+                    env = bind_let(env, p, value)
+        elif op is recur_:
+            args = [interpret(exp, env) for exp in x[1:]]
+            if target is None:
+                return Recur(args)
+            x, env = target.exp, target.recur_env(args)
 
         else:  # (proc exp*)
 
-            if x[0] in ('require', 'import'):
+            if op is requiresym_ or op is importsym_:
                 if isa(x[-1], list):  # [require stdlib *]
                     x[-1] = [quote_, x[-1]]
                 else:
@@ -412,16 +730,40 @@ def eval(x, env=global_env, toplevel=False):
                 x = proc.proc(*exps)
                 proc = x
 
+            if isa(x, Proc) and x.code is not None:
+                return compiler.call(x, exps)
+
             if isa(x, Proc):
                 x = proc.exp
-                env = Env(proc.parms, exps, proc.env)
+                env = proc.new_env(exps)
+                target = proc
                 continue
 
             if callable(proc):
                 return proc(*exps)
 
             # TODO: danger zone! put this hack in to help deal with macros
-            return [proc, *exps]
+            return vec([proc, *exps]) if vectors else [proc, *exps]
+
+
+def bind_let(env, p, value):
+    """Bind the pattern p of a let or loop to value in env, or in a new Env
+    inside it if p rebinds one of env's names, so that a closure made before
+    keeps the old binding. Return the Env it bound p in."""
+    if any(name in env for name in parameters(p)):
+        env = Env(outer=env)
+    element_plan(p)(env, value)
+    return env
+
+
+def define_macro(name, body, env=global_env):
+    "Evaluate the expanded [fn ...] form body in env into a macro and add it to macro_table."
+    with MacroContext():
+        proc = interpret(body, env)
+    require([defmacro_, name, body], callable(proc), "macro must be a procedure")
+    with load_lock:  # not while a load reads user_macros
+        macro_table[name] = proc
+        user_macros[name] = (loading[-1] if loading else None, body)
 
 
 def require(x, predicate, msg="wrong length"):
@@ -430,44 +772,46 @@ def require(x, predicate, msg="wrong length"):
 
 
 def expand(x, toplevel=False):
-    "Walk tree of x, making optimizations/fixes, and signaling SyntaxError."
+    """Walk tree of x, making optimizations/fixes, and signaling SyntaxError.
+    A toplevel form must not recur outside of a loop or fn."""
+    if toplevel:
+        x = expand(x)
+        check_recur(x)
+        require(x, not coroutines.awaits(x), 'await outside of an async fn')
+        return x
     # require(x, x != [])  # () => Error
     if x == []:
-        return [quote_, x]
+        return [quote_, vec() if vectors else x]
     if not isa(x, list):  # constant => unchanged
         return x
-    elif x[0] is quote_:  # (quote exp)
+    op = x[0]
+    if op is quote_:  # (quote exp)
         require(x, len(x) == 2)
         return x
-    elif x[0] == if_:
+    elif op is if_:
         if len(x) == 3:
             x = x + [None]  # (if t c) => (if t c None)
         require(x, len(x) == 4)
         return mapv(expand, x)
-    elif x[0] is quote_:
-        return x
-    elif x[0] == def_ or x[0] == defmacro_:
+    elif op is def_ or op is defmacro_:
         require(x, len(x) >= 3)
         _d, v, body = x[0], x[1], x[2]
         v = str(v)
-        if _d == defmacro_:
+        if _d is defmacro_:
             _, _, body = expand(defn(*x[1:]))
             # require(x, toplevel, "define-macro only allowed at top level")
-            with MacroContext():
-                proc = eval(body)
-            require(x, callable(proc), "macro must be a procedure")
-            macro_table[v] = proc  # (define-macro v proc)
-            return None  # => None; add v:proc to macro_table
+            define_macro(v, body)
+            return [defmacro_, v, body]  # registered again when evaluated, e.g. from a .brc cache
         exp = expand(body)
         return [_d, v, exp]
 
-    elif x[0] is begin_:
+    elif op is begin_:
         if len(x) == 1:
             return None  # (begin) => None
         else:
             return [expand(xi, toplevel) for xi in x]
 
-    elif x[0] == fn_:  # (lambda (x) e1 e2)
+    elif op is fn_ or op is async_fn_:  # (lambda (x) e1 e2)
         body = x[1:]
 
         # body can either be of simple style [fn [x] x] or [fn [x] [f x]] or [fn [x] [f x] [g x]]
@@ -487,15 +831,45 @@ def expand(x, toplevel=False):
             args, *xi = body
             exp = [[args, *mapv(expand, xi)]]
 
-        return [fn_, exp]
+        for args, *xi in exp:
+            check_recur([begin_, *xi], len(recur_parameters(args)), tail=True)
+            require(x, op is async_fn_ or not coroutines.awaits([begin_, *xi]), 'await outside of an async fn')
+        return [op, exp]
 
-    elif x[0] is quasiquote_:  # `x => expand_quasiquote(x)
+    elif op is await_:  # [await x], in the body of an async-fn
+        require(x, len(x) == 2)
+        return [await_, expand(x[1])]
+
+    elif op is let_:  # [let [name value [a b] value ...] body...]
+        require(x, len(x) >= 2 and isa(x[1], list) and len(x[1]) % 2 == 0, 'let needs pairs of bindings')
+        bindings = [e if i % 2 == 0 else expand(e) for i, e in enumerate(x[1])]
+        return [let_, bindings, *[expand(e) for e in x[2:]]]
+
+    elif op is and_ or op is or_:  # [and x...] => the first falsy x or the last one; or, the first truthy one
+        if len(x) == 1:
+            return True
+        if len(x) == 2:
+            return expand(x[1])
+        return [op, *[expand(e) for e in x[1:]]]
+
+    elif op is loop_:  # [loop [name value ...] body... [recur value ...]]
+        require(x, len(x) >= 2 and isa(x[1], list) and len(x[1]) % 2 == 0, 'loop needs pairs of bindings')
+        bindings = [e if i % 2 == 0 else expand(e) for i, e in enumerate(x[1])]
+        body = [expand(e) for e in x[2:]]
+        check_recur([begin_, *body], len(bindings) // 2, tail=True)
+        return [loop_, bindings, *body]
+
+    elif op is when_:  # [when test body...] => [if test [begin body...] None]
+        require(x, len(x) >= 2)
+        return [if_, expand(x[1]), expand([begin_, *x[2:]]), None]
+
+    elif op is quasiquote_:  # `x => expand_quasiquote(x)
         require(x, len(x) == 2)
         return expand_quasiquote(x[1])
 
     # use of string was hack I put in to allow -> and ->> macros
-    elif isa(x[0], (Symbol, KeyWord)) and str(x[0]) in macro_table:
-        name = str(x[0])
+    elif isa(op, Symbol) and op in macro_table or isa(op, KeyWord) and str(op) in macro_table:
+        name = str(op)
         body = x[1:]
         # print(f'body: {body})')
         res = expand(macro_table[name](*body), toplevel)
@@ -505,11 +879,49 @@ def expand(x, toplevel=False):
         return mapv(expand, x)  # (f arg...) => expand each
 
 
+def check_recur(x, n=None, tail=False):
+    """Require every recur in the expanded form x, outside of the fns and loops
+    in it, to be in tail position and to pass n values, for the loop or fn
+    clause whose body x is. With n None there is none, and x must not recur."""
+    if not isa(x, list) or len(x) == 0:
+        return
+    op, last = x[0], None
+    if op is quote_ or op is fn_ or op is async_fn_ or op is defmacro_:  # fn bodies were checked when they were expanded
+        return
+    if op is recur_:
+        require(x, n is not None, 'recur outside of loop or fn')
+        require(x, tail, 'recur must be in tail position')
+        require(x, len(x) - 1 == n, f'recur needs one value per binding: {n}')
+        exps = x[1:]
+    elif op is loop_:
+        exps = x[1][1::2]
+    elif op is let_:
+        exps, last = x[1][1::2] + x[2:-1], x[-1] if len(x) > 2 else None
+    elif op is if_:
+        exps, last = x[1:2], None
+        check_recur(x[2], n, tail)
+        check_recur(x[3], n, tail)
+    elif op is begin_ or op is and_ or op is or_:
+        exps, last = x[1:-1], x[-1]
+    elif op is def_:
+        exps = x[2:]
+    else:
+        exps = x
+    for e in exps:
+        check_recur(e, n)
+    check_recur(last, n, tail)
+
+
 def is_pair(x): return x != [] and isa(x, list)
 
 
-def expand_quasiquote(x):
-    """Expand `x => 'x; `,x => x; `(,@x y) => (append x y) """
+autogensym = AutoGenSym()
+
+
+def expand_quasiquote(x, gensyms=None):
+    """Expand `x => 'x; `,x => x; `(,@x y) => (append x y)
+    Every x# in one template stands for the same generated symbol."""
+    gensyms = {} if gensyms is None else gensyms
     if not is_pair(x):
         return [quote_, x]
     require(x, x[0] is not unquotesplicing_, "can't splice here")
@@ -517,15 +929,18 @@ def expand_quasiquote(x):
         require(x, len(x) == 2)
         return x[1]
     if x[0] is autogensym_:
-        return AutoGenSym()(x[1])
+        if x[1] not in gensyms:
+            gensyms[x[1]] = autogensym(f'{x[1]}__auto__')
+        return [quote_, gensyms[x[1]]]
     elif is_pair(x[0]) and x[0][0] is unquotesplicing_:
         require(x[0], len(x[0]) == 2)
-        return [append_, x[0][1], expand_quasiquote(x[1:])]
+        return [append_, x[0][1], expand_quasiquote(x[1:], gensyms)]
     else:
-        return [cons_, expand_quasiquote(x[0]), expand_quasiquote(x[1:])]
+        return [cons_, expand_quasiquote(x[0], gensyms), expand_quasiquote(x[1:], gensyms)]
 
 
 def special_functions():
+    before = dict(global_env)
     try:
         global_env['import'] = partial(import_, global_env)
         global_env['require'] = partial(require_, global_env)
@@ -544,5 +959,14 @@ def special_functions():
         global_env['macroexpand'] = macroexpand
 
         del global_env['lib']
+        if global_env.replayed is None:
+            global_env.replayed = dict(global_env)
+        else:
+            replay(global_env, before)
+        global_env.changed()
     except FileNotFoundError:
         print('cannot find stdlib')
+
+
+from lib import compiler, coroutines, fold, machine  # noqa: E402  (they build on the classes above)
+from lib.compiler import Recur, TailCall  # noqa: E402
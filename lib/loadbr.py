@@ -1,9 +1,50 @@
-import bracket
+"""Ahead-of-time compiler from .br namespaces to Python modules.
+
+br2py('demo/checksum1') loads demo/checksum1.br, so that its macros and the
+helpers they call exist, and writes the expanded forms out as the Python
+module demo/checksum1.py, built with the ast module:
+
+* [defn f [a b] ...] becomes def f(a, b). A multi-arity fn, or one with
+  [. rest] or destructuring parameters, becomes def f(*args) dispatching
+  on len(args).
+* let bindings become local variables, and [and ...] and [or ...] nested ifs.
+* a function calling itself in tail position becomes a while loop, unless
+  it also makes closures, which would all share the loop's variables.
+* a loop, or a fn clause that recurs, becomes a def of its own that recur
+  goes back to: a while loop, or, if it makes closures, a function that
+  returns a Recur for loadbr.loop to call it again with.
+* names the module does not define itself are looked up once, at import,
+  in the Env its own require and import forms ran in.
+
+The generated module needs only this module at run time. Top-level names
+are munged into Python identifiers (lib.utils.munge); __bracket_names__ maps
+the bracket names to them. [f x] compiles to a plain call when f is known to
+be a function (a fn the module defines, or a name that held something
+callable when the module was compiled); otherwise it checks callable(f) at
+run time, so that [a b] is still a vector of two numbers. Writing the source
+out needs Python 3.9 (ast.unparse)."""
+import ast
+import itertools
+import pickle
+import sys
+
+from naga import get
+
 import lib.lang
+from lib.compiler import Recur, clauses, recurs
+from lib.core import dropv, nil
+from lib.destructure import as_, recur_parameters
+from lib.lang import Env, InPort, read, expand, eof_object
+from lib.symbols import Symbol, quote_, if_, def_, begin_, defmacro_, fn_, let_, and_, or_, loop_, recur_, \
+    requiresym_, importsym_, dot_, async_fn_
+from lib.utils import isa, munge, to_string
+from lib.vector import vec
 
 lib.lang.special_functions()
 global_env = lib.lang.global_env
 
+falsy = (None, False, nil)
+
 
 def loads(s, env=global_env):
     return lib.lang.eval(lib.lang.parse(s), env)
@@ -14,32 +55,526 @@ def brfn(s, *args, env=global_env):
     return loads(f"[{s} {sargs}]".format(*args), env)
 
 
-def br2py(namespace, out=None):
-    out = out or namespace.replace('.br', '') + '.py'
-    lib.lang.special_functions()
-    env = bracket.add_globals(bracket.Env())
-    env['require'](namespace)
-    # stdnamespace = bracket.add_globals(bracket.Env())
+# run-time support for compiled modules
+
+def namespace(name):
+    "The Env a compiled module runs its require, import and defmacro forms in."
+    return Env(name=name, outer=global_env)
+
+
+def lookup(env, name):
+    if '/' in name:
+        n, m = name.split('/')
+        return env.find(n)[n][m]
+    return env.find(name)[name]
+
+
+def run(env, x):
+    "Evaluate the expanded form x, which has no compiled equivalent, in env."
+    return lib.lang.eval(x, env)
+
+
+def constants(data):
+    return pickle.loads(data)
+
+
+def arity_error(name, args):
+    raise TypeError(f'{name}: no arity takes {len(args)} arguments')
+
 
+def loop(step, *args):
+    "Call step on args, and again on the values of each Recur it returns."
+    while True:
+        res = step(*args)
+        if type(res) is not Recur:
+            return res
+        args = res.args
+
+
+# the compiler
+
+def forms(fname, env):
+    "Yield the expanded top-level forms of the file fname, evaluating each in env first, as load does."
+    with open(fname) as f:
+        inport = InPort(f)
+        while True:
+            x = read(inport)
+            if x is eof_object:
+                return
+            x = expand(x, toplevel=True)
+            lib.lang.eval(x, env)
+            yield x
+
+
+def br2py(namespace, out=None):
+    "Compile namespace (e.g. 'demo/fib' or 'demo/fib.br') to a Python module, written to out. Returns out."
+    name = namespace[:-3] if namespace.endswith('.br') else namespace
+    out = out or name + '.py'
+    env = Env(name=name, outer=global_env)
+    tree = Compiler(name, env).module(list(forms(name + '.br', env)))
     with open(out, 'w') as f:
-        f.write('from loadbr import brfn\n')
-        f.write('import bracket\n')
-        f.write(f'''bracket.special_functions()\n
-global_env=bracket.add_globals(bracket.Env())\n
-global_env['require']('{namespace}')\n''')
+        f.write(ast.unparse(tree) + '\n')
+    return out
+
+
+def simple(parms):
+    return isa(parms, list) and all(isa(p, Symbol) and p is not dot_ for p in parms)
+
+
+def load_(name):
+    return ast.Name(name, ast.Load())
+
+
+def assign(name, value):
+    return ast.Assign([ast.Name(name, ast.Store())], value)
+
+
+def call(f, *args):
+    return ast.Call(f, list(args), [])
+
+
+class Scope:
+    "Bracket names visible at some point of the generated code, mapped to Python names."
+
+    def __init__(self, outer=None, fn=None):
+        self.vars, self.outer, self.fn = {}, outer, fn
 
-        for k, v in env[namespace].items():
-            # if k in stdnamespace:
-            #     continue
+    def find(self, name):
+        scope = self
+        while scope is not None:
+            if name in scope.vars:
+                return scope.vars[name]
+            scope = scope.outer
+        return None
 
 
-            if callable(v):
-                f.write(f'''def {bracket.munge(k)}(*args): return brfn(global_env, '{namespace}/{k}', *args)\n''')
+class Function:
+    "What the compiler knows about the Python function it is generating code for."
+
+    def __init__(self, name, parms, loop=True):
+        self.name = name  # its Python name, for spotting self calls
+        self.parms = parms  # Python names of its parameters, or None for def f(*args)
+        self.args = None
+        self.loop = loop
+        self.looped = self.closures = False
+
+
+class Compiler:
+    def __init__(self, namespace, env):
+        self.namespace, self.env = namespace, env  # env: where the module was loaded to compile it
+        self.functions = set()  # Python names of the functions the module defines
+        self.consts, self.const_names = [], {}
+        self.free = {}  # {bracket name: Python name} looked up at import
+        self.pending = []  # free names not looked up yet
+        self.used = {'__br', '__env', '__bracket_names__'}
+        self.count = itertools.count()
+
+    def fresh(self, name):
+        "A Python name for the bracket name `name` that is not used anywhere else in the module."
+        base = name = munge(str(name))
+        if name.startswith('__'):  # keep clear of the module's own __br_ names
+            base = name = f'u{name}'
+        while name in self.used:
+            name = f'{base}_{next(self.count)}'
+        self.used.add(name)
+        return name
+
+    # module level
+
+    def module(self, xs):
+        self.top = Scope()
+        for x in xs:  # top-level defs claim their own names first
+            if isa(x, list) and len(x) == 3 and x[0] is def_ and x[1] not in self.top.vars:
+                self.top.vars[x[1]] = self.fresh(x[1])
+        body = []
+        for x in xs:
+            stmts = self.toplevel(x)
+            body += [assign(self.free[n], call(ast.Attribute(load_('__br'), 'lookup', ast.Load()),
+                                               load_('__env'), ast.Constant(n)))
+                     for n in self.pending]
+            self.pending = []
+            body += stmts
+        names = {k: v for k, v in self.top.vars.items()}
+        header = [ast.Expr(ast.Constant(f'Compiled from {self.namespace}.br by lib.loadbr; do not edit.')),
+                  ast.ImportFrom('lib', [ast.alias('loadbr', '__br')], 0),
+                  assign('__env', call(ast.Attribute(load_('__br'), 'namespace', ast.Load()), ast.Constant(self.namespace))),
+                  ast.Assign([ast.Tuple([ast.Name(n, ast.Store())
+                                         for n in ('__br_len', '__br_list', '__br_callable', '__br_falsy')],
+                                        ast.Store())],
+                             ast.Tuple([load_('len'), load_('list'), load_('callable'),
+                                        ast.Attribute(load_('__br'), 'falsy', ast.Load())], ast.Load()))]
+        if self.consts:
+            data = pickle.dumps(self.consts, protocol=pickle.HIGHEST_PROTOCOL)
+            header.append(ast.Assign([ast.Tuple([ast.Name(n, ast.Store()) for n in self.const_names.values()],
+                                                ast.Store())],
+                                     call(ast.Attribute(load_('__br'), 'constants', ast.Load()), ast.Constant(data))))
+        footer = [assign('__bracket_names__', ast.Dict([ast.Constant(str(k)) for k in names],
+                                                       [ast.Constant(v) for v in names.values()]))]
+        return ast.fix_missing_locations(ast.Module(header + body + footer, []))
+
+    def toplevel(self, x):
+        if isa(x, list) and x and x[0] is begin_:
+            return [s for e in x[1:] for s in self.toplevel(e)]
+        if isa(x, list) and x and x[0] is def_:
+            (_, var, exp) = x
+            return self.define(x, self.top) + [
+                ast.Assign([ast.Subscript(load_('__env'), ast.Constant(str(var)), ast.Store())],
+                           load_(self.top.vars[var]))]
+        return self.effect(x, self.top)
+
+    # names and constants
+
+    def name(self, x, scope):
+        py = scope.find(x)
+        if py is not None:
+            return load_(py)
+        if x not in self.free:
+            self.free[x] = self.fresh(x)
+            self.pending.append(x)
+        return load_(self.free[x])
+
+    def const(self, x):
+        if x is None or type(x) in (bool, int, float, str):
+            return ast.Constant(x)
+        key = id(x)
+        if key not in self.const_names:
+            self.consts.append(x)
+            self.const_names[key] = f'__k{len(self.consts) - 1}'
+        return load_(self.const_names[key])
+
+    def run(self, x):
+        return call(ast.Attribute(load_('__br'), 'run', ast.Load()), load_('__env'), self.const(x))
+
+    # the three contexts a form is compiled in: for its value, in tail position, for effect.
+    # expr returns (statements to run first, expression); tail and effect return statements
+
+    def expr(self, x, scope):
+        if isa(x, Symbol):
+            return [], self.name(x, scope)
+        if not isa(x, list) or len(x) == 0:
+            return [], self.const(x)
+
+        op = x[0]
+        if op is quote_:
+            return [], self.const(x[1])
+        if op is if_:
+            (_, test, conseq, alt) = x
+            ts, t = self.expr(test, scope)
+            cs, c = self.expr(conseq, scope)
+            als, a = self.expr(alt, scope)
+            if not cs and not als:
+                return ts, ast.IfExp(self.truthy(t), c, a)
+            v = self.fresh('v')
+            return ts + [ast.If(self.truthy(t), cs + [assign(v, c)], als + [assign(v, a)])], load_(v)
+        if op is def_:
+            return self.define(x, scope), ast.Constant(None)
+        if op is begin_:
+            if len(x) == 1:
+                return [], ast.Constant(None)
+            stmts = [s for e in x[1:-1] for s in self.effect(e, scope)]
+            s, e = self.expr(x[-1], scope)
+            return stmts + s, e
+        if op is fn_:
+            name = self.fresh('fn')
+            return [self.function(name, x, scope)], load_(name)
+        if op is async_fn_:
+            raise SyntaxError(f'{to_string(x)}: async-fn is not compiled ahead of time; require the .br file instead')
+        if op is defmacro_ or op is requiresym_ or op is importsym_:
+            return [], self.run(x)
+        if op is let_:
+            stmts, scope = self.let(x, scope)
+            s, e = self.expr([begin_, *x[2:]], scope)
+            return stmts + s, e
+        if op is and_ or op is or_:
+            return self.and_or(x, scope)
+        if op is loop_:
+            return self.loop(x, scope)
+        stmts, exps = self.exprs(x, scope)
+        if self.is_vector(x):
+            return stmts, self.vector(exps)
+        if not self.is_function(op, scope):  # maybe a vector: [a b], [[inc a] b]
+            if not isa(exps[0], ast.Name):
+                f = self.fresh('f')
+                stmts.append(assign(f, exps[0]))
+                exps[0] = load_(f)
+            return stmts, ast.IfExp(call(load_('__br_callable'), exps[0]), call(*exps), self.vector(exps))
+        return stmts, call(*exps)
+
+    def tail(self, x, scope):
+        if isa(x, list) and x:
+            op = x[0]
+            if op is if_:
+                (_, test, conseq, alt) = x
+                ts, t = self.expr(test, scope)
+                return ts + [ast.If(self.truthy(t), self.tail(conseq, scope), self.tail(alt, scope))]
+            if op is begin_ and len(x) > 1:
+                return [s for e in x[1:-1] for s in self.effect(e, scope)] + self.tail(x[-1], scope)
+            if op is let_:
+                stmts, scope = self.let(x, scope)
+                return stmts + self.tail([begin_, *x[2:]], scope)
+            fn = scope.fn
+            if op is recur_:  # scope.fn is the def of the loop or fn clause it goes back to
+                stmts, exps = self.exprs(x[1:], scope)
+                if fn.loop:
+                    return stmts + self.loop_back(fn, exps)
+                return stmts + [ast.Return(call(ast.Attribute(load_('__br'), 'Recur', ast.Load()),
+                                                ast.Tuple(exps, ast.Load())))]
+            if fn is not None and fn.loop and fn.name is not None and isa(op, Symbol) and scope.find(op) == fn.name:
+                args = x[1:]
+                if fn.parms is None or len(fn.parms) == len(args):
+                    stmts, exps = self.exprs(args, scope)
+                    return stmts + self.loop_back(fn, exps)
+        stmts, e = self.expr(x, scope)
+        return stmts + [ast.Return(e)]
+
+    def effect(self, x, scope):
+        if isa(x, list) and x:
+            op = x[0]
+            if op is if_:
+                (_, test, conseq, alt) = x
+                ts, t = self.expr(test, scope)
+                return ts + [ast.If(self.truthy(t),
+                                    self.effect(conseq, scope) or [ast.Pass()],
+                                    self.effect(alt, scope))]
+            if op is def_:
+                return self.define(x, scope)
+            if op is begin_:
+                return [s for e in x[1:] for s in self.effect(e, scope)]
+            if op is let_:
+                stmts, scope = self.let(x, scope)
+                return stmts + self.effect([begin_, *x[2:]], scope)
+        stmts, e = self.expr(x, scope)
+        if isa(e, (ast.Name, ast.Constant)):
+            return stmts
+        return stmts + [ast.Expr(e)]
+
+    def loop_back(self, fn, exps):
+        "Statements rebinding the parameters of fn, the function being generated, to exps and looping back."
+        names = fn.parms if fn.parms is not None else [fn.args]
+        values = exps if fn.parms is not None else [ast.Tuple(exps, ast.Load())]
+        fn.looped = True
+        if len(names) == 1:
+            rebind = assign(names[0], values[0])
+        else:
+            rebind = ast.Assign([ast.Tuple([ast.Name(n, ast.Store()) for n in names], ast.Store())],
+                                ast.Tuple(values, ast.Load()))
+        return [rebind, ast.Continue()]
+
+    def exprs(self, xs, scope):
+        "Compile xs, keeping them evaluated in order when a later one needs statements."
+        compiled = [self.expr(x, scope) for x in xs]
+        last = max((i for i, (s, _) in enumerate(compiled) if s), default=-1)
+        stmts, exps = [], []
+        for i, (s, e) in enumerate(compiled):
+            stmts += s
+            if i < last and not isa(e, ast.Constant):
+                t = self.fresh('t')
+                stmts.append(assign(t, e))
+                e = load_(t)
+            exps.append(e)
+        return stmts, exps
+
+    def truthy(self, e):
+        return ast.Compare(e, [ast.NotIn()], [load_('__br_falsy')])
+
+    def and_or(self, x, scope):
+        "[and ...] or [or ...] as ifs assigning each form in turn to one variable, until one decides it."
+        v = self.fresh('v')
+        decided = ast.NotIn() if x[0] is and_ else ast.In()  # an and goes on while its forms are truthy
+        rest = []
+        for exp in reversed(x[1:]):
+            s, e = self.expr(exp, scope)
+            stmts = s + [assign(v, e)]
+            if rest:
+                stmts.append(ast.If(ast.Compare(load_(v), [decided], [load_('__br_falsy')]), rest, []))
+            rest = stmts
+        return rest, load_(v)
+
+    def is_function(self, x, scope):
+        "Is x, the first element of an application, sure to evaluate to a function?"
+        if isa(x, list):
+            return len(x) > 0 and x[0] is fn_
+        if not isa(x, Symbol):
+            return False
+        py = scope.find(x)
+        if py in self.functions:
+            return True
+        if py is not None and self.top.vars.get(x) != py:  # a local
+            return False
+        try:
+            return callable(lookup(self.env, x))
+        except Exception:
+            return False
+
+    def is_vector(self, x):
+        "Is the application x certain to evaluate to a list, its first element not being callable?"
+        head = x[0]
+        if isa(head, list):  # a vector of vectors, [[1 2] [3 4]]
+            return len(head) > 0 and not isa(head[0], Symbol) and self.is_vector(head)
+        return head is None or type(head) in (bool, int, float, str)
+
+    def vector(self, exps):
+        "The vector literal of exps: a list, or a Vector with BRACKET_VECTORS set."
+        if lib.lang.vectors:
+            return call(ast.Attribute(load_('__br'), 'vec', ast.Load()), ast.List(exps, ast.Load()))
+        return ast.List(exps, ast.Load())
+
+    # def, let and fn
+
+    def define(self, x, scope):
+        (_, var, exp) = x
+        py = scope.find(var) if scope.fn is None else scope.vars.get(var)  # def binds in the innermost frame
+        if py is None:
+            py = scope.vars[var] = self.fresh(var)
+        if isa(exp, list) and exp and exp[0] is fn_:
+            if scope.fn is not None:
+                scope.fn.closures = True
+            self.functions.add(py)
+            return [self.function(py, exp, scope, self_name=py)]
+        stmts, e = self.expr(exp, scope)
+        return stmts + [assign(py, e)]
+
+    def let(self, x, scope):
+        "Statements binding the names of [let bindings *body] in order, and the Scope its body sees them in."
+        bindings = x[1]
+        stmts = []
+        for p, exp in zip(bindings[::2], bindings[1::2]):
+            s, e = self.expr(exp, scope)
+            scope = Scope(scope, scope.fn)  # a fresh Python name for each binding, for the closures between them
+            stmts += s + self.bind_one(p, e, scope)
+        return stmts, Scope(scope, scope.fn)
+
+    def function(self, name, x, scope, self_name=None, loop=True):
+        "Compile the fn form x to a def of the Python function name."
+        if scope.fn is not None:
+            scope.fn.closures = True
+        forms = clauses(x)
+        if len(forms) == 1 and simple(forms[0][0]) and not recurs([begin_, *forms[0][1:]]):
+            (parms, *body), = forms
+            inner = Scope(scope)
+            fn = inner.fn = Function(self_name, [self.fresh(p) for p in parms], loop)
+            inner.vars.update(zip(parms, fn.parms))
+            stmts = self.tail([begin_, *body], inner)
+            args = ast.arguments([], [ast.arg(p) for p in fn.parms], None, [], [], None, [])
+        else:
+            fn = Function(self_name, None, loop)
+            fn.args = self.fresh('args')
+            stmts = []
+            # exact arities first, then the variadic one, as Procedure.proc picks them
+            fixed = [(ast.Eq(), len(f[0]), f) for f in forms if isa(f[0], list) and dot_ not in f[0]]
+            variadic = [(ast.GtE(), 0 if isa(f[0], Symbol) else f[0].index(dot_), f)
+                        for f in forms if not isa(f[0], list) or dot_ in f[0]]
+            for cmp, n, (parms, *body) in fixed + variadic:
+                inner = Scope(scope, fn)
+                test = ast.Compare(call(load_('__br_len'), load_(fn.args)), [cmp], [ast.Constant(n)])
+                if recurs([begin_, *body]):
+                    step = self.fresh(f'{name}_{n}')
+                    target, looping = self.recur_target(step, recur_parameters(parms), body, scope)
+                    run = self.call_target(step, looping, self.recur_values(parms, load_(fn.args)))
+                    stmts.append(ast.If(test, [target, ast.Return(run)], []))
+                    continue
+                binds = self.bind(parms, load_(fn.args), inner)
+                stmts.append(ast.If(test, binds + self.tail([begin_, *body], inner), []))
+            stmts.append(ast.Return(call(ast.Attribute(load_('__br'), 'arity_error', ast.Load()),
+                                         ast.Constant(str(name)), load_(fn.args))))
+            args = ast.arguments([], [], ast.arg(fn.args), [], [], None, [])
+        if fn.looped and fn.closures:
+            return self.function(name, x, scope, self_name, loop=False)
+        if fn.looped:
+            stmts = [ast.While(ast.Constant(True), stmts, [])]
+        return ast.FunctionDef(name, args, stmts, [], None)
+
+    def loop(self, x, scope):
+        "[loop bindings *body] for its value: the bindings, a recur target taking their values, and a call of it."
+        bindings = x[1]
+        stmts, values = [], []
+        for p, exp in zip(bindings[::2], bindings[1::2]):
+            s, e = self.expr(exp, scope)
+            t = self.fresh('t')
+            scope = Scope(scope, scope.fn)
+            stmts += s + [assign(t, e)] + self.bind_one(p, load_(t), scope)
+            values.append(load_(t))
+        name = self.fresh('loop')
+        target, looping = self.recur_target(name, bindings[::2], x[2:], scope)
+        return stmts + [target], self.call_target(name, looping, values)
+
+    def recur_target(self, name, patterns, body, scope, loop=True):
+        """The def of a function name whose parameters take the values of patterns,
+        and whose body, body, is that of the loop or fn clause a recur in it goes
+        back to; and whether calls of it go through loadbr.loop."""
+        inner = Scope(scope, None)
+        fn = inner.fn = Function(name, [], loop)
+        stmts = []
+        for p in patterns:
+            fn.parms.append(self.fresh(p if isa(p, Symbol) else 'vec'))
+            if isa(p, Symbol):
+                inner.vars[p] = fn.parms[-1]
             else:
-                f.write(f'''{k}=loadbr.loads('{namespace}/{v}')\n''')
+                stmts += self.bind_one(p, load_(fn.parms[-1]), inner)
+        stmts += self.tail([begin_, *body], inner)
+        if fn.looped and fn.closures:
+            return self.recur_target(name, patterns, body, scope, loop=False)
+        if fn.closures and scope.fn is not None:
+            scope.fn.closures = True  # they see the variables of the function around too
+        if fn.looped:
+            stmts = [ast.While(ast.Constant(True), stmts, [])]
+        args = ast.arguments([], [ast.arg(p) for p in fn.parms], None, [], [], None, [])
+        return ast.FunctionDef(name, args, stmts, [], None), not loop
+
+    def call_target(self, name, looping, values):
+        if looping:
+            return call(ast.Attribute(load_('__br'), 'loop', ast.Load()), load_(name), *values)
+        return call(load_(name), *values)
+
+    def recur_values(self, parms, args):
+        "The values for the recur_parameters of the parameter vector parms of a fn called with the tuple args."
+        if isa(parms, Symbol):
+            return [call(load_('__br_list'), args)]
+        values = []
+        for i, p in enumerate(parms):
+            if p is dot_:
+                values.append(call(load_('__br_list'), ast.Subscript(args, ast.Slice(ast.Constant(i), None, None),
+                                                                     ast.Load())))
+                break
+            values.append(ast.Subscript(args, ast.Constant(i), ast.Load()))
+        return values
+
+    def bind(self, parms, args, scope):
+        "Statements binding the parameter vector parms to the argument tuple args."
+        if isa(parms, Symbol):
+            scope.vars[parms] = self.fresh(parms)
+            return [assign(scope.vars[parms], call(load_('__br_list'), args))]
+        stmts = []
+        for i, p in enumerate(parms):
+            if p is dot_:
+                rest = parms[i + 1]
+                scope.vars[rest] = self.fresh(rest)
+                stmts.append(assign(scope.vars[rest],
+                                    call(load_('__br_list'),
+                                         ast.Subscript(args, ast.Slice(ast.Constant(i), None, None), ast.Load()))))
+                break
+            stmts += self.bind_one(p, ast.Subscript(args, ast.Constant(i), ast.Load()), scope)
+        return stmts
+
+    def bind_one(self, p, value, scope):
+        if not isa(p, list):
+            scope.vars[p] = self.fresh(p)
+            return [assign(scope.vars[p], value)]
+        v = self.fresh('vec')
+        stmts = [assign(v, value)]
+        if len(p) >= 3 and p[-2] is as_ and isa(p[-1], Symbol):
+            stmts += self.bind_one(p[-1], load_(v), scope)
+            p = p[:-2]
+        if len(p) >= 2 and p[-2] is dot_ and isa(p[-1], Symbol):
+            stmts += self.bind_one(p[-1], call(ast.Attribute(load_('__br'), 'dropv', ast.Load()),
+                                               ast.Constant(len(p) - 2), load_(v)), scope)
+            p = p[:-2]
+        for i, q in enumerate(p):
+            stmts += self.bind_one(q, call(ast.Attribute(load_('__br'), 'get', ast.Load()),
+                                           load_(v), ast.Constant(i)), scope)
+        return stmts
 
 
-# if __name__ == '__main__':
-    # print(brfn(global_env, 'add', 1, 2))
-    # br2py('stdlib')
-    # br2py('fib')
+if __name__ == '__main__':
+    for ns in sys.argv[1:]:
+        print(br2py(ns))
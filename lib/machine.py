@@ -0,0 +1,291 @@
+"""Explicit-stack evaluator.
+
+translate() turns an expanded form into a tree of tuples once. execute()
+runs that tree with a heap-allocated stack of continuations instead of
+recursing in Python, so a non-tail recursive bracket function can go as
+deep as memory allows rather than sys.getrecursionlimit(). A call in tail
+position leaves nothing on the stack, so tail recursion runs in constant
+space as in the other evaluators.
+
+Python only recurses where Python code calls back into bracket, e.g. a
+bracket fn passed to mapv; each such call runs its own execute().
+
+A loop, or a call of a fn clause that recurs, leaves a marker on the stack
+for its recur to go back to; recur is in tail position, so the marker is on
+top of the stack when the recur's values are in."""
+import lib.lang
+from lib import compiler
+from lib.compiler import clauses, quote_names, recurs
+from lib.core import nil
+from lib.destructure import element_plan, parameters, plan, recur_parameters
+from lib.lang import Env, Procedure, define_macro, interpret
+from lib.symbols import Symbol, quote_, if_, def_, begin_, defmacro_, fn_, let_, and_, or_, loop_, recur_, async_fn_
+from lib.utils import isa
+from lib.vector import vec
+
+falsy = (None, False, nil)
+
+# node types: (CONST, value) (VAR, name) (NSVAR, namespace, name) (IF, test, conseq, alt)
+# (DEF, name, exp) (BEGIN, exps) (FN, forms, codes) (MACRO, name, exp) (APP, exps)
+# (LET, binders, exps, body) (AND_OR, is_and, exps) (LOOP, binders, exps, body)
+# (COMPILED, code) for an async-fn, which lib.compiler compiles to code(env)
+# and [recur ...] is (APP, ((CONST, RECUR), exps...))
+CONST, VAR, NSVAR, IF, DEF, BEGIN, FN, MACRO, APP, LET, AND_OR, LOOP, COMPILED = range(13)
+
+# continuations: [IF_K, node, env] [DEF_K, name, env] [BEGIN_K, exps, next, env] [ARGS_K, exps, next, values, env]
+# [LET_K, node, next, env] [AND_OR_K, node, next, env] [LOOP_K, node, next, env, outer]
+# and the markers recur goes back to: [LOOPING, node, env, outer] [FN_K, body, outer]
+IF_K, DEF_K, BEGIN_K, ARGS_K, LET_K, AND_OR_K, LOOP_K, LOOPING, FN_K = range(9)
+
+RECUR = object()  # the head of a translated recur
+
+
+class Body:
+    """The translated body of a Proc made by this evaluator; calling it runs the body.
+    rebind(env, args) binds a recur's values, or is None if the body does not recur."""
+    __slots__ = ('node', 'rebind')
+
+    def __init__(self, node, rebind=None):
+        self.node, self.rebind = node, rebind
+
+    def __call__(self, env):
+        return execute(self.node, env, self)
+
+
+def translate(x):
+    "Turn the expanded form x into a node tree for execute()."
+    if isa(x, Symbol):
+        if '/' in x:
+            n, m = x.split('/')
+            return NSVAR, n, m
+        return VAR, x
+    if not isa(x, list) or len(x) == 0:
+        return CONST, x
+
+    op = x[0]
+    if op is quote_:
+        (_, exp) = x
+        return CONST, exp
+    if op is if_:
+        (_, test, conseq, alt) = x
+        return IF, translate(test), translate(conseq), translate(alt)
+    if op is def_:
+        (_, var, exp) = x
+        return DEF, var, translate(exp)
+    if op is begin_:
+        if len(x) == 1:
+            return CONST, None
+        return BEGIN, tuple(translate(e) for e in x[1:])
+    if op is defmacro_:
+        (_, var, exp) = x
+        return MACRO, var, exp
+    if op is fn_:
+        forms = clauses(x)
+        codes = [(enter(parms), Body(translate([begin_, *body]),
+                                     plan(recur_parameters(parms)) if recurs([begin_, *body]) else None))
+                 for parms, *body in forms]
+        return FN, forms, codes
+    if op is async_fn_:
+        return COMPILED, compiler.analyze(x)
+    if op is let_:
+        (_, bindings, *body) = x
+        binders = tuple((parameters(p), element_plan(p)) for p in bindings[::2])
+        return LET, binders, tuple(translate(e) for e in bindings[1::2]), translate([begin_, *body])
+    if op is and_ or op is or_:
+        return AND_OR, op is and_, tuple(translate(e) for e in x[1:])
+    if op is loop_:
+        _, binders, exps, body = translate([let_, *x[1:]])
+        return LOOP, binders, exps, body
+    if op is recur_:
+        return APP, ((CONST, RECUR), *[translate(e) for e in x[1:]])
+    return APP, tuple(translate(e) for e in quote_names(x))
+
+
+def enter(parms):
+    "Return bind(outer, args), which makes the Env for one call of a clause with parameter vector parms."
+    bind = plan(parms)
+
+    def bind_env(outer, args):
+        env = Env.__new__(Env)
+        env.outer = outer
+        bind(env, args)
+        return env
+
+    return bind_env
+
+
+def execute(node, env, body=None):
+    "Evaluate the node tree node in env, the Env of a call of the Body body if node is its node."
+    stack = [[FN_K, body, env.outer]] if body is not None and body.rebind is not None else []
+    push = stack.append
+    while True:
+        # evaluate node, either to a value or by pushing a continuation and moving on to a subnode
+        op = node[0]
+        if op is APP:
+            exps = node[1]
+            push([ARGS_K, exps, 1, [], env])
+            node = exps[0]
+            continue
+        elif op is VAR:
+            name, e = node[1], env
+            while name not in e:
+                e = e.outer
+                if e is None:
+                    raise LookupError(name)
+            value = e[name]
+        elif op is CONST:
+            value = node[1]
+        elif op is IF:
+            push([IF_K, node, env])
+            node = node[1]
+            continue
+        elif op is BEGIN:
+            exps = node[1]
+            if len(exps) > 1:
+                push([BEGIN_K, exps, 1, env])
+            node = exps[0]
+            continue
+        elif op is DEF:
+            push([DEF_K, node[1], env])
+            node = node[2]
+            continue
+        elif op is FN:
+            value = Procedure(env, node[1], node[2])
+        elif op is NSVAR:
+            _, n, m = node
+            value = env.find(n)[n][m]
+        elif op is LET:
+            env = Env(outer=env)
+            if node[2]:
+                push([LET_K, node, 0, env])
+                node = node[2][0]
+            else:
+                node = node[3]
+            continue
+        elif op is AND_OR:
+            push([AND_OR_K, node, 1, env])
+            node = node[2][0]
+            continue
+        elif op is LOOP:
+            outer, env = env, Env(outer=env)
+            if node[2]:
+                push([LOOP_K, node, 0, env, outer])
+                node = node[2][0]
+            else:
+                push([LOOPING, node, env, outer])
+                node = node[3]
+            continue
+        elif op is COMPILED:
+            value = node[1](env)
+        else:  # MACRO
+            define_macro(node[1], node[2], env)
+            value = None
+
+        # hand value to the continuations until one of them has another node to evaluate
+        while stack:
+            k = stack[-1]
+            kind = k[0]
+            if kind is ARGS_K:
+                _, exps, i, values, env = k
+                values.append(value)
+                if i < len(exps):
+                    k[2] = i + 1
+                    node = exps[i]
+                    break
+                stack.pop()
+                proc, *args = values
+                if isinstance(proc, Procedure):
+                    proc = proc.proc(*args)
+                    if proc.code is None:  # made by the interpreter
+                        value = interpret(proc.exp, proc.new_env(args), proc)
+                    elif type(proc.code[1]) is Body:  # one of ours: run its body here, in tail position
+                        bind, body = proc.code
+                        while stack and (stack[-1][0] is FN_K or stack[-1][0] is LOOPING):
+                            stack.pop()  # a marker for the fn or loop this call is the last thing of
+                        if body.rebind is not None:
+                            push([FN_K, body, proc.env])
+                        env = bind(proc.env, args)
+                        node = body.node
+                        break
+                    else:
+                        value = compiler.call(proc, args)
+                elif proc is RECUR:  # back to the marker of the fn or loop the recur is the last thing of
+                    k = stack[-1]
+                    if k[0] is FN_K:
+                        _, body, outer = k
+                        env = Env(outer=outer)
+                        body.rebind(env, args)
+                        node = body.node
+                    else:
+                        _, (_, binders, _, node), _, outer = k
+                        env = Env(outer=outer)
+                        for (names, bind), value in zip(binders, args):
+                            if any(name in env for name in names):
+                                env = Env(outer=env)
+                            bind(env, value)
+                        k[2] = env
+                    break
+                elif callable(proc):
+                    value = proc(*args)
+                else:
+                    value = vec([proc, *args]) if lib.lang.vectors else [proc, *args]  # a vector literal
+            elif kind is IF_K:
+                stack.pop()
+                _, (_, _, conseq, alt), env = k
+                node = conseq if value not in falsy else alt
+                break
+            elif kind is BEGIN_K:
+                _, exps, i, env = k
+                if i == len(exps) - 1:  # the last form is in tail position: drop this continuation first
+                    stack.pop()
+                else:
+                    k[2] = i + 1
+                node = exps[i]
+                break
+            elif kind is LET_K:
+                _, (_, binders, exps, body), i, env = k
+                names, bind = binders[i]
+                if any(name in env for name in names):  # rebound: keep the old one for closures
+                    env = k[3] = Env(outer=env)
+                bind(env, value)
+                if i + 1 < len(exps):
+                    k[2] = i + 1
+                    node = exps[i + 1]
+                else:
+                    stack.pop()
+                    node = body
+                break
+            elif kind is AND_OR_K:
+                _, (_, is_and, exps), i, env = k
+                if (value in falsy) is is_and:  # decided: hand value on
+                    stack.pop()
+                    continue
+                if i == len(exps) - 1:  # the last form is in tail position
+                    stack.pop()
+                else:
+                    k[2] = i + 1
+                node = exps[i]
+                break
+            elif kind is LOOP_K:
+                _, (_, binders, exps, body), i, env, outer = k
+                names, bind = binders[i]
+                if any(name in env for name in names):
+                    env = k[3] = Env(outer=env)
+                bind(env, value)
+                if i + 1 < len(exps):
+                    k[2] = i + 1
+                    node = exps[i + 1]
+                else:
+                    stack[-1] = [LOOPING, k[1], env, outer]
+                    node = body
+                break
+            elif kind is LOOPING or kind is FN_K:  # the loop or fn is done
+                stack.pop()
+            else:  # DEF_K
+                stack.pop()
+                _, name, e = k
+                e[name] = value
+                e.changed()
+                value = None
+        else:
+            return value
@@ -1,7 +1,4 @@
-from naga import partition, mapv
-
-from lib.destructure import destruct
-from lib.symbols import def_, fn_, quote_, begin_
+from lib.symbols import def_, fn_, quote_, async_fn_
 from lib.utils import isa
 
 
@@ -21,27 +18,12 @@ def defn(*args):
     return res
 
 
-def let(forms, *exps):
-    if forms == []:
-        return _let([], [], exps)
-    forms = mapv(list, partition(2, forms))
-    return _let(*zip(*forms), [begin_, *exps])
-
-
-def _let(bindings, args, exps):
-    forms = destruct(bindings, args)[::-1]
-
-    def _let_(forms, exps):
-        for a, b in forms:
-            return _let_(forms, [['fn', [a], exps], b])
-        return exps
-
-    if forms == []:
-        return exps
-
-    return _let_(iter(forms), exps)
+def defn_async(*args):
+    "[defn-async name ...] defs an async-fn as defn defs a fn."
+    _, name, (_, *clauses) = defn(*args)
+    return [def_, name, [async_fn_, *clauses]]
 
 
 macro_table = {'defn': defn,
-               'quote': quote,
-               'let': let}  ## More macros can go here
+               'defn-async': defn_async,
+               'quote': quote}  ## More macros can go here
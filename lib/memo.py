@@ -0,0 +1,273 @@
+"""memoize: caches of what fns return, keyed on the values of their arguments.
+
+[memoize f] is f, remembering what it returns for the arguments it is called
+with, for as long as it likes: by default, every call. Options, after f,
+bound it:
+
+    [memoize f -max-size 1000]             at most 1000 results
+    [memoize f -max-bytes 1000000]         results of about 1MB, at most
+    [memoize f -policy -lfu -max-size 10]  evicting the least used, not the least recent
+    [memoize f -ttl 60]                    forgetting results after a minute
+    [memoize f -threadsafe true]           for a fn called from several threads
+
+The policy says which result to evict to make room: -lru, the default, the
+one least recently used; -lfu, the one least often used, and of those the
+least recent; -ttl, the oldest, which needs a ttl. A ttl, in seconds, makes
+any policy forget results that old. Sizes in bytes are approximate: those
+sys.getsizeof gives, summed over the arguments and result and the lists,
+tuples, maps and sets in them.
+
+Arguments are keyed on their values, as Bracket compares them: lists,
+vectors, maps and sets with the same elements are the same key, whatever
+they are, without pickling them. Lazy seqs are keyed on their identity, as
+hashing one would realize it, maybe forever. A call with an argument that
+has no key, an object that is not hashable and not a collection, is not
+cached.
+
+[memo-stats f] counts the hits, misses, evictions and expirations, and calls
+not cached, and how big the cache is; [memo-clear! f] empties it, and
+[memo-clear! f args] forgets the result for args alone. A cache is not
+locked unless it is threadsafe: two threads calling a fn together may both
+compute a result, but only a threadsafe cache keeps its order and counts
+right."""
+import collections
+import contextlib
+import fractions
+import sys
+import threading
+import time
+
+from lib.seq import ChunkedSeq
+from lib.special_forms import KeyWord
+from lib.symbols import Symbol
+from lib.vector import VectorBase
+
+POLICIES = ('lru', 'lfu', 'ttl')
+ATOMS = {int, float, str, bool, bytes, type(None), fractions.Fraction, Symbol, KeyWord}
+MISSING = object()
+MAP, SET = object(), object()  # tags, so that no map's key is a set's, nor a sequence's
+unlocked = contextlib.nullcontext()
+
+
+class Same:
+    "A key for x itself, equal only to a key for the same x."
+    __slots__ = ('x',)
+
+    def __init__(self, x):
+        self.x = x
+
+    def __eq__(self, other):
+        return type(other) is Same and other.x is self.x
+
+    def __hash__(self):
+        return id(self.x)
+
+
+def key(x):
+    "A hashable key for the value x, equal to the key of another value if the two are equal."
+    if type(x) in ATOMS:
+        return x
+    if isinstance(x, (list, tuple, VectorBase)):
+        x = tuple(x)
+        return x if ATOMS.issuperset(map(type, x)) else tuple(map(key, x))
+    if isinstance(x, ChunkedSeq):
+        return Same(x)
+    if isinstance(x, collections.abc.Mapping):
+        return MAP, frozenset((key(k), key(v)) for k, v in x.items())
+    if isinstance(x, collections.abc.Set):
+        return SET, frozenset(map(key, x))
+    hash(x)  # else a TypeError: x has no key
+    return x
+
+
+def args_key(args, kwargs):
+    "The key for a call: the args themselves, if they are all atoms, as they usually are."
+    if not ATOMS.issuperset(map(type, args)):
+        args = key(args)
+    return (args, key(kwargs)) if kwargs else args
+
+
+def size_of(x):
+    "About how many bytes x takes, with the elements of the lists, tuples, vectors, maps and sets in it."
+    total, seen, todo = 0, set(), [x]
+    while todo:
+        x = todo.pop()
+        if id(x) in seen:
+            continue
+        seen.add(id(x))
+        total += sys.getsizeof(x)
+        if isinstance(x, (list, tuple, VectorBase, collections.abc.Set)):
+            todo.extend(x)
+        elif isinstance(x, collections.abc.Mapping):
+            for k, v in x.items():
+                todo.append(k)
+                todo.append(v)
+    return total
+
+
+class Entry:
+    __slots__ = ('value', 'expires', 'size', 'count')
+
+    def __init__(self, value, expires, size):
+        self.value, self.expires, self.size, self.count = value, expires, size, 1
+
+
+class Cache:
+    """Results by key, in the order they are to be evicted in: for lru and ttl
+    that of entries, an OrderedDict; for lfu, that of the buckets of keys
+    used as many times as each other, starting with the least used."""
+
+    def __init__(self, policy='lru', max_size=None, max_bytes=None, ttl=None, threadsafe=False):
+        policy = str.__str__(policy)
+        if policy not in POLICIES:
+            raise ValueError(f'unknown memoize policy {policy!r}: expected one of {", ".join(POLICIES)}')
+        if policy == 'ttl' and ttl is None:
+            raise ValueError('a ttl cache needs a ttl, in seconds')
+        self.policy, self.max_size, self.max_bytes, self.ttl = policy, max_size, max_bytes, ttl
+        self.threadsafe, self.lock = threadsafe, threading.Lock() if threadsafe else unlocked
+        self.entries = collections.OrderedDict()
+        self.buckets, self.least = {}, 0  # lfu: keys by use count, in the order last used; the least count
+        self.bytes = self.hits = self.misses = self.evictions = self.expirations = self.uncached = 0
+
+    def get(self, k):
+        "The result for k, or MISSING."
+        with self.lock:
+            entry = self.entries.get(k)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            if entry.expires is not None and entry.expires <= time.monotonic():
+                self.remove(k)
+                self.expirations += 1
+                self.misses += 1
+                return MISSING
+            self.hits += 1
+            if self.policy == 'lru':
+                self.entries.move_to_end(k)
+            elif self.policy == 'lfu':
+                self.bucket(entry.count).pop(k)
+                entry.count += 1
+                self.bucket(entry.count)[k] = None
+                if not self.buckets[entry.count - 1]:
+                    del self.buckets[entry.count - 1]
+                    if self.least == entry.count - 1:
+                        self.least = entry.count
+            return entry.value
+
+    def put(self, k, value):
+        size = size_of(k) + size_of(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return  # it would evict everything, and still not fit
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self.lock:
+            if k in self.entries:  # another thread has put it meanwhile
+                self.remove(k)
+            while self.entries and (self.max_size is not None and len(self.entries) >= self.max_size or
+                                    self.max_bytes is not None and self.bytes + size > self.max_bytes):
+                self.remove(self.victim())
+                self.evictions += 1
+            if self.max_size == 0:
+                return
+            self.entries[k] = Entry(value, expires, size)
+            self.bytes += size
+            if self.policy == 'lfu':
+                self.bucket(1)[k] = None
+                self.least = 1
+
+    def bucket(self, count):
+        return self.buckets.setdefault(count, {})
+
+    def victim(self):
+        "The key to evict next."
+        if self.policy == 'lfu':
+            return next(iter(self.buckets[self.least]))
+        return next(iter(self.entries))
+
+    def remove(self, k):
+        entry = self.entries.pop(k)
+        self.bytes -= entry.size
+        if self.policy == 'lfu':
+            bucket = self.buckets[entry.count]
+            del bucket[k]
+            if not bucket:
+                del self.buckets[entry.count]
+                if self.least == entry.count:
+                    self.least = min(self.buckets, default=0)
+
+    def invalidate(self, k):
+        "Forget the result for k; return whether there was one."
+        with self.lock:
+            if k not in self.entries:
+                return False
+            self.remove(k)
+            return True
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.buckets.clear()
+            self.bytes = self.least = 0
+
+    def stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'expirations': self.expirations, 'uncached': self.uncached,
+                    'size': len(self.entries), 'bytes': self.bytes}
+
+    def __reduce__(self):
+        "Pickled, e.g. for pmap, a cache is an empty one with the same settings: the lock does not pickle."
+        return Cache, (self.policy, self.max_size, self.max_bytes, self.ttl, self.threadsafe)
+
+
+class Memoized:
+    "fn, with a Cache of what it has returned."
+    __slots__ = ('fn', 'cache', '__name__')
+
+    def __init__(self, fn, cache):
+        self.fn, self.cache = fn, cache
+        self.__name__ = getattr(fn, '__name__', 'memoized')
+
+    def __call__(self, *args, **kwargs):
+        try:
+            k = args_key(args, kwargs)
+        except TypeError:
+            self.cache.uncached += 1
+            return self.fn(*args, **kwargs)
+        value = self.cache.get(k)
+        if value is MISSING:
+            value = self.fn(*args, **kwargs)
+            self.cache.put(k, value)
+        return value
+
+    def __reduce__(self):
+        return Memoized, (self.fn, self.cache)
+
+    def __repr__(self):
+        return f'Memoized({self.fn!r})'
+
+
+def memo(fn=None, **settings):
+    """fn memoized with a Cache of the settings given, which are Cache's
+    arguments; or, without fn, a decorator that memoizes with them."""
+    if fn is None:
+        return lambda fn: Memoized(fn, Cache(**settings))
+    return Memoized(fn, Cache(**settings))
+
+
+def memoize(f, *options):
+    "[memoize f option value ...]: see the module's docstring."
+    if len(options) % 2:
+        raise ValueError('memoize takes options in pairs, e.g. [memoize f -max-size 100]')
+    settings = {str.__str__(k).replace('-', '_'): v for k, v in zip(options[::2], options[1::2])}
+    return memo(f, **settings)
+
+
+def memo_stats(f):
+    return f.cache.stats()
+
+
+def memo_clear(f, args=None):
+    "[memo-clear! f] forgets every result of f; [memo-clear! f args] the one for args, and whether there was one."
+    if args is None:
+        return f.cache.clear()
+    return f.cache.invalidate(args_key(tuple(args), None))
@@ -0,0 +1,139 @@
+"""pmap, pcalls and fold: work spread over a pool of worker processes.
+
+Bracket runs on one core, so CPU-bound work goes to other processes instead.
+Tasks and their fns are pickled: a Procedure as its expanded clauses and its
+environment, with the global Env and the namespaces import and require made
+going by reference (see lib.lang.Env). Each worker loads core.br at most
+once, and compiles a pickled fn once however many tasks it runs.
+
+The pool is made the first time it is needed, with BRACKET_WORKERS processes,
+by default one per CPU. Where processes can fork, the workers start as copies
+of this one, with every global it has; the pool is made again when a def,
+import or require has changed a namespace since (Env.global_version), so
+that they see new ones, but not for a def in a fn's body, as a fn pickles
+with the Env it was made in. Elsewhere a worker starts afresh and loads
+core.br, and the files required into the global Env, as it unpickles a
+reference to it; the defs made at the top level since go with the fns that
+refer to them. In a worker, pmap, pcalls and fold run where they are called
+rather than making a pool of their own."""
+import collections
+import functools
+import itertools
+import multiprocessing
+import os
+import pickle
+
+from lib import seq as lazy
+from lib.core import reduce_
+from lib.lang import Env, shipping
+
+workers = int(os.environ.get('BRACKET_WORKERS') or 0) or os.cpu_count() or 1
+ahead = 2  # tasks each worker may have waiting, beyond the one it runs
+
+pool = None
+pool_version = None
+in_worker = False
+
+
+def initialize():
+    global in_worker
+    in_worker = True
+
+
+def get_pool():
+    "The pool, made again if the globals have changed since the workers forked."
+    global pool, pool_version
+    forking = multiprocessing.get_start_method() == 'fork'
+    if pool is None or forking and pool_version != Env.global_version:
+        if pool is not None:
+            pool.close()  # its workers finish the tasks they have, then exit
+        pool, pool_version = multiprocessing.Pool(workers, initializer=initialize), Env.global_version
+    return pool
+
+
+@functools.lru_cache(maxsize=32)
+def loaded(data):
+    "The fn pickled as data, unpickled once per worker."
+    return pickle.loads(data)
+
+
+def run_map(data, star, items):
+    f = loaded(data)
+    return [f(*x) for x in items] if star else [f(x) for x in items]
+
+
+def run_reduce(data, init, items):
+    return reduce_(loaded(data), init, items)
+
+
+def run_call(f):
+    return f()
+
+
+def run(task):
+    "Run a task pickled by submit. Unpickling it here, an error doing so is the task's, rather than the worker's."
+    fn, *args = pickle.loads(task)
+    return fn(*args)
+
+
+def dumps(x):
+    "x pickled for the workers: its fns carry the top-level defs they refer to, unless the workers forked with them."
+    old, shipping.globals = shipping.globals, multiprocessing.get_start_method() != 'fork'
+    try:
+        return pickle.dumps(x)
+    finally:
+        shipping.globals = old
+
+
+def submit(tasks):
+    """The results of tasks, (function, args...) tuples, in order, run in the
+    pool with at most workers * (ahead + 1) of them in it at once."""
+    p = get_pool()
+    pending = collections.deque()
+    for task in tasks:
+        pending.append(p.apply_async(run, (dumps(task),)))
+        if len(pending) > workers * (ahead + 1):
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def pmap(f, *colls):
+    """map, with f applied in the workers: a lazy seq of the results in order.
+    It reads its colls a chunk at a time, giving each worker a share of the
+    chunk, and keeps only a few tasks per worker ahead of what has been read."""
+    if in_worker:
+        return lazy.map_(f, *colls)
+    data, star = dumps(f), len(colls) > 1
+
+    def tasks():
+        for items in lazy.chunked(zip(*colls) if star else colls[0]):
+            share = -(-len(items) // workers)
+            for i in range(0, len(items), share):
+                yield run_map, data, star, items[i:i + share]
+
+    return lazy.ChunkedSeq.of(submit(tasks()))
+
+
+def pcalls(*fns):
+    "A lazy seq of the results of calling each of fns with no arguments, each in a worker."
+    if in_worker:
+        return lazy.map_(lambda f: f(), fns)
+    return lazy.seq(submit((run_call, f) for f in fns))
+
+
+def fold(*args):
+    """[fold reducef xs], [fold combinef reducef xs] or [fold n combinef reducef xs]:
+    reduce each n elements of xs (512 by default) with reducef from [combinef]
+    in a worker, and combine what they come to with combinef, as Clojure's
+    reducers do. reducef may stop a part early with reduced."""
+    if len(args) == 2:
+        args = (args[0], *args)
+    n, combinef, reducef, xs = args if len(args) == 4 else (512, *args)
+    init = combinef()
+    if in_worker:
+        parts = [reduce_(reducef, init, xs)]
+    else:
+        data, it = dumps(reducef), iter(xs)
+        parts = submit((run_reduce, data, init, part) for part in iter(lambda: list(itertools.islice(it, n)), []))
+    return functools.reduce(combinef, parts, init)
@@ -0,0 +1,240 @@
+"""Chunked lazy seqs: sequences realized 32 elements at a time, as needed.
+
+A ChunkedSeq is a position in a chain of Chunks. Each Chunk holds a list of
+realized elements and, once something reads past it, the Chunk after it, so
+a chunk is realized once and then shared by every seq that reaches it. rest
+is an O(1) step within a chunk, and walking a seq never realizes more than
+the chunk it stands in.
+
+map_, filter_, take, take_while, reductions, range_ and repeat build
+ChunkedSeqs whose chunks are computed a whole chunk at a time from the chunks
+of their sources, rather than element by element. They are lazy, so they work
+on infinite sources like [range] and [repeat x]; only len, equality, hashing
+and reading the end of such a seq never return.
+
+ChunkedSeqs are equal to the lists, tuples and Vectors with the same elements,
+and print like lists, showing at most PRINT_LENGTH elements. They pickle as
+the list of all their elements."""
+import builtins
+import itertools
+import threading
+
+import naga
+from naga import nil
+
+from lib.vector import Vector, VectorBase
+
+CHUNK = 32
+PRINT_LENGTH = 100
+UNREALIZED = object()
+falsy = (None, False, nil)
+
+
+class Chunk:
+    "Realized elements of a seq, and the source of the chunks after them, until the next Chunk is realized."
+    __slots__ = ('items', 'source', 'lock', 'after')
+
+    def __init__(self, items, source, lock):
+        self.items, self.source, self.lock, self.after = items, source, lock, UNREALIZED
+
+    def next(self):
+        "The Chunk after this one, or None at the end, realized only the first time it is asked for."
+        if self.after is UNREALIZED:
+            with self.lock:
+                if self.after is UNREALIZED:
+                    self.after = realize(self.source, self.lock)
+                    self.source = None
+        return self.after
+
+
+def realize(source, lock):
+    "The next non-empty list of source, an iterator of lists, as a Chunk; None when source is done."
+    for items in source:
+        if items:
+            return Chunk(items, source, lock)
+    return None
+
+
+class ChunkedSeq:
+    "A lazy seq of the elements from offset on in chunk, then those of the chunks after it."
+    __slots__ = ('chunk', 'offset')
+
+    def __init__(self, chunk, offset=0):
+        self.chunk, self.offset = chunk, offset
+
+    @classmethod
+    def of(cls, chunks):
+        "A ChunkedSeq of the elements of chunks, an iterable of lists, none of which is realized yet."
+        return cls(Chunk([], iter(chunks), threading.Lock()))
+
+    def forward(self):
+        "The chunk and offset of the first element, past the chunks this seq has used up. The chunk is None at the end."
+        chunk, offset = self.chunk, self.offset
+        while chunk is not None and offset >= len(chunk.items):
+            chunk, offset = chunk.next(), 0
+        return chunk, offset
+
+    def empty(self):
+        return self.forward()[0] is None
+
+    def first(self):
+        chunk, offset = self.forward()
+        return None if chunk is None else chunk.items[offset]
+
+    def rest(self):
+        chunk, offset = self.forward()
+        return self if chunk is None else ChunkedSeq(chunk, offset + 1)
+
+    def last(self):
+        chunk, _ = self.forward()
+        if chunk is None:
+            return None
+        while (after := chunk.next()) is not None:
+            chunk = after
+        return chunk.items[-1]
+
+    def get(self, i, default=None):
+        try:
+            return self[i]
+        except (IndexError, TypeError):
+            return default
+
+    def chunks(self):
+        "The lists of elements of this seq, realizing each only when it is reached."
+        chunk, offset = self.forward()
+        if chunk is not None:
+            yield chunk.items[offset:] if offset else chunk.items
+            while (chunk := chunk.next()) is not None:
+                yield chunk.items
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self.chunks())
+
+    def __len__(self):
+        return sum(map(len, self.chunks()))
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            if (i.start or 0) < 0 or (i.stop or 0) < 0 or (i.step or 1) < 0:
+                return ChunkedSeq.of([list(self)[i]])
+            return seq(itertools.islice(self, i.start, i.stop, i.step))
+        if i < 0:
+            return list(self)[i]
+        for items in self.chunks():
+            if i < len(items):
+                return items[i]
+            i -= len(items)
+        raise IndexError('seq index out of range')
+
+    def __eq__(self, other):
+        if not isinstance(other, (ChunkedSeq, VectorBase, list, tuple)):
+            return NotImplemented
+        missing = object()
+        return all(a == b for a, b in itertools.zip_longest(self, other, fillvalue=missing))
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __reduce__(self):
+        return seq, (list(self),)
+
+    def __repr__(self):
+        shown = list(itertools.islice(self, PRINT_LENGTH + 1))
+        if len(shown) > PRINT_LENGTH:
+            return repr(shown[:PRINT_LENGTH])[:-1] + ', ...]'
+        return repr(shown)
+
+
+def chunked(xs):
+    "The elements of the iterable xs as lists of up to CHUNK of them, sliced straight out of xs where it can be."
+    if isinstance(xs, (ChunkedSeq, Vector)):
+        return xs.chunks()
+    if isinstance(xs, (list, tuple, range, str)):
+        return (list(xs[i:i + CHUNK]) for i in range(0, len(xs), CHUNK))
+    it = iter(xs)
+    return iter(lambda: list(itertools.islice(it, CHUNK)), [])
+
+
+def seq(xs=()):
+    "A ChunkedSeq of the elements of the iterable xs."
+    return xs if isinstance(xs, ChunkedSeq) else ChunkedSeq.of(chunked(xs))
+
+
+def map_(f, *colls):
+    if len(colls) == 1:
+        return ChunkedSeq.of(list(builtins.map(f, items)) for items in chunked(colls[0]))
+    return seq(builtins.map(f, *colls))
+
+
+def filter_(pred, xs):
+    return ChunkedSeq.of(list(builtins.filter(pred, items)) for items in chunked(xs))
+
+
+def take(n, xs):
+    def chunks(left):
+        if left > 0:
+            for items in chunked(xs):
+                if len(items) >= left:
+                    yield items[:left]
+                    return
+                yield items
+                left -= len(items)
+
+    return ChunkedSeq.of(chunks(n))
+
+
+def take_while(pred, xs):
+    "The elements of xs up to the first for which pred is falsy, in Bracket's sense: None, False or nil."
+    def chunks():
+        for items in chunked(xs):
+            for i, x in enumerate(items):
+                if pred(x) in falsy:
+                    yield items[:i]
+                    return
+            yield items
+
+    return ChunkedSeq.of(chunks())
+
+
+def reductions(f, xs, init=nil):
+    "The intermediate values of reducing xs with f, starting from init, or from the first element of xs."
+    def chunks(acc):
+        source = chunked(xs)
+        if acc is nil:
+            items = next(source, [])
+            if not items:
+                yield [f()]
+                return
+            acc, source = items[0], itertools.chain([items[1:]], source)
+        yield [acc]
+        for items in source:
+            accs = list(itertools.accumulate(items, f, initial=acc))
+            acc = accs[-1]
+            yield accs[1:]
+
+    return ChunkedSeq.of(chunks(init))
+
+
+def range_(*args):
+    "[range] counts up from 0 without end; otherwise, as Python's range."
+    if not args:
+        return ChunkedSeq.of(list(range(i, i + CHUNK)) for i in itertools.count(0, CHUNK))
+    r = range(*args)
+    return ChunkedSeq.of(list(r[i:i + CHUNK]) for i in range(0, len(r), CHUNK))
+
+
+def repeat(*args):
+    "[repeat x] is x without end, every chunk the same list; [repeat n x] is x n times."
+    if len(args) == 2:
+        n, x = args
+        return take(n, repeat(x))
+    x, = args
+    return ChunkedSeq.of(itertools.repeat([x] * CHUNK))
+
+
+def seqp(x):
+    return isinstance(x, ChunkedSeq)
+
+
+for f, name in [(naga.first, 'first'), (naga.last, 'last'), (naga.rest, 'rest'), (naga.get, 'get')]:
+    f.pattern(ChunkedSeq)(lambda s, *args, name=name: getattr(s, name)(*args))
@@ -1,26 +1,24 @@
-from naga import get, nil
+from naga import get
 
-from lib.utils import isa
+from lib.hamt import HashMap, Set  # noqa: F401  (re-exported: core.br imports them from here)
 
 
-class HashMap(dict):
-    def __call__(self, x):
-        return get(self, x)
-
-
-class Set(set):
-    def __call__(self, x):
-        return Set.get(self, x)
-
-    def __repr__(self):
-        return repr(set(self))
+class KeyWord(str):
+    "A keyword such as -as. Keywords are interned like symbols."
+    __slots__ = ()
+    table = {}
 
-    @staticmethod
-    def get(x, k, not_found=nil):
-        return k if k in x else None if not_found is nil else not_found
+    def __new__(cls, s):
+        try:
+            return cls.table[s]
+        except KeyError:
+            kw = super().__new__(cls, s)
+            hash(kw)
+            return cls.table.setdefault(kw, kw)
 
+    def __reduce__(self):
+        return KeyWord, (str.__str__(self),)
 
-class KeyWord(str):
     def __repr__(self):
         return f'-{super().__repr__()[1:-1]}'
 
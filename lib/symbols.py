@@ -1,13 +1,40 @@
 from naga import mapv
 
 
-class Symbol(str): pass
+class Symbol(str):
+    """A symbol. Symbols are interned: reading, building or unpickling the same
+    name always gives the same object, so special forms can be recognised by
+    identity, and each symbol's hash is computed once."""
+    __slots__ = ()
+    table = {}
 
-def Sym(s, symbol_table={}):
+    def __new__(cls, s):
+        try:
+            return cls.table[s]
+        except KeyError:
+            sym = super().__new__(cls, s)
+            hash(sym)
+            return cls.table.setdefault(sym, sym)
+
+    def __reduce__(self):
+        # unpickle (e.g. from a .brc cache) through the symbol table, unless self was never in it
+        if Symbol.table.get(self) is self:
+            return Symbol, (str(self),)
+        return uninterned, (str(self),)
+
+
+def uninterned(s):
+    """A Symbol for s that is not in the table, for gensyms: there is one for
+    each call, and none is kept once nothing refers to it. It is equal to the
+    interned one but not identical, which only special forms look for."""
+    sym = str.__new__(Symbol, s)
+    hash(sym)
+    return sym
+
+
+def Sym(s):
     "Find or create unique Symbol entry for str s in symbol table."
-    if s not in symbol_table:
-        symbol_table[s] = Symbol(s)
-    return symbol_table[s]
+    return Symbol(s)
 
 # @formatter:off
 quote_, if_, set_, def_, fn_, begin_, defmacro_, = mapv(Sym,
@@ -19,11 +46,21 @@ quasiquote_, unquote_, unquotesplicing_ = mapv(Sym,
 append_, cons_, let_, cond_ = mapv(Sym,
 "append cons let cond".split())
 
+and_, or_, when_, loop_, recur_ = mapv(Sym,
+"and or when loop recur".split())
+
 autogensym_ = Sym('autogensym')
 
+async_fn_, await_ = mapv(Sym,
+"async-fn await".split())
+
+# function names whose arguments eval passes quoted, and the variadic marker
+requiresym_, importsym_, dot_ = mapv(Sym,
+"require import .".split())
+
 # @formatter:on
 
-specforms = [quote_, if_, set_, def_, fn_, begin_, defmacro_]
+specforms = [quote_, if_, set_, def_, fn_, begin_, defmacro_, let_, and_, or_, when_, loop_, recur_, async_fn_, await_]
 
 def PyObject(x):
     return eval(x)
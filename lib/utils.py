@@ -1,6 +1,7 @@
 import itertools
+import keyword
 
-from lib.symbols import Symbol
+from lib.symbols import uninterned
 
 
 def ara(x, y):
@@ -25,22 +26,31 @@ def flatten(x):
 
 class AutoGenSym:
     def __init__(self):
-        self.x = 0
+        self.counter = itertools.count()  # next() on it is atomic, so threads never get the same symbol
 
     def __call__(self, s=None):
         if s is None:
             return self('')
-        x_ = f'{s}{self.x}'
-        self.x += 1
-        return Symbol(x_)
+        return uninterned(f'{s}{next(self.counter)}')
 
 
 def munge(s):
+    "Turn the bracket name s into a Python identifier."
     symbols = [('!', '_BANG_'),
                ('+', '_PLUS_'),
                ('-', '_SUB_'),
                ('_*_', '_STAR_'),
-               ('/', '_DIV_')]
+               ('*', '_STAR_'),
+               ('/', '_DIV_'),
+               ('?', '_QMARK_'),
+               ('>', '_GT_'),
+               ('<', '_LT_'),
+               ('=', '_EQ_'),
+               ('.', '_DOT_'),
+               ('&', '_AMPERSAND_')]
     for sym, r in symbols:
         s = s.replace(sym, r)
-    return s
+    s = ''.join(c if c.isalnum() or c == '_' else f'_{ord(c):X}_' for c in s)
+    if not s.isidentifier():
+        s = f'_{s}'
+    return f'{s}_' if keyword.iskeyword(s) else s
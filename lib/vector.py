@@ -0,0 +1,408 @@
+"""Persistent vectors: immutable sequences whose updates share structure.
+
+A Vector keeps its elements in a trie of Nodes 32 wide, and its last up to 32
+elements in a tail, as Clojure's PersistentVector does. conj, assoc and nth
+take O(log32 n) and copy only the nodes on one path from the root. rest and
+slices with step 1 are SubVectors, O(1) views of a Vector.
+
+A TransientVector is the mutable, single-owner version of a Vector, for
+building one in bulk: it changes the nodes it made itself in place, and
+persistent() hands them over to a Vector, after which the transient can no
+longer be used.
+
+Vectors are equal to the lists and tuples with the same elements, and print
+like lists, so Python code that reads a list without changing it can take a
+Vector instead."""
+import collections.abc
+import itertools
+
+import naga
+
+BITS = 5
+WIDTH = 1 << BITS
+MASK = WIDTH - 1
+
+
+class Node:
+    "A node of the trie: its children, or elements in a leaf. Only the transient whose token is edit may change it."
+    __slots__ = ('edit', 'array')
+
+    def __init__(self, edit, array):
+        self.edit, self.array = edit, array
+
+
+def editable(edit, node):
+    "node, or a copy of it that edit may change. A persistent update (edit None) always copies."
+    if edit is not None and node.edit is edit:
+        return node
+    return Node(edit, node.array[:])
+
+
+def new_path(edit, level, node):
+    "node under a chain of single-child nodes reaching down from level."
+    while level > 0:
+        node = Node(edit, [node])
+        level -= BITS
+    return node
+
+
+def push_tail(edit, count, level, parent, tail):
+    "parent at level, with the full tail node of a vector of count elements added after its last leaf."
+    parent = editable(edit, parent)
+    i = ((count - 1) >> level) & MASK
+    if level == BITS:
+        child = tail
+    elif i < len(parent.array):
+        child = push_tail(edit, count, level - BITS, parent.array[i], tail)
+    else:
+        child = new_path(edit, level - BITS, tail)
+    if i < len(parent.array):
+        parent.array[i] = child
+    else:
+        parent.array.append(child)
+    return parent
+
+
+def pop_tail(edit, count, level, node):
+    "node at level without its last leaf, or None if that leaves it empty."
+    i = ((count - 2) >> level) & MASK
+    if level > BITS:
+        child = pop_tail(edit, count, level - BITS, node.array[i])
+        if child is None and i == 0:
+            return None
+        node = editable(edit, node)
+        if child is None:
+            del node.array[i]
+        else:
+            node.array[i] = child
+        return node
+    if i == 0:
+        return None
+    node = editable(edit, node)
+    del node.array[i]
+    return node
+
+
+def do_assoc(edit, level, node, i, x):
+    "node at level with element i set to x."
+    node = editable(edit, node)
+    if level == 0:
+        node.array[i & MASK] = x
+    else:
+        j = (i >> level) & MASK
+        node.array[j] = do_assoc(edit, level - BITS, node.array[j], i, x)
+    return node
+
+
+def leaf(count, shift, root, tail, i):
+    "The array holding element i of a vector."
+    if i >= count - len(tail):
+        return tail
+    node = root
+    for level in range(shift, 0, -BITS):
+        node = node.array[(i >> level) & MASK]
+    return node.array
+
+
+class VectorBase(collections.abc.Sequence):
+    "What Vector and SubVector share, in terms of len, nth, iter and subvec."
+    __slots__ = ()
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step == 1:
+                return self.subvec(start, max(start, stop))
+            return vec(itertools.islice(self, start, stop, step) if step > 0 else list(self)[i])
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError('vector index out of range')
+        return self.nth(i)
+
+    def get(self, i, not_found=None):
+        if isinstance(i, int) and 0 <= i < len(self):
+            return self.nth(i)
+        return not_found
+
+    def first(self):
+        return self.nth(0) if len(self) else None
+
+    def last(self):
+        return self.nth(len(self) - 1) if len(self) else None
+
+    def rest(self):
+        return self.subvec(min(1, len(self)), len(self))
+
+    def update(self, i, f, *args):
+        return self.assoc(i, f(self.get(i), *args))
+
+    def transient(self):
+        return TransientVector(vec(self))
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if isinstance(other, (VectorBase, list, tuple)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __lt__(self, other):
+        return tuple(self) < tuple(other)
+
+    def __le__(self, other):
+        return tuple(self) <= tuple(other)
+
+    def __gt__(self, other):
+        return tuple(self) > tuple(other)
+
+    def __ge__(self, other):
+        return tuple(self) >= tuple(other)
+
+    def __add__(self, other):
+        return self.transient().conj(*other).persistent()
+
+    def __radd__(self, other):  # [a] + v, as lib.core.cons does
+        return vec(itertools.chain(other, self))
+
+    def __repr__(self):
+        return f'[{", ".join(map(repr, self))}]'
+
+    def __reduce__(self):
+        return vec, (list(self),)
+
+
+class Vector(VectorBase):
+    __slots__ = ('count', 'shift', 'root', 'tail')
+
+    def __init__(self, count, shift, root, tail):
+        self.count, self.shift, self.root, self.tail = count, shift, root, tail
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for array in self.chunks():
+            yield from array
+
+    def chunks(self):
+        "The arrays of elements, in order: the leaves of the trie, then the tail."
+        def leaves(node, level):
+            if level == 0:
+                yield node.array
+            else:
+                for child in node.array:
+                    yield from leaves(child, level - BITS)
+
+        if self.count > len(self.tail):
+            yield from leaves(self.root, self.shift)
+        yield self.tail
+
+    def nth(self, i):
+        return leaf(self.count, self.shift, self.root, self.tail, i)[i & MASK]
+
+    def conj(self, *xs):
+        if len(xs) != 1:
+            return self.transient().conj(*xs).persistent() if xs else self
+        (x,) = xs
+        count, shift, root, tail = self.count, self.shift, self.root, self.tail
+        if len(tail) < WIDTH:
+            return Vector(count + 1, shift, root, tail + [x])
+        node = Node(None, tail)
+        if (count >> BITS) > (1 << shift):  # the root is full
+            return Vector(count + 1, shift + BITS, Node(None, [root, new_path(None, shift, node)]), [x])
+        return Vector(count + 1, shift, push_tail(None, count, shift, root, node), [x])
+
+    def assoc(self, i, x):
+        count, shift, root, tail = self.count, self.shift, self.root, self.tail
+        if i == count:
+            return self.conj(x)
+        if not 0 <= i < count:
+            raise IndexError('vector index out of range')
+        if i >= count - len(tail):
+            tail = tail[:]
+            tail[i & MASK] = x
+            return Vector(count, shift, root, tail)
+        return Vector(count, shift, do_assoc(None, shift, root, i, x), tail)
+
+    def pop(self):
+        "This vector without its last element."
+        count, shift, root, tail = self.count, self.shift, self.root, self.tail
+        if count == 0:
+            raise IndexError("can't pop an empty vector")
+        if count == 1:
+            return EMPTY
+        if len(tail) > 1:
+            return Vector(count - 1, shift, root, tail[:-1])
+        tail = leaf(count, shift, root, tail, count - 2)
+        root = pop_tail(None, count, shift, root) or EMPTY_NODE
+        if shift > BITS and len(root.array) == 1:
+            root, shift = root.array[0], shift - BITS
+        return Vector(count - 1, shift, root, tail)
+
+    def subvec(self, start, end):
+        if not 0 <= start <= end <= self.count:
+            raise IndexError('subvec index out of range')
+        return SubVector(self, start, end)
+
+    def transient(self):
+        return TransientVector(self)
+
+
+class SubVector(VectorBase):
+    "Elements start to end of the Vector v, shared with it."
+    __slots__ = ('v', 'start', 'end')
+
+    def __init__(self, v, start, end):
+        self.v, self.start, self.end = v, start, end
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __iter__(self):
+        return itertools.islice(self.v, self.start, self.end)
+
+    def nth(self, i):
+        return self.v.nth(self.start + i)
+
+    def conj(self, *xs):
+        v, end = self.v, self.end
+        for x in xs:
+            v = v.assoc(end, x)  # appends when end is the end of v
+            end += 1
+        return SubVector(v, self.start, end)
+
+    def assoc(self, i, x):
+        if not 0 <= i <= len(self):
+            raise IndexError('vector index out of range')
+        return SubVector(self.v.assoc(self.start + i, x), self.start, max(self.end, self.start + i + 1))
+
+    def pop(self):
+        if self.end == self.start:
+            raise IndexError("can't pop an empty vector")
+        return SubVector(self.v, self.start, self.end - 1)
+
+    def subvec(self, start, end):
+        if not 0 <= start <= end <= len(self):
+            raise IndexError('subvec index out of range')
+        return SubVector(self.v, self.start + start, self.start + end)
+
+
+class TransientVector:
+    """A vector that conj, assoc and pop change in place, made by transient()
+    from a Vector that it then shares nodes with, until persistent()."""
+    __slots__ = ('count', 'shift', 'root', 'tail', 'edit')
+
+    def __init__(self, v):
+        self.edit = object()
+        self.count, self.shift, self.tail = v.count, v.shift, v.tail[:]
+        self.root = editable(self.edit, v.root)
+
+    def ensure_editable(self):
+        if self.edit is None:
+            raise RuntimeError('transient used after persistent!')
+
+    def __len__(self):
+        self.ensure_editable()
+        return self.count
+
+    def nth(self, i):
+        self.ensure_editable()
+        return leaf(self.count, self.shift, self.root, self.tail, i)[i & MASK]
+
+    def __getitem__(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError('vector index out of range')
+        return self.nth(i)
+
+    def conj(self, *xs):
+        self.ensure_editable()
+        edit, i = self.edit, 0
+        while i < len(xs):  # fill the tail a slice at a time
+            if len(self.tail) == WIDTH:
+                count, shift, root = self.count, self.shift, self.root
+                node = Node(edit, self.tail)
+                if (count >> BITS) > (1 << shift):
+                    self.root = Node(edit, [root, new_path(edit, shift, node)])
+                    self.shift += BITS
+                else:
+                    self.root = push_tail(edit, count, shift, root, node)
+                self.tail = []
+            chunk = xs[i:i + WIDTH - len(self.tail)]
+            self.tail.extend(chunk)
+            self.count += len(chunk)
+            i += len(chunk)
+        return self
+
+    def assoc(self, i, x):
+        self.ensure_editable()
+        if i == self.count:
+            return self.conj(x)
+        if not 0 <= i < self.count:
+            raise IndexError('vector index out of range')
+        if i >= self.count - len(self.tail):
+            self.tail[i & MASK] = x
+        else:
+            self.root = do_assoc(self.edit, self.shift, self.root, i, x)
+        return self
+
+    def __setitem__(self, i, x):  # assoc! in core.br
+        self.assoc(i, x)
+
+    def pop(self):
+        self.ensure_editable()
+        count = self.count
+        if count == 0:
+            raise IndexError("can't pop an empty vector")
+        if len(self.tail) > 1 or count == 1:
+            self.tail.pop()
+        else:
+            self.tail = leaf(count, self.shift, self.root, self.tail, count - 2)[:]
+            self.root = pop_tail(self.edit, count, self.shift, self.root) or Node(self.edit, [])
+            if self.shift > BITS and len(self.root.array) == 1:
+                self.root, self.shift = self.root.array[0], self.shift - BITS
+        self.count -= 1
+        return self
+
+    def persistent(self):
+        self.ensure_editable()
+        self.edit = None  # the nodes made so far can no longer change
+        return Vector(self.count, self.shift, self.root, self.tail)
+
+
+EMPTY_NODE = Node(None, [])
+EMPTY = Vector(0, BITS, EMPTY_NODE, [])
+
+
+def vec(xs=()):
+    "A Vector of the elements of the iterable xs, built leaf by leaf."
+    if isinstance(xs, Vector):
+        return xs
+    items = list(xs)
+    n = len(items)
+    if n == 0:
+        return EMPTY
+    tailoff = ((n - 1) >> BITS) << BITS
+    nodes = [Node(None, items[i:i + WIDTH]) for i in range(0, tailoff, WIDTH)]
+    shift = BITS
+    while len(nodes) > WIDTH:
+        nodes = [Node(None, nodes[i:i + WIDTH]) for i in range(0, len(nodes), WIDTH)]
+        shift += BITS
+    return Vector(n, shift, Node(None, nodes), items[tailoff:])
+
+
+def vector(*xs):
+    return vec(xs)
+
+
+def vectorp(x):
+    return isinstance(x, VectorBase)
+
+
+for f, name in [(naga.first, 'first'), (naga.last, 'last'), (naga.rest, 'rest'), (naga.get, 'get'),
+                (naga.assoc, 'assoc'), (naga.update, 'update')]:
+    f.pattern(VectorBase)(lambda v, *args, name=name: getattr(v, name)(*args))
@@ -0,0 +1,106 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import lib.lang
+from lib import cache
+from lib.lang import global_env, require_, special_functions, eval, parse
+from lib.special_forms import KeyWord
+from lib.symbols import Symbol
+
+MODULE = '''
+[defmacro swap-args [f a b] `[let [x# ,a] [,f ,b x#]]]
+[def kw -key]
+[def sym [quote sym]]
+[defn f [a b] [swap-args sub a b]]
+'''
+
+
+def unpickle_fails():
+    raise ValueError('unpickle')
+
+
+class Unpicklable:
+    def __reduce__(self):
+        return unpickle_fails, ()
+
+
+class CacheTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        special_functions()
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'mod')
+        self.write(MODULE)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write(self, text):
+        with open(self.path + '.br', 'w') as f:
+            f.write(text)
+
+    def require(self):
+        require_(global_env, Symbol(self.path), 'mod')
+        return global_env['mod']
+
+    def test_cache_skips_reader_and_expand(self):
+        self.require()
+        self.assertTrue(os.path.exists(self.path + '.brc'))
+        with mock.patch.object(lib.lang, 'read', side_effect=AssertionError('read')), \
+                mock.patch.object(lib.lang, 'expand', side_effect=AssertionError('expand')):
+            mod = self.require()
+        self.assertEqual(1, mod['f'](1, 2))
+        self.assertEqual(KeyWord('key'), mod['kw'])
+        self.assertIsInstance(mod['kw'], KeyWord)
+        self.assertIsInstance(mod['sym'], Symbol)
+        self.assertEqual(1, eval(parse('[swap-args sub 1 2]')))
+
+    def test_stale_cache_is_rebuilt(self):
+        self.require()
+        self.write(MODULE + '[def extra 42]')
+        self.assertEqual(42, self.require()['extra'])
+        with mock.patch.object(lib.lang, 'read', side_effect=AssertionError('read')):
+            self.assertEqual(42, self.require()['extra'])
+
+    def test_corrupt_cache_falls_back(self):
+        self.require()
+        with open(self.path + '.brc', 'r+b') as f:
+            f.seek(cache.HEADER + 10)
+            f.write(b'garbage')
+        self.assertEqual(1, self.require()['f'](1, 2))
+        with open(self.path + '.brc', 'wb') as f:
+            f.write(b'BRC')
+        self.assertEqual(1, self.require()['f'](1, 2))
+
+    def test_form_that_fails_to_unpickle(self):
+        ran = []
+        global_env['ran'] = ran.append
+        self.write('[ran 1]\n[ran 2]\n[ran 3]\n')
+        brc = self.path + '.brc'
+        for bad in (2, 0):
+            self.require()  # makes the cache
+            with open(brc, 'rb') as f:
+                key = f.read(cache.HEADER)[len(cache.MAGIC):-32]
+            forms = list(cache._forms(brc))
+            forms[bad] = forms[bad][0], Unpicklable()
+            with cache.Writer(self.path + '.br', key) as writer:  # a valid digest, for forms that don't all load
+                for form in forms:
+                    writer.write(form)
+            del ran[:]
+            self.require()
+            self.assertEqual([1, 2, 3], ran)  # those replayed from the cache are not run again
+            self.assertEqual(bad == 0, os.path.exists(brc))  # if none were, the cache is made again
+        del global_env['ran']
+
+    def test_star_require(self):
+        require_(global_env, [Symbol(self.path), '*'])
+        require_(global_env, [Symbol(self.path), '*'])
+        self.assertEqual(-1, eval(parse('[f 2 1]')))
+
+
+if __name__ == '__main__':
+    unittest.main()
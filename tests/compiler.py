@@ -0,0 +1,135 @@
+import sys
+import unittest
+
+import lib.lang
+from lib.lang import global_env, special_functions, eval, parse, Env
+
+EXPRS = ['[let [a [add 1 2] b [add a 1] c [add a b]] [add a b c]]',
+         '[let [[a . b] [1 2 3 4] c [first b] res [add a c]] res]',
+         '[let [[a [b c . d] -as v] [1 [2 3 4]]] [list a b c d v]]',
+         '[let [x 1 f [fn [] x] x [inc x]] [list [f] x]]',
+         '[list [and 1 2] [and 1 nil 3] [or nil false] [or nil 0 3] [when true 1 2]]',
+         '[loop [i 0 [a b] [1 2] acc []] [if [< i 3] [recur [inc i] [list b a] [conj acc a]] acc]]',
+         '[[fn [a b . xs] [list a b xs]] 1 2 3 4]',
+         '[into [] [1 2 3]]',
+         '[take-while even? [2 4 5 6]]',
+         '[cond false 1 -else 2]',
+         '[-> 1 inc [mul 2]]',
+         '[[comp inc [fn [x] [mul x 2]]] 3]',
+         '[mapv [fn [[a b]] [add a b]] [[1 2] [3 4]]]',
+         '[sort-by -a [list [hashmap -a 3] [hashmap -a 1]]]',
+         '[1 2 [add 1 2]]',
+         '[begin [def x 10] x]']
+
+
+class CompilerTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        special_functions()
+
+    def run_with(self, evaluator, src, env=global_env):
+        old, lib.lang.evaluator = lib.lang.evaluator, evaluator
+        try:
+            return eval(parse(src), env)
+        finally:
+            lib.lang.evaluator = old
+
+    def test_agrees_with_interpreter(self):
+        for src in EXPRS:
+            with self.subTest(src=src):
+                self.assertEqual(self.run_with('interp', src), self.run_with('compile', src))
+
+    def test_tail_calls_run_in_constant_stack(self):
+        env = Env(outer=global_env)
+        self.run_with('compile', '[defn count-down [n] [if [= n 0] -done [count-down [dec n]]]]', env)
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(200)
+        try:
+            self.assertEqual('done', self.run_with('compile', '[count-down 5000]', env))
+        finally:
+            sys.setrecursionlimit(limit)
+
+    def test_called_from_python(self):
+        env = Env(outer=global_env)
+        self.run_with('compile', '[defn count-down [n] [if [= n 0] -done [count-down [dec n]]]]', env)
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(200)
+        try:
+            self.assertEqual('done', env['count-down'](5000))
+        finally:
+            sys.setrecursionlimit(limit)
+        self.assertEqual([3, 2, 1], sorted([1, 2, 3], key=self.run_with('compile', '[fn [x] [- x]]')))
+
+    def test_nested_destructuring(self):
+        self.assertEqual([1, 2, 3, 4], self.run_with('compile', '[[fn [[a [b c]] d] [list a b c d]] [1 [2 3]] 4]'))
+        self.assertEqual([[1, 2], [2]], self.run_with('compile', '[[fn [[a . b -as c]] [list c b]] [1 2]]'))
+
+    def test_lexical_addresses(self):
+        self.assertEqual([1, 2, 3], self.run_with('compile', '[[[[fn [a] [fn [b] [fn [c] [list a b c]]]] 1] 2] 3]'))
+        self.assertEqual(2, self.run_with('compile', '[[let [x 1] [let [x 2] [fn [] x]]]]'))
+        self.assertEqual([1, 2, 3], self.run_with('compile', '[[fn [x] [def y [inc x]] [if x [def z [inc y]] nil] [list x y z]] 1]'))
+        self.assertEqual(5, self.run_with('compile', '[let [m [hashmap -a 5]] m/a]'))
+
+    def test_redefinition_takes_effect(self):
+        env = Env(outer=global_env)
+        self.run_with('compile', "[defn h [] 1] [defn g [] [list [h] [inc 1]]]", env)
+        self.assertEqual([1, 2], self.run_with('compile', '[g]', env))
+        self.run_with('compile', '[defn h [] 2]', env)
+        self.assertEqual([2, 2], self.run_with('compile', '[g]', env))
+        self.run_with('interp', '[def inc dec]', env)  # shadows the global inc
+        self.assertEqual([2, 0], self.run_with('compile', '[g]', env))
+
+    def test_arity_dispatch(self):
+        for evaluator in ('interp', 'compile', 'stack'):
+            with self.subTest(evaluator=evaluator):
+                self.assertEqual('three', self.run_with(evaluator, "[[fn [[a . b] 'var'] [[a b c] 'three']] 1 2 3]"))
+                self.assertEqual([3], self.run_with(evaluator, "[[fn [[a] 'one'] [[a b . c] c]] 1 2 3]"))
+                with self.assertRaisesRegex(TypeError, 'no arity takes 0 arguments'):
+                    self.run_with(evaluator, "[[fn [[a] 'one'] [[a b . c] c]]]")
+
+    def test_let_and_or(self):
+        for evaluator in ('interp', 'compile', 'stack'):
+            with self.subTest(evaluator=evaluator):
+                self.assertEqual([1, 2], self.run_with(evaluator, '[let [x 1 f [fn [] x] x 2] [list [f] x]]'))
+                self.assertEqual(3, self.run_with(evaluator, '[[fn [n] [let [[a . b] n] [def c 1] [add a c [first b]]]] [1 1]]'))
+                self.assertEqual(1, self.run_with(evaluator, '[let [] 1]'))
+                self.assertEqual([True, 3, None, 0], self.run_with(evaluator, '[list [and] [and 1 3] [and 1 py/None 3] [or false 0]]'))
+                self.assertEqual(2, self.run_with(evaluator, '[or nil [and 1 2] [print -not-evaluated]]'))
+
+    def test_loop_recur(self):
+        limit = sys.getrecursionlimit()
+        for evaluator in ('interp', 'compile', 'stack'):
+            with self.subTest(evaluator=evaluator):
+                sys.setrecursionlimit(200)
+                try:
+                    self.assertEqual(5000, self.run_with(evaluator, '[loop [i 0] [if [< i 5000] [recur [inc i]] i]]'))
+                    self.assertEqual(10, self.run_with(evaluator, '[[fn [n . xs] [if [empty? xs] n [recur [add n [first xs]] [rest xs]]]] 1 2 3 4]'))
+                finally:
+                    sys.setrecursionlimit(limit)
+                self.assertEqual([0, 1, 2], self.run_with(evaluator, '[mapv [fn [f] [f]] [loop [i 0 fs []] [if [= i 3] fs [recur [inc i] [conj fs [fn [] i]]]]]]'))
+                self.assertEqual(6, self.run_with(evaluator, '[[fn [[n] [inc n]] [[n acc] [if [= n 0] acc [recur [dec n] [add acc n]]]]] 3 0]'))
+        for src, message in [('[fn [x] [inc [recur x]]]', 'tail position'),
+                             ('[loop [a 1] [recur 1 2]]', 'one value per binding'),
+                             ('[if true [recur] 1]', 'outside of loop or fn')]:
+            with self.assertRaisesRegex(SyntaxError, message):
+                parse(src)
+
+    def test_calls_between_evaluators(self):
+        env = Env(outer=global_env)
+        self.run_with('interp', '[defn twice [f x] [f [f x]]]', env)
+        self.run_with('compile', '[defn add2 [x] [add x 2]]', env)
+        self.assertEqual(5, self.run_with('compile', '[twice add2 1]', env))
+        self.assertEqual(5, self.run_with('interp', '[twice add2 1]', env))
+
+    def test_recur_between_evaluators(self):
+        for maker in ('interp', 'compile', 'stack'):
+            env = Env(outer=global_env)
+            self.run_with(maker, '[defn cnt [n acc] [if [= n 0] acc [recur [dec n] [inc acc]]]]', env)
+            for caller in ('interp', 'compile', 'stack'):
+                with self.subTest(maker=maker, caller=caller):
+                    self.assertEqual(5, self.run_with(caller, '[add 0 [cnt 5 0]]', env))
+                    self.assertEqual(5, self.run_with(caller, '[cnt 5 0]', env))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import http.server
+import threading
+import time
+import unittest
+import urllib.request
+
+import lib.lang
+from lib import concurrency
+from lib.lang import Env, Macro, Procedure, MacroContext, global_env, special_functions, eval, parse
+from lib.special_forms import KeyWord
+
+DELAY = 0.2
+
+
+class SlowHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        time.sleep(DELAY)
+        body = self.path.encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ConcurrencyTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        special_functions()
+
+    def run_with(self, evaluator, src, env=global_env):
+        old, lib.lang.evaluator = lib.lang.evaluator, evaluator
+        try:
+            return eval(parse(src), env)
+        finally:
+            lib.lang.evaluator = old
+
+    def test_concurrent_fetches(self):
+        n = 16
+        server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), SlowHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            env = Env(outer=global_env)
+            env['fetch'] = lambda path: urllib.request.urlopen(f'http://127.0.0.1:{server.server_port}{path}').read()
+            env['paths'] = [f'/{i}' for i in range(n)]
+            self.run_with('compile', f'[set-threads! {n}]', env)
+            start = time.perf_counter()
+            res = self.run_with('compile', '[mapv deref [mapv [fn [p] [future [fetch p]]] paths]]', env)
+            elapsed = time.perf_counter() - start
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual([p.encode() for p in env['paths']], res)
+        self.assertLess(elapsed, 3 * DELAY)  # one at a time would take n * DELAY
+
+    def test_primitives(self):
+        for evaluator in ('interp', 'compile', 'stack'):
+            with self.subTest(evaluator=evaluator):
+                env = Env(outer=global_env)
+                for src, expected in [
+                    ('[let [a [atom 0] fs [mapv [fn [i] [future [swap! a add i]]] [range 100]]] '
+                     ' [mapv deref fs] [deref a]]', 4950),
+                    ('[let [a [atom 1]] [list [compare-and-set! a 2 3] [compare-and-set! a 1 3] [reset! a 4] [deref a]]]',
+                     [False, True, 4, 4]),
+                    ('[let [p [promise]] [list [deref p 10 -late] [realized? p] [deref [deliver p 1]] [deliver p 2] [deref p]]]',
+                     [KeyWord('late'), False, 1, None, 1]),
+                    ('[let [f [future 5]] [list [deref f] [realized? f]]]', [5, True]),
+                    ('[let [ag [agent []]] [mapv [fn [i] [send ag conj i]] [range 50]] [list [await-for 1000 ag] [deref ag]]]',
+                     [True, list(range(50))])]:
+                    self.assertEqual(expected, self.run_with(evaluator, src, env), src)
+                with self.assertRaises(ZeroDivisionError):
+                    self.run_with(evaluator, '[deref [future [py/divmod 1 0]]]', env)
+
+    def test_failed_agent(self):
+        ag = concurrency.agent(1)
+        ag.send(lambda x: 1 / 0)
+        for _ in range(100):
+            if concurrency.agent_error(ag) is not None:
+                break
+            time.sleep(0.01)
+        self.assertIsInstance(concurrency.agent_error(ag), ZeroDivisionError)
+        with self.assertRaises(concurrency.AgentError):
+            ag.send(lambda x: x)
+
+    def test_macro_definition_is_thread_local(self):
+        entered, done, made = threading.Event(), threading.Event(), []
+
+        def define():
+            with MacroContext():
+                entered.set()
+                done.wait(5)
+
+        t = threading.Thread(target=define)
+        t.start()
+        entered.wait(5)
+        try:
+            made.append(self.run_with('interp', '[fn [x] x]'))
+        finally:
+            done.set()
+            t.join()
+        self.assertIsInstance(made[0], Procedure)
+        self.assertNotIsInstance(made[0], Macro)
+
+    def test_gensyms_are_unique_across_threads(self):
+        syms = []
+        threads = [threading.Thread(target=lambda: syms.extend(lib.lang.autogensym('g') for _ in range(1000)))
+                   for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(syms), len(set(syms)))
+
+
+if __name__ == '__main__':
+    unittest.main()
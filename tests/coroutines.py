@@ -0,0 +1,138 @@
+import asyncio
+import contextlib
+import io
+import pickle
+import time
+import unittest
+
+import lib.lang
+from lib.coroutines import AsyncProcedure
+from lib.lang import Env, global_env, special_functions, eval, parse
+from lib.special_forms import KeyWord
+
+DELAY = 0.1
+
+HANDLER = '''
+[defn-async handle [reader writer]
+  [let [n [int [await [. reader readline]]]]
+    [await [asyncio/sleep delay]]
+    [. writer write [. [py/str [inc n]] encode]]
+    [await [. writer drain]]
+    [. writer close]]]
+'''
+
+
+class CoroutineTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        special_functions()
+
+    def run_with(self, evaluator, src, env=global_env):
+        old, lib.lang.evaluator = lib.lang.evaluator, evaluator
+        try:
+            return eval(parse(src), env)
+        finally:
+            lib.lang.evaluator = old
+
+    def env(self, evaluator):
+        env = Env(outer=global_env)
+        self.run_with(evaluator, '[import asyncio]', env)
+        self.run_with(evaluator, '[defn-async slow [x] [await [asyncio/sleep 0]] [inc x]]', env)
+        return env
+
+    def test_async_fns(self):
+        for evaluator in ('interp', 'compile', 'stack'):
+            with self.subTest(evaluator=evaluator):
+                env = self.env(evaluator)
+                for src, expected in [
+                    ('[slow 1]', 2),
+                    ('[[async-fn [x] [let [a [await [slow x]] [b c] [list a [await [slow a]]]] [list a b c]]] 1]',
+                     [2, 2, 3]),
+                    ('[[async-fn [] [and [await [slow 1]] [or false [await [slow 5]]]]]]', 6),
+                    ('[[async-fn [] [mapv inc [list [await [slow 1]]]]]]', [3]),
+                    ('[[async-fn [n] [loop [i 0 acc 0] [if [> i n] acc [recur [inc i] [add acc [await [slow i]]]]]]] 10]',
+                     66),
+                    ('[[async-fn [n acc] [if [= n 0] acc [recur [dec n] [add acc [await [slow n]]]]]] 10 0]', 65)]:
+                    self.assertEqual(expected, asyncio.run(self.run_with(evaluator, src, env)), src)
+
+    def test_tail_calls_run_in_constant_stack(self):
+        for evaluator in ('interp', 'compile', 'stack'):
+            with self.subTest(evaluator=evaluator):
+                env = self.env(evaluator)
+                self.run_with(evaluator, '''[defn-async countdown [n]
+                                              [await [asyncio/sleep 0]]
+                                              [if [= n 0] -done [await [countdown [dec n]]]]]''', env)
+                self.assertEqual(KeyWord('done'), asyncio.run(self.run_with(evaluator, '[countdown 20000]', env)))
+
+    def test_await_outside_async_fn(self):
+        for src in ['[await 1]', '[fn [x] [await x]]', '[async-fn [x] [fn [] [await x]]]']:
+            with self.assertRaises(SyntaxError, msg=src):
+                parse(src)
+
+    def test_pickle(self):
+        f = self.run_with('compile', '[let [k 10] [async-fn [x] [await [asyncio/sleep 0]] [add k x]]]', self.env('compile'))
+        g = pickle.loads(pickle.dumps(f))
+        self.assertIsInstance(g, AsyncProcedure)
+        self.assertEqual(15, asyncio.run(g(5)))
+
+    def test_channels(self):
+        env = self.env('compile')
+        for src, expected in [
+            ('[<!! [go [add 1 2]]]', 3),
+            ('''[let [c [chan 2] out [chan]]
+                  [go [loop [i 0] [if [< i 10] [begin [>! c i] [recur [inc i]]] [close! c]]]]
+                  [go [loop [acc []] [let [x [<! c]] [if [nil? x] [>! out acc] [recur [conj acc x]]]]]]
+                  [<!! out]]''', list(range(10))),
+            ('[let [c [chan]] [first [alts!! [c [timeout 20]]]]]', None),
+            ('[let [a [chan] b [chan 1]] [>!! b 5] [= [list 5 b] [alts!! [a b]]]]', True),
+            ('[let [c [chan 1]] [close! c] [list [>!! c 1] [<!! c]]]', [False, None])]:
+            self.assertEqual(expected, self.run_with('compile', src, env), src)
+        with self.assertRaises(RuntimeError):
+            asyncio.run(self.run_with('compile', '[async-fn [] [<!! [chan]]]', env)())
+
+    def test_go_error_is_reported(self):
+        env, err = self.env('compile'), io.StringIO()
+        with contextlib.redirect_stderr(err):
+            self.assertIsNone(self.run_with('compile', '[<!! [go [py/divmod 1 0]]]', env))
+        self.assertIn('Exception in go block', err.getvalue())
+        self.assertIn('ZeroDivisionError', err.getvalue())
+
+    def test_close_from_another_thread(self):
+        env = self.env('compile')
+        self.run_with('compile', '[def closing [chan]] [def taken [go [list [<! closing]]]]', env)
+        time.sleep(DELAY)  # for the go block to wait on its take
+        self.run_with('compile', '[close! closing]', env)
+        time.sleep(DELAY)  # with nothing else for the loop to do: the close has to wake it
+        taken = env['taken']
+        self.assertTrue(taken.closed)
+        self.assertEqual([None], self.run_with('compile', '[<!! taken]', env))
+
+    def test_server(self):
+        n = 100
+        env = self.env('compile')
+        env['delay'] = DELAY
+        self.run_with('compile', HANDLER, env)
+
+        async def request(port, i):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(f'{i}\n'.encode())
+            await writer.drain()
+            res = await reader.read()
+            writer.close()
+            return int(res)
+
+        async def main():
+            server = await asyncio.start_server(env['handle'], '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                start = time.perf_counter()
+                res = await asyncio.gather(*[request(port, i) for i in range(n)])
+                return res, time.perf_counter() - start
+
+        res, elapsed = asyncio.run(main())
+        self.assertEqual(list(range(1, n + 1)), res)
+        self.assertLess(elapsed, 10 * DELAY)  # one at a time would take n * DELAY
+
+
+if __name__ == '__main__':
+    unittest.main()
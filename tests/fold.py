@@ -0,0 +1,67 @@
+import contextlib
+import io
+import os
+import unittest
+
+import lib.lang
+from lib import cache
+from lib.fold import fold
+from lib.lang import Env, expand, global_env, load, read, special_functions, eval, parse
+from tests.compiler import EXPRS
+
+
+def folded(src, env=global_env):
+    return fold(expand(read(src)), env)[1]  # read wraps the form in [begin ...]
+
+
+class FoldTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        special_functions()
+
+    def setUp(self):
+        self.folding, self.enabled = lib.lang.folding, cache.enabled
+        cache.enabled = False  # keep the .brc files of the unfolded sources as they are
+
+    def tearDown(self):
+        lib.lang.folding, cache.enabled = self.folding, self.enabled
+
+    def test_folds(self):
+        self.assertEqual(3, folded('[add 1 2]'))
+        self.assertEqual('12', folded('[py/str 12]'))
+        self.assertEqual('a', folded("[if [< 1 2] 'a' 'b']"))
+        self.assertEqual(4, folded('[cond [= 1 2] 3 -else 4]'))
+        self.assertEqual(True, folded('[even? 4]'))  # a Procedure that only calls pure functions
+
+    def test_propagates_constants(self):
+        self.assertIn("['add', 2, 6, 'z']", str(folded('[let [x 2 y [mul x 3]] [add x y z]]')))
+        self.assertIn("['add', 10, 'x']", str(folded('[fn [x] [def k 10] [add k x]]')))
+        self.assertIn("[['x'], 'x']", str(folded('[let [x 2] [fn [x] x]]')))  # shadowed
+
+    def test_leaves_alone(self):
+        self.assertIn("['add', 1, 2]", str(folded('[fn [add] [add 1 2]]')))  # a parameter, not the builtin
+        self.assertIsInstance(folded('[hashmap -a 1]'), list)  # mutable: each evaluation makes a new one
+        self.assertEqual(['div', 1, 0], folded('[div 1 0]'))  # raises at run time, as before
+        env = Env(outer=global_env)
+        eval(parse('[defn inc [x] [print x]]'), env)
+        self.assertEqual(['inc', 1], folded('[inc 1]', env))
+
+    def test_core_and_demos_agree(self):
+        "Load core.br and the demos with and without folding, and compare what they compute."
+        results = []
+        for folding in (False, True):
+            lib.lang.folding = folding
+            core = Env(outer=global_env)
+            with contextlib.redirect_stdout(io.StringIO()):
+                load('core.br', core)
+                demos = []
+                for demo in ('captcha', 'capcha2', 'checksum1', 'checksum2'):
+                    env = Env(outer=global_env)
+                    load(os.path.join('demo', f'{demo}.br'), env)
+                    demos.append(env['tests']())
+            results.append(([eval(parse(src), core) for src in EXPRS], demos))
+        self.assertEqual(results[0], results[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
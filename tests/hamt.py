@@ -0,0 +1,95 @@
+import pickle
+import random
+import unittest
+
+import lib.lang
+from lib.hamt import EMPTY, HashMap, Set, hashmap
+from lib.lang import Env, global_env, special_functions, eval, parse
+
+
+class Collides:
+    "A key whose hash is h, to put keys in the same CollisionNode."
+
+    def __init__(self, x, h):
+        self.x, self.h = x, h
+
+    def __hash__(self):
+        return self.h
+
+    def __eq__(self, other):
+        return isinstance(other, Collides) and self.x == other.x
+
+
+class HamtTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        special_functions()
+
+    def run_with(self, evaluator, src, env=global_env):
+        old, lib.lang.evaluator = lib.lang.evaluator, evaluator
+        try:
+            return eval(parse(src), env)
+        finally:
+            lib.lang.evaluator = old
+
+    def test_agrees_with_dict(self):
+        rand = random.Random(0)
+        keys = list(range(2000)) + [Collides(i, rand.choice([1, 2, -1, 1 << 40])) for i in range(50)]
+        d, m, t = {}, EMPTY, EMPTY.transient()
+        for _ in range(5000):
+            k = rand.choice(keys)
+            if rand.random() < 0.7:
+                v = rand.random()
+                d[k], m, t[k] = v, m.assoc(k, v), v
+            else:
+                d.pop(k, None)
+                m, t = m.dissoc(k), t.dissoc(k)
+        self.assertEqual(len(d), len(m))
+        self.assertEqual(d, m)
+        self.assertEqual(m, t.persistent())
+        self.assertTrue(all(m[k] == v for k, v in d.items()))
+        self.assertNotIn(-1, m)
+
+    def test_structural_sharing(self):
+        m = hashmap(*range(200))
+        n = m.assoc(0, 'x')
+        self.assertEqual((1, 'x'), (m[0], n[0]))
+        self.assertIs(m, m.assoc(0, 1))  # no change, no copy
+        self.assertIs(m.root.array[-1], n.root.array[-1])  # only the path to 0 is copied
+        t = m.transient()
+        t[2] = 'y'
+        t.persistent()
+        self.assertEqual(3, m[2])
+        with self.assertRaisesRegex(RuntimeError, 'after persistent'):
+            t[2] = 'z'
+
+    def test_equality_and_hash(self):
+        m = HashMap({'a': 1, 'b': 2})
+        self.assertEqual(m, {'b': 2, 'a': 1})
+        self.assertEqual(hash(m), hash(hashmap('b', 2, 'a', 1)))
+        self.assertNotEqual(m, m.assoc('a', 2))
+        self.assertEqual(m, pickle.loads(pickle.dumps(m)))
+        s = Set([1, 2, 3])
+        self.assertEqual({1, 2, 3}, s)
+        self.assertEqual(hash(frozenset({1, 2, 3})), hash(s))
+        self.assertEqual(({1, 2, 3, 4}, {2, 3}, {1, 2, 3, 9}), (s.conj(4), s.disj(1), s | {9}))
+        self.assertEqual(s, pickle.loads(pickle.dumps(s)))
+
+    def test_in_bracket(self):
+        for evaluator in ('interp', 'compile', 'stack'):
+            with self.subTest(evaluator=evaluator):
+                env = Env(outer=global_env)
+                self.run_with(evaluator, '[def m [hashmap -a 1 -b 2]]', env)
+                self.assertEqual([1, 1, None, 2], self.run_with(evaluator, '[list [m -a] [-a m] [m -c] m/b]', env))
+                self.assertEqual({'a': 1, 'b': 3}, self.run_with(evaluator, '[update m -b inc]', env))
+                self.assertEqual({'b': 2}, self.run_with(evaluator, '[dissoc m -a]', env))
+                self.assertEqual({'a': 1, 'b': 2, 'c': 3}, self.run_with(evaluator, '[into m [hashmap -c 3]]', env))
+                self.assertEqual({'a': 1, 'b': 2, 'c': 3}, self.run_with(evaluator, '[conj m [list -c 3]]', env))
+                self.assertEqual({'a': 5, 'b': 2}, self.run_with(evaluator, '[persistent! [assoc! [transient m] -a 5]]', env))
+                self.assertEqual([2, None, {1, 2, 3}], self.run_with(evaluator, '[let [s [set [1 2]]] [list [s 2] [s 3] [conj s 3]]]'))
+                with self.assertRaisesRegex(TypeError, 'transient'):
+                    self.run_with(evaluator, '[assoc! m -a 2]', env)
+
+
+if __name__ == '__main__':
+    unittest.main()
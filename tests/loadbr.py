@@ -0,0 +1,111 @@
+import contextlib
+import importlib.util
+import io
+import os
+import sys
+import tempfile
+import types
+import unittest
+
+from lib import loadbr
+from lib.lang import Env, global_env, load
+
+SOURCE = '''
+[defn fib [n] [if [< n 2] n [add [fib [- n 2]] [fib [- n 1]]]]]
+[defn fibco [[n] [fibco 0 1 n]]
+            [[a b n] [if [= 0 n] b [fibco b [add a b] [dec n]]]]]
+[defn xsum [[xs] [xsum 0 xs]]
+           [[acc xs] [if [empty? xs] acc [xsum [add acc [first xs]] [rest xs]]]]]
+[defn adder [n] [fn [x] [add x n]]]
+[defn lets [] [let [a [add 1 2] b [add a 1] c [add a b]] [add a b c]]]
+[defn destr [[a [b c] -as v] d . more] [list a b c v d more]]
+[defn pair [a b] [[inc a] b]]
+[defn thread [x] [-> x inc [mul 2]]]
+[defn conds [x] [cond [= x 1] 'one' [= x 2] 'two' -else 'many']]
+[defn ors [x] [or [nil? x] [= x 3]]]
+[defn ands [x] [list [and x [inc x]] [or [and x nil] 0 x]]]
+[defn rebinds [x] [let [f [fn [] x] x [inc x]] [list [f] x]]]
+[defn loops [n] [loop [i 0 [a b] [0 1]] [if [= i n] a [recur [inc i] [list b [add a b]]]]]]
+[defn loop-fns [n] [loop [i 0 fs []] [if [= i n] [mapv [fn [f] [f]] fs] [recur [inc i] [conj fs [fn [] i]]]]]]
+[defn recurs [[n] [recurs n []]] [[n acc . more] [if [= n 0] acc [recur [dec n] [conj acc n] more]]]]
+[defn splits [s] [. s split ',']]
+[defn counter []
+  [defn step [[n] [step n []]]
+             [[n acc] [if [= n 0] acc [step [dec n] [conj acc [fn [] n]]]]]]
+  [mapv [fn [f] [f]] [step 3]]]
+[defmacro doubled [x] `[add ,x ,x]]
+[def answer [doubled [fib 10]]]
+'''
+
+CALLS = [('fib', (15,)), ('fibco', (100,)), ('xsum', ([1, 2, 3],)), ('lets', ()),
+         ('destr', ([1, [2, 3]], 4, 5, 6)), ('pair', (1, 2)), ('thread', (1,)),
+         ('conds', (1,)), ('conds', (3,)), ('ors', (None,)), ('ors', (2,)),
+         ('ands', (1,)), ('ands', (None,)), ('rebinds', (1,)),
+         ('loops', (2000,)), ('loop-fns', (3,)), ('recurs', (3,)),
+         ('splits', ('a,b',)), ('counter', ())]
+
+
+def import_file(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class LoadbrTest(unittest.TestCase):
+    "Runs the same .br sources in the interpreter and as compiled modules and compares the results."
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def both(self, namespace):
+        "Return the namespace loaded into an Env, and compiled and imported."
+        env = Env(outer=global_env)
+        with contextlib.redirect_stdout(io.StringIO()):
+            load(f'{namespace}.br', env)
+            out = loadbr.br2py(namespace, os.path.join(self.dir.name, f'{os.path.basename(namespace)}_br.py'))
+            module = import_file(os.path.basename(namespace), out)
+        return env, module
+
+    def compiled(self, module, name):
+        return getattr(module, module.__bracket_names__[name])
+
+    def test_compiled_module_matches_interpreter(self):
+        namespace = os.path.join(self.dir.name, 'mod')
+        with open(f'{namespace}.br', 'w') as f:
+            f.write(SOURCE)
+        env, module = self.both(namespace)
+        for name, args in CALLS:
+            with self.subTest(name=name, args=args):
+                self.assertEqual(env[name](*args), self.compiled(module, name)(*args))
+        self.assertEqual(env['answer'], module.answer)
+        self.assertEqual(5, self.compiled(module, 'adder')(2)(3))
+
+    def test_plain_functions_and_loops(self):
+        namespace = os.path.join(self.dir.name, 'mod')
+        with open(f'{namespace}.br', 'w') as f:
+            f.write(SOURCE)
+        _, module = self.both(namespace)
+        self.assertIsInstance(module.fib, types.FunctionType)
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(200)
+        try:
+            self.assertEqual(12497500, module.xsum(list(range(5000))))
+        finally:
+            sys.setrecursionlimit(limit)
+        with self.assertRaises(TypeError):
+            module.fibco(1, 2)
+
+    def test_demos(self):
+        for demo in ('captcha', 'capcha2', 'checksum1', 'checksum2'):
+            with self.subTest(demo=demo):
+                env, module = self.both(os.path.join('demo', demo))
+                with contextlib.redirect_stdout(io.StringIO()):
+                    self.assertEqual(env['tests'](), module.tests())
+
+
+if __name__ == '__main__':
+    unittest.main()
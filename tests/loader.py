@@ -0,0 +1,79 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import lib.lang
+from lib.lang import global_env, require_, special_functions, Env, load, LoadError
+from lib.symbols import Symbol
+
+
+class LoaderTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        special_functions()
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.fname = os.path.join(self.dir.name, 'mod.br')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def load(self, text, each=False):
+        with open(self.fname, 'w') as f:
+            f.write(text)
+        env = Env(outer=global_env)
+        load(self.fname, env, each=each)
+        return env
+
+    def test_forms_run_before_later_forms_are_read(self):
+        # the macro calls helper at expansion time, so helper must already be defined
+        env = self.load('[defn helper [x] [list [quote add] x 1]]\n'
+                        '[defmacro inc-by-one [x] [helper x]]\n'
+                        '[def y [inc-by-one 41]]\n')
+        self.assertEqual(42, env['y'])
+
+    def test_error_reports_form_line(self):
+        with open(self.fname, 'w') as f:
+            f.write('[def a 1]\n\n[def b [no-such-fn]]\n[def c 3]\n')
+        env = Env(outer=global_env)
+        with self.assertRaises(LoadError) as cm:
+            load(self.fname, env)
+        self.assertEqual(3, cm.exception.line)
+        self.assertIn('no-such-fn', str(cm.exception))
+        self.assertEqual(1, env['a'])
+        self.assertNotIn('c', env)
+
+    def test_star_reports_and_continues(self):
+        text = '[def a 1]\n[def b [no-such-fn]]\n[def c 3]\n[def d'
+        for _ in range(2):  # from the source both times: a form that fails to read keeps it out of the cache
+            err = io.StringIO()
+            with contextlib.redirect_stderr(err):
+                env = self.load(text, each=True)
+            self.assertEqual((1, 3), (env['a'], env['c']))
+            self.assertIn('mod.br:2:', err.getvalue())
+            self.assertIn('mod.br:4: SyntaxError', err.getvalue())
+        self.assertFalse(os.path.exists(self.fname + 'c'))
+
+    def test_star_reports_and_continues_from_cache(self):
+        text = '[def a 1]\n[def b [no-such-fn]]\n[def c 3]'
+        for expand in (lib.lang.expand, AssertionError('expand')):  # from the source, then from the .brc cache
+            err = io.StringIO()
+            with contextlib.redirect_stderr(err), mock.patch.object(lib.lang, 'expand', side_effect=expand):
+                env = self.load(text, each=True)
+            self.assertEqual((1, 3), (env['a'], env['c']))
+            self.assertIn('mod.br:2: LookupError', err.getvalue())
+            self.assertTrue(os.path.exists(self.fname + 'c'))
+
+    def test_require_items(self):
+        with open(self.fname, 'w') as f:
+            f.write('[def a 1]\n[def b 2]')
+        require_(global_env, [Symbol(self.fname[:-3]), ['b']])
+        self.assertEqual(2, global_env['b'])
+
+
+if __name__ == '__main__':
+    unittest.main()
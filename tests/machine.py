@@ -0,0 +1,39 @@
+import unittest
+
+import lib.lang
+from lib.lang import global_env, special_functions, eval, parse, Env
+from tests.compiler import EXPRS
+
+
+class MachineTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        special_functions()
+
+    def run_with(self, evaluator, src, env=global_env):
+        old, lib.lang.evaluator = lib.lang.evaluator, evaluator
+        try:
+            return eval(parse(src), env)
+        finally:
+            lib.lang.evaluator = old
+
+    def test_agrees_with_compiler(self):
+        for src in EXPRS:
+            with self.subTest(src=src):
+                self.assertEqual(self.run_with('compile', src), self.run_with('stack', src))
+
+    def test_deep_recursion(self):
+        env = Env(outer=global_env)
+        self.run_with('stack', '[defn nsum [n] [if [= n 0] 0 [add n [nsum [dec n]]]]]', env)
+        self.assertEqual(5000050000, self.run_with('stack', '[nsum 100000]', env))
+
+    def test_called_from_python(self):
+        env = Env(outer=global_env)
+        self.run_with('stack', '[defn twice [f x] [f [f x]]]', env)
+        self.run_with('compile', '[defn add2 [x] [add x 2]]', env)
+        self.assertEqual([5, 6], self.run_with('stack', '[mapv [fn [x] [twice add2 x]] [1 2]]', env))
+        self.assertEqual(5, self.run_with('compile', '[twice add2 1]', env))
+
+
+if __name__ == '__main__':
+    unittest.main()
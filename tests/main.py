@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def bracket(*args):
+    return subprocess.run([sys.executable, '-O', os.path.join(ROOT, 'bracket.py'), *args],
+                          capture_output=True, text=True, cwd=ROOT, timeout=60)
+
+
+class MainTest(unittest.TestCase):
+    def test_eval(self):
+        res = bracket('-e', '[def x 2] [add x 1]')
+        self.assertEqual(('3\n', 0), (res.stdout, res.returncode))
+        self.assertEqual('', bracket('-e', '[def x 2]').stdout)  # nil is not printed
+        self.assertNotEqual(0, bracket('-e').returncode)
+
+    def test_script(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'script.br')
+            with open(path, 'w') as f:
+                f.write('[def n [count *command-line-args*]]\n[print n [first *command-line-args*]]\n')
+            res = bracket(path, 'a', 'b')
+            self.assertEqual(('2 a\n', 0), (res.stdout, res.returncode))
+            with open(path, 'w') as f:
+                f.write('[undefined-thing]\n')
+            res = bracket(path)
+            self.assertNotEqual(0, res.returncode)
+            self.assertIn('LoadError', res.stderr)
+
+    def test_no_repl_imports(self):
+        code = 'import sys, bracket; bracket.main(["-e", "1"]); print(sorted(m for m in sys.modules ' \
+               'if m.split(".")[0] in ("prompt_toolkit", "pygments")))'
+        res = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, cwd=ROOT, timeout=60)
+        self.assertEqual('1\n[]\n', res.stdout)
+
+
+if __name__ == '__main__':
+    unittest.main()
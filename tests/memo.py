@@ -0,0 +1,133 @@
+import pickle
+import threading
+import time
+import unittest
+
+import lib.lang
+from lib import memo
+from lib.lang import Env, global_env, special_functions, eval, parse
+from lib.hamt import hashmap
+from lib.seq import range_
+from lib.special_forms import Set
+from lib.vector import vec
+
+
+class MemoTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        special_functions()
+
+    def run_with(self, evaluator, src, env=global_env):
+        old, lib.lang.evaluator = lib.lang.evaluator, evaluator
+        try:
+            return eval(parse(src), env)
+        finally:
+            lib.lang.evaluator = old
+
+    def test_memoize(self):
+        for evaluator in ('interp', 'compile', 'stack'):
+            with self.subTest(evaluator=evaluator):
+                env = Env(outer=global_env)
+                self.run_with(evaluator, '''
+                    [def calls [atom 0]]
+                    [def fib [memoize [fn [n] [swap! calls inc]
+                                              [if [< n 2] n [add [fib [- n 2]] [fib [- n 1]]]]]]]''', env)
+                self.assertEqual(354224848179261915075, self.run_with(evaluator, '[fib 100]', env))
+                self.assertEqual(101, self.run_with(evaluator, '[deref calls]', env))
+                stats = self.run_with(evaluator, '[memo-stats fib]', env)
+                self.assertEqual((98, 101, 101), (stats['hits'], stats['misses'], stats['size']))
+                self.assertTrue(self.run_with(evaluator, '[memo-clear! fib [100]]', env))
+                self.run_with(evaluator, '[fib 100]', env)
+                self.assertEqual(102, self.run_with(evaluator, '[deref calls]', env))
+                self.run_with(evaluator, '[memo-clear! fib]', env)
+                self.assertEqual(0, self.run_with(evaluator, '[memo-stats fib]', env)['size'])
+
+    def test_structural_keys(self):
+        calls = []
+        f = memo.memo(lambda *args: calls.append(args) or len(calls))
+        self.assertEqual(1, f([1, [2, 3]], {'a': [4]}))
+        self.assertEqual(1, f(vec([1, vec([2, 3])]), {'a': (4,)}))
+        self.assertEqual(1, f((1, (2, 3)), {'a': [4]}))
+        self.assertEqual(2, f([1, [2, 4]], {'a': [4]}))
+        self.assertEqual(3, f({1, 2}, None))
+        self.assertEqual(3, f(frozenset([2, 1]), None))
+        xs = range_()  # infinite: keyed on its identity
+        self.assertEqual(4, f(xs))
+        self.assertEqual(4, f(xs))
+        self.assertEqual(5, f(range_()))
+        self.assertEqual(6, f(bytearray()))  # unhashable: not cached
+        self.assertEqual(7, f(bytearray()))
+        self.assertEqual(2, f.cache.stats()['uncached'])
+
+    def test_maps_and_sets(self):
+        f = memo.memo(repr)
+        self.assertEqual('{1: 2}', f(hashmap(1, 2)))
+        self.assertEqual(repr(Set([(1, 2)])), f(Set([(1, 2)])))
+        self.assertEqual(repr(frozenset([1])), f(frozenset([1])))
+        self.assertEqual(repr(((1, 2),)), f(((1, 2),)))
+        self.assertEqual(4, f.cache.stats()['misses'])
+        self.assertEqual('{1: 2}', f({1: 2}))  # a dict is the same map
+        self.assertEqual(1, f.cache.stats()['hits'])
+
+    def test_lru(self):
+        f = memo.memo(lambda x: x, max_size=2)
+        f(1), f(2), f(1), f(3)
+        self.assertEqual([1, 3], [k[0] for k in f.cache.entries])
+        self.assertEqual(1, f.cache.stats()['evictions'])
+
+    def test_lfu(self):
+        f = memo.memo(lambda x: x, policy='lfu', max_size=2)
+        f(1), f(1), f(2), f(3)  # 2 is used least
+        self.assertEqual({1, 3}, {k[0] for k in f.cache.entries})
+        f(3), f(3), f(4)  # now 1 is
+        self.assertEqual({3, 4}, {k[0] for k in f.cache.entries})
+        self.assertEqual(2, f.cache.stats()['evictions'])
+
+    def test_ttl(self):
+        f = memo.memo(lambda x: [x], policy='ttl', ttl=0.05)
+        first = f(1)
+        self.assertIs(first, f(1))
+        time.sleep(0.1)
+        self.assertIsNot(first, f(1))
+        self.assertEqual(1, f.cache.stats()['expirations'])
+        with self.assertRaises(ValueError):
+            memo.memo(lambda x: x, policy='ttl')
+
+    def test_max_bytes(self):
+        f = memo.memo(lambda n: list(range(n)), max_bytes=10000)
+        for n in range(100):
+            f(n)
+        stats = f.cache.stats()
+        self.assertLessEqual(stats['bytes'], 10000)
+        self.assertGreater(stats['evictions'], 0)
+        self.assertEqual(stats['bytes'], sum(e.size for e in f.cache.entries.values()))
+        f(10 ** 5)  # bigger than the whole cache: not kept
+        self.assertNotIn((10 ** 5,), f.cache.entries)
+
+    def test_threadsafe(self):
+        f = memo.memo(lambda x: x, policy='lfu', max_size=50, threadsafe=True)
+
+        def work(i):
+            for n in range(2000):
+                f((n * i) % 100)
+
+        threads = [threading.Thread(target=work, args=(i,)) for i in range(1, 9)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        stats = f.cache.stats()
+        self.assertEqual(8 * 2000, stats['hits'] + stats['misses'])
+        self.assertEqual(50, stats['size'])
+        self.assertEqual(stats['size'], sum(len(b) for b in f.cache.buckets.values()))
+
+    def test_pickle(self):
+        f = memo.memo(abs, policy='lfu', max_size=3)
+        f(-1)
+        g = pickle.loads(pickle.dumps(f))
+        self.assertEqual(('lfu', 3, 0), (g.cache.policy, g.cache.max_size, len(g.cache.entries)))
+        self.assertEqual(1, g(-1))
+
+
+if __name__ == '__main__':
+    unittest.main()
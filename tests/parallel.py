@@ -0,0 +1,108 @@
+import multiprocessing
+import os
+import pickle
+import subprocess
+import sys
+import unittest
+
+import lib.lang
+from lib import parallel
+from lib.lang import Env, global_env, special_functions, eval, parse
+
+
+class ParallelTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        special_functions()
+        cls.workers, parallel.workers = parallel.workers, 2
+
+    @classmethod
+    def tearDownClass(cls):
+        parallel.workers = cls.workers
+        if parallel.pool is not None:
+            parallel.pool.close()
+            parallel.pool = None
+
+    def run_with(self, evaluator, src, env=global_env):
+        old, lib.lang.evaluator = lib.lang.evaluator, evaluator
+        try:
+            return eval(parse(src), env)
+        finally:
+            lib.lang.evaluator = old
+
+    def test_closures_pickle(self):
+        for evaluator in ('interp', 'compile', 'stack'):
+            with self.subTest(evaluator=evaluator):
+                env = Env(outer=global_env)
+                f = self.run_with(evaluator, '''[let [n 10 m [into [] [range 100000]]]
+                                                  [fn [x] [let [g [fn [y] [add n x y]]] [g [inc x]]]]]''', env)
+                self.assertEqual(23, pickle.loads(pickle.dumps(f))(6))
+                self.assertLess(len(pickle.dumps(f)), 100000)  # m isn't captured
+
+    def test_pmap_pcalls_fold(self):
+        env = Env(outer=global_env)
+        for src, expected in [('[pmap inc [range 100]]', list(range(1, 101))),
+                              ('[pmap add [1 2 3] [10 20 30]]', [11, 22, 33]),
+                              ('[take 3 [pmap inc [range]]]', [1, 2, 3]),
+                              ('[let [n 5] [pmap [fn [x] [mul n x]] [1 2]]]', [5, 10]),
+                              ('[pcalls [fn [] 1] [fn [] [add 1 1]]]', [1, 2]),
+                              ('[fold 100 add add [range 1000]]', 499500),
+                              ('[fold add [fn [acc x] [if [< x 10] [add acc x] [reduced acc]]] [range 1000]]', 45)]:
+            self.assertEqual(expected, self.run_with('compile', src, env), src)
+
+    def test_pool_kept_across_local_defs(self):
+        if multiprocessing.get_start_method() != 'fork':
+            self.skipTest('only a forked pool is made again')
+        env = Env(outer=global_env)
+        self.run_with('interp', '[defn psq [xs] [def n 2] [pmap [fn [x] [mul n x]] xs]]', env)
+        self.assertEqual([0, 2], list(self.run_with('interp', '[psq [0 1]]', env)))
+        pool = parallel.pool
+        self.assertEqual([2, 4], list(self.run_with('interp', '[psq [1 2]]', env)))
+        self.assertIs(pool, parallel.pool)
+        eval(parse('[def pool-test-global 1]'), global_env)
+        self.assertEqual([1], list(self.run_with('interp', '[pmap [fn [x] pool-test-global] [0]]', env)))
+        self.assertIsNot(pool, parallel.pool)
+
+    def test_errors_propagate(self):
+        with self.assertRaises(ZeroDivisionError):
+            list(self.run_with('compile', '[pmap [fn [x] [py/divmod 1 x]] [1 0]]'))
+
+    def test_unpickled_afresh(self):
+        eval(parse('[require [demo/checksum2 *]]'), global_env)
+        f = eval(parse('[fn [rows] [checksum-by mapv rows]]'), Env(outer=global_env))
+        code = 'import pickle, sys; print(pickle.loads(sys.stdin.buffer.read())(["5 9 2 8", "9 4 7 3", "3 8 6 5"]))'
+        out = subprocess.run([sys.executable, '-c', code], input=pickle.dumps(f), capture_output=True,
+                             cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), )
+        self.assertEqual(b"", out.stderr)
+        self.assertEqual(b'9', out.stdout.strip())
+
+    def test_spawned_workers_get_defs(self):
+        method = multiprocessing.get_start_method()
+        self.tearDownClass()
+        multiprocessing.set_start_method('spawn', force=True)
+        try:
+            eval(parse('''[defn spawn-sq [x] [mul x x]]
+                          [def spawn-offset 100]
+                          [defn spawn-f [x] [add spawn-offset [spawn-sq x]]]
+                          [defn spawn-fact [n] [if [< n 2] 1 [mul n [spawn-fact [dec n]]]]]'''), global_env)
+            self.assertEqual([0, 1, 4, 9, 16], list(eval(parse('[pmap [fn [x] [spawn-sq x]] [range 5]]'), global_env)))
+            self.assertEqual([100, 101, 104], list(eval(parse('[pmap spawn-f [range 3]]'), global_env)))
+            self.assertEqual([1, 2, 6, 24], list(eval(parse('[pmap spawn-fact [range 1 5]]'), global_env)))
+            self.assertEqual(30, eval(parse('[fold 2 add [fn [acc x] [add acc [spawn-sq x]]] [range 5]]'), global_env))
+            eval(parse('[defn spawn-sq [x] [mul x x x]]'), global_env)  # the same workers get the new one
+            self.assertEqual([100, 101, 108], list(eval(parse('[pmap spawn-f [range 3]]'), global_env)))
+        finally:
+            self.tearDownClass()
+            parallel.workers = 2
+            multiprocessing.set_start_method(method, force=True)
+
+    def test_unpickling_keeps_local_defs(self):
+        eval(parse('[defn local-sq [x] [mul x x]]'), global_env)
+        original = global_env['local-sq']
+        g = pickle.loads(pickle.dumps(eval(parse('[fn [x] [local-sq x]]'), global_env)))
+        self.assertIs(original, global_env['local-sq'])
+        self.assertEqual(9, g(3))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import itertools
+import unittest
+
+import naga
+
+import lib.lang
+from lib.lang import Env, global_env, special_functions, eval, parse
+from lib.seq import CHUNK, ChunkedSeq, map_, range_, reductions, repeat, seq, take, take_while
+from lib.vector import vec
+
+
+class SeqTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        special_functions()
+
+    def run_with(self, evaluator, src, env=global_env):
+        old, lib.lang.evaluator = lib.lang.evaluator, evaluator
+        try:
+            return eval(parse(src), env)
+        finally:
+            lib.lang.evaluator = old
+
+    def test_chunks_are_realized_once_and_lazily(self):
+        calls = []
+
+        def f(x):
+            calls.append(x)
+            return x * 2
+
+        s = map_(f, itertools.count())
+        self.assertEqual([], calls)
+        self.assertEqual(0, naga.first(s))
+        self.assertEqual(list(range(CHUNK)), calls)
+        t = s
+        for _ in range(CHUNK + 1):
+            t = t.rest()
+        self.assertEqual(2 * (CHUNK + 1), t.first())
+        self.assertEqual([0, 2, 4], list(take(3, s)))
+        self.assertEqual(list(range(2 * CHUNK)), calls)
+
+    def test_sources(self):
+        for xs in [[], list(range(100)), tuple(range(33)), 'abc', vec(range(1057)), iter(range(70)), range(5, 90, 3)]:
+            with self.subTest(xs=type(xs)):
+                expected = list(xs)
+                s = seq(iter(expected) if hasattr(xs, '__next__') else xs)
+                self.assertEqual(expected, s)
+                self.assertEqual(len(expected), len(s))
+                self.assertEqual(expected[1:], s.rest())
+                self.assertEqual(expected[10:20], s[10:20])
+                self.assertEqual(expected[-1] if expected else None, s.last())
+                self.assertEqual(not expected, s.empty())
+
+    def test_functions(self):
+        self.assertEqual(list(range(40)), take(40, range_()))
+        self.assertEqual([0, 1, 3, 6, 10], take(5, reductions(lambda a, b: a + b, range_())))
+        self.assertEqual([10, 11, 13], reductions(lambda a, b: a + b, [1, 2], 10))
+        self.assertEqual(list(range(70)), take_while(lambda x: x < 70, range_()))
+        self.assertEqual(['a'] * 3, repeat(3, 'a'))
+        self.assertEqual(list(range(10, 0, -2)), range_(10, 0, -2))
+        self.assertTrue(repr(range_()).endswith(', 99, ...]'))
+        self.assertEqual(hash((1, 2)), hash(seq([1, 2])))
+
+    def test_core(self):
+        for evaluator in ('interp', 'compile', 'stack'):
+            with self.subTest(evaluator=evaluator):
+                env = Env(outer=global_env)
+                for src, expected in [('[take 5 [map inc [range]]]', [1, 2, 3, 4, 5]),
+                                      ('[take 3 [filter even? [range]]]', [0, 2, 4]),
+                                      ('[take-while [fn [x] [< x 3]] [range]]', [0, 1, 2]),
+                                      ('[take 3 [repeat 7]]', [7, 7, 7]),
+                                      ('[empty? [filter even? [1 3 5]]]', True),
+                                      ('[let [[a b . c] [range 5]] [list a b c]]', [0, 1, [2, 3, 4]])]:
+                    self.assertEqual(expected, self.run_with(evaluator, src, env), src)
+                self.assertIsInstance(self.run_with(evaluator, '[map inc [1 2]]', env), ChunkedSeq)
+
+
+if __name__ == '__main__':
+    unittest.main()
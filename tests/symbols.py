@@ -0,0 +1,31 @@
+import pickle
+import unittest
+
+from lib.lang import global_env, special_functions, eval, parse
+from lib.symbols import Symbol, if_
+
+
+class SymbolsTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        special_functions()
+
+    def test_interned(self):
+        self.assertIs(Symbol('if'), if_)
+        self.assertIs(if_, pickle.loads(pickle.dumps(if_)))
+
+    def test_gensyms_are_not_interned(self):
+        n = len(Symbol.table)
+        syms = [eval(parse('[gensym]'), global_env) for _ in range(2000)]
+        self.assertEqual(n, len(Symbol.table))
+        self.assertEqual(len(syms), len(set(syms)))
+        g = syms[0]
+        a, b = pickle.loads(pickle.dumps([g, g]))
+        self.assertEqual(g, a)
+        self.assertIs(a, b)
+        self.assertNotIn(a, Symbol.table)
+        self.assertEqual(6, eval(parse('[if-let [x 5] [inc x] 0]'), global_env))
+
+
+if __name__ == '__main__':
+    unittest.main()
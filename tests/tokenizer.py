@@ -1,7 +1,7 @@
 import io
 import unittest
 
-from bracket import InPort
+from lib.lang import InPort, read, eof_object
 
 
 class TokenTest(unittest.TestCase):
@@ -49,6 +49,42 @@ class TokenTest(unittest.TestCase):
         p = self.port('/[1 2 3]')
         print(list(p))
 
+    def test_comments_and_lines(self):
+        p = self.port("[a ; [not] 'tokens'\n b] ;; trailing\n;; whole line\n,-c")
+        self.assertEqual(['[', 'a', 'b', ']', ',-', 'c'], list(p))
+
+    def test_tokens_across_blocks(self):
+        text = "[def s 'a string'] [sym/name `[x ,y ,-zs]] {1 2}\n" * 50
+        expected = list(self.port(text))
+        for blocksize in (1, 5, 64):
+            p = self.port(text)
+            p.blocksize = blocksize
+            self.assertEqual(expected, list(p))
+
+    def test_long_line(self):
+        n = 100000
+        p = self.port('[' + ' x' * n + ']')
+        self.assertEqual(n + 2, len(list(p)))
+
+    def test_lineno(self):
+        p = self.port('[a\n\n b]\n[c]')
+        self.assertEqual(['[', 'a'], [next(p), next(p)])
+        self.assertEqual(1, p.lineno)
+        self.assertEqual('b', next(p))
+        self.assertEqual(3, p.lineno)
+        self.assertEqual([']', '[', 'c'], [next(p), next(p), next(p)])
+        self.assertEqual(4, p.lineno)
+
+    def test_unterminated_string(self):
+        with self.assertRaises(SyntaxError):
+            list(self.port("[a 'unterminated]"))
+
+    def test_read_forms(self):
+        p = self.port('[def a 5]\n[add a\n 1]')
+        self.assertEqual(['def', 'a', 5], read(p))
+        self.assertEqual(['add', 'a', 1], read(p))
+        self.assertIs(eof_object, read(p))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+
+import lib.lang
+from lib.core import completing, into, mapping, filtering, partitioning, reduced, sequence, taking, deduping, \
+    transduce
+from lib.lang import Env, global_env, special_functions, eval, parse
+from lib.seq import range_
+from lib.vector import Vector, vec
+
+
+def add(acc=0, x=0):
+    return acc + x
+
+
+class TransducerTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        special_functions()
+
+    def run_with(self, evaluator, src, env=global_env):
+        old, lib.lang.evaluator = lib.lang.evaluator, evaluator
+        try:
+            return eval(parse(src), env)
+        finally:
+            lib.lang.evaluator = old
+
+    def test_transforms(self):
+        inc = mapping(lambda x: x + 1)
+        self.assertEqual(9, transduce(inc, add, [1, 2, 3]))
+        self.assertEqual([0, 2, 4], into([], filtering(lambda x: x % 2 == 0), range(5)))
+        self.assertEqual([0, 1, 2], into([], taking(3), range_()))
+        self.assertEqual([], into([], taking(0), range_()))
+        self.assertEqual([(0, 1), (2, 3), (4, None)], into([], partitioning(2), range(5)))
+        self.assertEqual([1, 2, 1], into([], deduping(), [1, 1, 2, 2, 1]))
+        self.assertEqual(6, transduce(inc, completing(lambda a, x: reduced(a) if a > 5 else a + x), 0, range_()))
+        self.assertIsInstance(into(vec(), inc, [1]), Vector)
+
+    def test_early_termination_stops_reading(self):
+        seen = []
+
+        def note(x):
+            seen.append(x)
+            return x
+
+        self.assertEqual([(0, 1)], into([], lambda rf: mapping(note)(partitioning(2)(taking(1)(rf))), range_()))
+        self.assertEqual([0, 1], seen)
+
+    def test_sequence(self):
+        s = sequence(lambda rf: partitioning(3)(taking(40)(rf)), range_())
+        self.assertEqual((0, 1, 2), s.first())
+        self.assertEqual(40, len(s))
+        self.assertEqual([(0, 1, 2), (3, None, None)], sequence(partitioning(3), range(4)))
+
+    def test_core(self):
+        for evaluator in ('interp', 'compile', 'stack'):
+            with self.subTest(evaluator=evaluator):
+                env = Env(outer=global_env)
+                for src, expected in [('[transduce [comp [map inc] [filter even?] [take 3]] add [range]]', 12),
+                                      ('[into [] [comp [map inc] [partition 2]] [range 4]]', [(1, 2), (3, 4)]),
+                                      ('[sequence [comp [dedupe] [take 2]] [1 1 2 2 3]]', [1, 2]),
+                                      ('[transduce [map inc] [fn [[] 0] [[a] a] [[a x] [reduced a]]] [range]]', 0),
+                                      ('[list* [dedupe [1 1 2]]]', [1, 2]),
+                                      ('[list* [map inc [1 2]]]', [2, 3])]:
+                    self.assertEqual(expected, self.run_with(evaluator, src, env), src)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import pickle
+import unittest
+
+import naga
+
+import lib.lang
+from lib.lang import Env, global_env, special_functions, eval, parse
+from lib.vector import EMPTY, SubVector, Vector, vec
+
+SIZES = [0, 1, 31, 32, 33, 1024, 1056, 1057, 32 * 32 * 32 + 33]
+
+
+class VectorTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        special_functions()
+
+    def run_with(self, evaluator, src, env=global_env):
+        old, lib.lang.evaluator = lib.lang.evaluator, evaluator
+        try:
+            return eval(parse(src), env)
+        finally:
+            lib.lang.evaluator = old
+
+    def test_conj_assoc_pop(self):
+        for n in SIZES:
+            with self.subTest(n=n):
+                xs, v = list(range(n)), EMPTY
+                for x in xs:
+                    v = v.conj(x)
+                self.assertEqual(xs, v)
+                self.assertEqual(v, vec(xs))
+                self.assertEqual(xs, [v.nth(i) for i in range(n)])
+                if n:
+                    w = v.assoc(n // 2, 'x')
+                    self.assertEqual('x', w[n // 2])
+                    self.assertEqual(n // 2, v[n // 2])  # v itself is unchanged
+                for _ in range(min(n, 1100)):
+                    v = v.pop()
+                    xs.pop()
+                self.assertEqual(xs, v)
+
+    def test_transients(self):
+        for n in SIZES:
+            with self.subTest(n=n):
+                v = vec(range(n))
+                t = v.transient().conj(*range(n, 2 * n))
+                if n:
+                    t[0] = 'x'
+                w = t.persistent()
+                self.assertEqual(list(range(n)), v)
+                self.assertEqual(['x'] * (n > 0) + list(range(1, 2 * n)), w)
+                with self.assertRaisesRegex(RuntimeError, 'after persistent'):
+                    t.conj(1)
+
+    def test_views(self):
+        v = vec(range(100))
+        self.assertIsInstance(v.rest(), SubVector)
+        self.assertEqual(list(range(10, 20)), v[10:20])
+        self.assertEqual(list(range(1, 100, 3)), v[1::3])
+        self.assertEqual([11, 12, 'a'], v[10:20].rest()[:2].conj('a'))
+        self.assertEqual(list(range(100)), v)  # a conj onto a view copies the path it changes
+        self.assertEqual(list(range(50)), pickle.loads(pickle.dumps(v[:50])))
+        self.assertEqual(hash(tuple(range(5))), hash(vec(range(5))))
+
+    def test_naga_and_core(self):
+        v = vec([1, 2, 3])
+        self.assertEqual((1, [2, 3], 3, None), (naga.first(v), naga.rest(v), naga.last(v), naga.get(v, 5)))
+        for evaluator in ('interp', 'compile', 'stack'):
+            with self.subTest(evaluator=evaluator):
+                env = Env(outer=global_env)
+                env['v'] = v
+                for src in ['[conj v 4]', '[cons 0 v]', '[into v [4 5]]', '[subvec v 1]', '[rest v]']:
+                    self.assertTrue(self.run_with(evaluator, f'[vector? {src}]', env), src)
+                self.assertEqual([1, [2, 3]], self.run_with(evaluator, '[let [[a . b] v] [list a b]]', env))
+                self.assertEqual(6, self.run_with(evaluator, '[apply add v]', env))
+                self.assertEqual([1, 2], self.run_with(evaluator, '[into [] [1 2]]'))  # lists stay lists
+
+    def test_vector_literals(self):
+        old = lib.lang.vectors
+        lib.lang.vectors = True
+        try:
+            for evaluator in ('interp', 'compile', 'stack'):
+                with self.subTest(evaluator=evaluator):
+                    self.assertIsInstance(self.run_with(evaluator, '[1 2 [add 1 2]]'), Vector)
+                    self.assertIsInstance(self.run_with(evaluator, '[conj [] 1]'), Vector)
+        finally:
+            lib.lang.vectors = old
+        self.assertIsInstance(self.run_with('compile', '[1 2 [add 1 2]]'), list)
+
+
+if __name__ == '__main__':
+    unittest.main()